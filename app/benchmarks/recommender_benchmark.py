@@ -0,0 +1,274 @@
+"""
+Нагрузочный тест и проверка качества сервиса рекомендаций
+
+Запуск на синтетических данных:
+    python -m app.benchmarks.recommender_benchmark --apartments 50000 --users 2000 --output report.json
+
+Запуск на существующей базе:
+    python -m app.benchmarks.recommender_benchmark --database-url sqlite:///./vkr.db
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import sklearn
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config.settings import settings
+from app.migrations import upgrade as upgrade_schema
+from app.models.apartment import Apartment
+from app.models.favorite import Favorite
+from app.models.user import User
+from app.services.ann_index import ExactIndex
+from app.services.recommender import RecommenderService, SimilarityFilters
+
+logger = logging.getLogger(__name__)
+
+METRO_STATIONS = [f"Станция {i}" for i in range(1, 61)]
+WAYS = ["walk", "transport"]
+
+
+def peak_rss_mb() -> float:
+    """
+    Пиковый размер резидентной памяти процесса, МБ
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def latency_stats(timings: List[float]) -> Dict[str, float]:
+    """
+    Перцентили времени ответа (мс) и пропускная способность при последовательных вызовах
+    """
+    values = np.asarray(timings) * 1000
+    return {
+        "calls": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "qps": round(len(values) / (values.sum() / 1000), 1) if values.sum() > 0 else None,
+    }
+
+
+def measure(call: Callable[[Any], Any], arguments: List[Any]) -> Dict[str, float]:
+    timings = []
+    for argument in arguments:
+        started = time.perf_counter()
+        call(argument)
+        timings.append(time.perf_counter() - started)
+    return latency_stats(timings)
+
+
+def generate_dataset(
+    db: Session, n_apartments: int, n_users: int, favorites_per_user: int, seed: int
+) -> None:
+    """
+    Синтетические квартиры, пользователи и избранное с воспроизводимым распределением
+
+    Пользователь выбирает избранное среди квартир одной станции метро, поэтому
+    у совместного избранного есть структура, как у реальных данных.
+    """
+    rng = np.random.RandomState(seed)
+    rooms = rng.choice([1, 2, 3, 4], size=n_apartments, p=[0.35, 0.35, 0.2, 0.1])
+    total_area = np.round(rooms * rng.uniform(15, 30, n_apartments) + rng.uniform(10, 20, n_apartments), 1)
+    metro = rng.randint(len(METRO_STATIONS), size=n_apartments)
+    # Цена растет с площадью и различается по станциям
+    station_factor = rng.uniform(0.7, 1.6, len(METRO_STATIONS))
+    price = np.round(total_area * 900 * station_factor[metro] * rng.lognormal(0, 0.15, n_apartments), -2)
+    storeys = rng.randint(5, 26, n_apartments)
+
+    batch_size = 10000
+    for start in range(0, n_apartments, batch_size):
+        rows = slice(start, min(start + batch_size, n_apartments))
+        db.execute(insert(Apartment), [
+            {
+                "metro": METRO_STATIONS[metro[i]],
+                "way": WAYS[i % 2],
+                "price": float(price[i]),
+                "minutes": int(rng.randint(1, 30)),
+                "storey": int(rng.randint(1, storeys[i] + 1)),
+                "storeys": int(storeys[i]),
+                "rooms": int(rooms[i]),
+                "total_area": float(total_area[i]),
+                "living_area": float(round(total_area[i] * 0.6, 1)),
+                "kitchen_area": float(round(total_area[i] * 0.15, 1)),
+                "views": int(rng.zipf(2.0)),
+            }
+            for i in range(rows.start, rows.stop)
+        ])
+    db.commit()
+
+    db.execute(insert(User), [
+        {"username": f"bench{i}", "email": f"bench{i}@example.com", "hashed_password": "", "is_active": True}
+        for i in range(n_users)
+    ])
+    db.commit()
+
+    apartment_ids = np.array(db.execute(select(Apartment.id).order_by(Apartment.id)).scalars().all())
+    user_ids = db.execute(select(User.id).order_by(User.id)).scalars().all()
+    by_station = [apartment_ids[metro == station] for station in range(len(METRO_STATIONS))]
+    favorites = []
+    for user_id in user_ids:
+        candidates = by_station[rng.randint(len(METRO_STATIONS))]
+        if len(candidates) == 0:
+            continue
+        size = min(len(candidates), rng.randint(1, 2 * favorites_per_user))
+        favorites.extend(
+            {"user_id": user_id, "apartment_id": int(apartment_id)}
+            for apartment_id in rng.choice(candidates, size=size, replace=False)
+        )
+    if favorites:
+        db.execute(insert(Favorite), favorites)
+    db.commit()
+
+
+def recall_at_k(
+    vectors: np.ndarray, rows: np.ndarray, found_rows: np.ndarray, k: int
+) -> float:
+    """
+    Доля найденных соседей, которые не дальше k-го точного соседа
+
+    Сравнение по расстоянию, а не по номерам строк, не штрафует за выбор
+    другой квартиры с таким же расстоянием.
+    """
+    exact_distances, exact_rows = ExactIndex().fit(vectors).search(vectors[rows], k + 1)
+    # Исключаем саму квартиру из точных соседей
+    is_self = exact_rows == rows[:, None]
+    order = np.argsort(is_self, axis=1, kind="stable")[:, :k]
+    threshold = np.take_along_axis(exact_distances, order, axis=1)[:, -1]
+
+    hits = 0
+    for i, row in enumerate(rows):
+        candidates = found_rows[i][(found_rows[i] >= 0) & (found_rows[i] != row)][:k]
+        distances = np.linalg.norm(vectors[candidates] - vectors[row], axis=1)
+        hits += int(np.sum(distances <= threshold[i] * (1 + 1e-5) + 1e-6))
+    return round(hits / (len(rows) * k), 4)
+
+
+def run_benchmark(
+    db: Session, *, queries: int, k: int, seed: int
+) -> Dict[str, Any]:
+    """
+    Замеры обучения, ответов сервиса и качества поиска соседей на данных из db
+    """
+    rng = np.random.RandomState(seed)
+    report: Dict[str, Any] = {
+        "dataset": {
+            "apartments": db.scalar(select(func.count(Apartment.id))),
+            "users": db.scalar(select(func.count(User.id))),
+            "favorites": db.scalar(select(func.count(Favorite.id))),
+        },
+    }
+
+    service = RecommenderService()
+    started = time.perf_counter()
+    if not service.train(db):
+        raise RuntimeError("Недостаточно данных для обучения модели рекомендаций")
+    bundle = service._bundle
+    report["train"] = {
+        "seconds": round(time.perf_counter() - started, 3),
+        "index": bundle.index.name,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    apartment_ids = bundle.apartment_ids
+    sample_rows = rng.choice(len(apartment_ids), size=min(queries, len(apartment_ids)), replace=False)
+    sample_ids = [int(apartment_ids[row]) for row in sample_rows]
+    user_ids = db.execute(
+        select(Favorite.user_id).distinct().order_by(Favorite.user_id)
+    ).scalars().all()
+    sample_users = [int(user_id) for user_id in rng.permutation(user_ids)[:queries]] if user_ids else []
+
+    # С фильтром соседи ищутся в индексе, без фильтра берутся из таблицы соседей
+    median_price = float(np.median(bundle.attributes.values['price']))
+    report["similar"] = {
+        "precomputed": measure(lambda apartment_id: service.get_similar_apartments(db, apartment_id, k), sample_ids),
+        "filtered": measure(
+            lambda apartment_id: service.get_similar_apartments(
+                db, apartment_id, k, filters=SimilarityFilters(max_price=median_price)
+            ),
+            sample_ids,
+        ),
+    }
+    report["personalized"] = {
+        "cold": measure(lambda user_id: service.get_recommendations_for_user(db, user_id, k), sample_users),
+        "cached": measure(lambda user_id: service.get_recommendations_for_user(db, user_id, k), sample_users),
+    } if sample_users else {}
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    # Качество приближенного индекса и таблицы соседей относительно точного перебора
+    vectors = bundle.index.vectors
+    _, index_rows = bundle.index.search(vectors[sample_rows], k + 1)
+    report["recall"] = {
+        "k": k,
+        "index": recall_at_k(vectors, sample_rows, index_rows, k),
+        "neighbor_table": recall_at_k(vectors, sample_rows, bundle.neighbor_rows[sample_rows], k),
+    }
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Замеры скорости и качества сервиса рекомендаций")
+    parser.add_argument("--database-url", help="существующая база; без него создаются синтетические данные")
+    parser.add_argument("--apartments", type=int, default=20000, help="число синтетических квартир")
+    parser.add_argument("--users", type=int, default=1000, help="число синтетических пользователей")
+    parser.add_argument("--favorites-per-user", type=int, default=5, help="среднее число избранных")
+    parser.add_argument("--queries", type=int, default=500, help="число замеряемых запросов каждого вида")
+    parser.add_argument("--k", type=int, default=10, help="число рекомендаций и K для recall@K")
+    parser.add_argument("--index", choices=["auto", "exact", "ivf"], help="тип индекса соседей")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="recommender_benchmark.json", help="файл JSON-отчета")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.index:
+        settings.RECOMMENDER_INDEX = args.index
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}"
+        engine = create_engine(database_url)
+        db = sessionmaker(bind=engine)()
+        try:
+            if not args.database_url:
+                upgrade_schema(engine)
+                started = time.perf_counter()
+                generate_dataset(db, args.apartments, args.users, args.favorites_per_user, args.seed)
+                print(f"Синтетические данные созданы за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+            report = run_benchmark(db, queries=args.queries, k=args.k, seed=args.seed)
+        finally:
+            db.close()
+            engine.dispose()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": "database" if args.database_url else "synthetic",
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "database_url")},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "cpu_count": os.cpu_count(),
+            "recommender_index": settings.RECOMMENDER_INDEX,
+        },
+        **report,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
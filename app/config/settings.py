@@ -1,3 +1,4 @@
+import os
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -10,6 +11,7 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "Mq9bSL5NdcYSeCrEt23kEy46UisSaFEy"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 1 неделя
+    ADMIN_EMAILS: List[str] = ["admin@example.com"]  # пользователи с доступом к администрированию
     
     # Настройки базы данных
     DATABASE_URL: str = "postgresql://postgres:postgres@db:5432/property_rental"
@@ -17,6 +19,45 @@ class Settings(BaseSettings):
     # Настройки CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8000", "http://frontend:3000"]
     
+    # Настройки моделей машинного обучения
+    FEATURE_CHUNK_SIZE: int = 10000  # размер порции строк при извлечении обучающих данных
+    PREDICTION_BATCH_MAX: int = 5000  # максимальный размер пакета для прогноза цен
+    PREDICTION_NDJSON_MAX_LINE: int = 65536  # максимальная длина строки потока NDJSON, байты
+    MODEL_RETRY_AFTER_SECONDS: int = 30  # значение Retry-After, пока модель не готова
+    MODEL_RETRAIN_COOLDOWN: float = 60  # пауза перед повторным обучением модели после ошибки, секунды
+    MODEL_RETRAIN_INTERVAL: float = 0  # период проверки данных для переобучения моделей, секунды (0 - отключено)
+    MODEL_STORE_DIR: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "models")
+    MODEL_STORE_KEEP_VERSIONS: int = 5  # сколько версий каждой модели хранить на диске
+    PRICE_MODEL_WORKERS: int = 0  # процессов для сравнения моделей (0 - по числу ядер, 1 - без пула)
+    PRICE_MODEL_CANDIDATE_TIMEOUT: float = 300  # тайм-аут оценки одной модели в секундах
+    PRICE_MODEL_SELECTION: str = "full"  # "full" - все модели на всех данных, "halving" - отбор в пределах бюджета
+    PRICE_MODEL_TIME_BUDGET: float = 120  # бюджет времени на отбор модели в режиме halving, секунды
+    PRICE_MODEL_HALVING_FACTOR: int = 3  # во сколько раз сокращается число кандидатов на каждой ступени
+    PRICE_MODEL_MIN_SAMPLES: int = 500  # размер подвыборки на первой ступени
+    PRICE_CACHE_SIZE: int = 10000  # число кэшируемых прогнозов цены (0 - кэш отключен)
+    PRICE_CACHE_TTL: float = 3600  # время жизни прогноза в кэше, секунды
+    RECOMMENDER_NEIGHBORS_K: int = 20  # число заранее вычисленных похожих квартир для каждой квартиры
+    RECOMMENDER_NEIGHBORS_TABLE: bool = False  # сохранять таблицу соседей в БД (apartment_neighbors)
+    RECOMMENDER_INDEX: str = "auto"  # индекс соседей: "exact", "ivf" или "auto" (ivf для больших данных)
+    RECOMMENDER_IVF_MIN_ROWS: int = 100000  # с какого числа квартир "auto" выбирает ivf
+    RECOMMENDER_IVF_NLIST: int = 0  # число кластеров IVF (0 - 4·√N)
+    RECOMMENDER_IVF_NPROBE: int = 16  # сколько ближайших кластеров просматривается при поиске
+    RECOMMENDER_REBUILD_DRIFT: float = 0.1  # доля изменений квартир, после которой индекс перестраивается
+    RECOMMENDER_CF_WEIGHT: float = 0.3  # вес совместного избранного в персональных рекомендациях (0 - только похожесть признаков)
+    RECOMMENDER_CF_NEIGHBORS: int = 50  # сколько самых похожих по избранному квартир хранится для каждой квартиры
+    RECOMMENDER_CF_MAX_USER_ITEMS: int = 500  # сколько последних избранных пользователя учитывается при построении
+    RECOMMENDER_USER_CACHE_SIZE: int = 10000  # число наборов персональных рекомендаций в кэше (0 - без кэша)
+    RECOMMENDER_USER_CACHE_TTL: int = 600  # время жизни персональных рекомендаций в кэше, с (и задержка обновления после изменения избранного в других процессах)
+    RECOMMENDER_QUERY_BATCH_MAX: int = 100  # максимальное число запросов в пакетном поиске похожих квартир
+    POPULAR_TOP_N: int = 1000  # сколько самых просматриваемых квартир хранится в памяти
+    RECOMMENDER_PRECOMPUTE_USERS: int = 0  # сколько недавно активных пользователей пересчитывать в фоне (0 - не пересчитывать)
+    SEARCH_INDEX_ENABLED: bool = False  # фильтровать квартиры индексом в памяти (изменения из других процессов он не видит)
+    FACET_PRICE_BUCKETS: List[float] = [30000, 40000, 50000, 70000, 100000, 200000, 500000]  # границы интервалов цены в фасетах
+    FACET_AREA_BUCKETS: List[float] = [30, 40, 50, 60, 80, 100, 150]  # границы интервалов площади в фасетах
+    FACETS_CACHE_SIZE: int = 1000  # число наборов фильтров с кэшированными фасетами (0 - кэш отключен)
+    FACETS_CACHE_TTL: float = 300  # время жизни фасетов в кэше, секунды
+    COUNT_EXACT_LIMIT: int = 10000  # до какого числа квартир with_total считает точно, больше - оценка
+    
     # Настройки сервера
     HOST: str = "0.0.0.0"
     PORT: int = 8000
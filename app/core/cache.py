@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением числа записей и временем жизни
+
+    При переполнении вытесняется запись, к которой дольше всего не обращались.
+    Просроченные записи удаляются при обращении к ним. max_entries <= 0 отключает кэш.
+    """
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Счетчики обращений к кэшу
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+            }
@@ -0,0 +1,89 @@
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Виды изменений
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """
+    Изменение одной записи: номер в журнале, вид изменения, id и снимок полей
+    """
+    seq: int
+    action: str
+    key: int
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class ChangeLog:
+    """
+    Журнал изменений записей внутри процесса
+
+    Репозитории добавляют в журнал изменения после фиксации транзакции, подписчики
+    (индексы рекомендаций, поиска) получают их сразу. Последние max_entries событий
+    хранятся, чтобы подписчик, перестроивший индекс, мог догнать изменения,
+    случившиеся во время перестроения.
+    """
+    def __init__(self, name: str, max_entries: int = 100000):
+        self.name = name
+        self._entries: "deque[ChangeEvent]" = deque(maxlen=max_entries)
+        self._subscribers: List[Callable[[ChangeEvent], None]] = []
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    @property
+    def position(self) -> int:
+        """
+        Номер последнего события в журнале
+        """
+        return self._seq
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]) -> None:
+        self._subscribers.append(callback)
+
+    def append(self, action: str, key: int, data: Optional[Dict[str, Any]] = None) -> ChangeEvent:
+        """
+        Запись изменения в журнал и уведомление подписчиков
+        """
+        with self._lock:
+            self._seq += 1
+            event = ChangeEvent(seq=self._seq, action=action, key=key, data=data or {})
+            self._entries.append(event)
+
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                # Ошибка подписчика не должна отменять уже зафиксированную запись
+                logger.error(f"Ошибка обработки изменения {self.name} #{event.seq}: {e}", exc_info=True)
+        return event
+
+    def since(self, seq: int) -> Optional[List[ChangeEvent]]:
+        """
+        События с номером больше seq; None, если часть из них уже вытеснена из журнала
+        """
+        with self._lock:
+            entries = list(self._entries)
+        if seq < self._seq and (not entries or entries[0].seq > seq + 1):
+            return None
+        return [event for event in entries if event.seq > seq]
+
+
+def snapshot(obj: Any) -> Dict[str, Any]:
+    """
+    Значения колонок ORM-объекта на момент изменения
+    """
+    return {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+
+
+# Журналы изменений, используемые в приложении
+apartment_changes = ChangeLog("apartments")
+apartment_views = ChangeLog("apartment_views")
+favorite_changes = ChangeLog("favorites")
@@ -0,0 +1,108 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import DateTime, func, tuple_
+from sqlalchemy.orm import Query
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Заголовки ответа с общим числом записей и признаком того, что число оценено
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+
+
+class InvalidCursorError(ValueError):
+    """
+    Курсор поврежден или получен для другого порядка сортировки
+    """
+
+
+class Page(list):
+    """
+    Записи одной страницы и курсор следующей (None, если страница последняя)
+
+    Это обычный список, поэтому методы, возвращавшие список, остаются совместимыми.
+    """
+    def __init__(self, items: Sequence[Any] = (), next_cursor: Optional[str] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Непрозрачный курсор из значений ключа сортировки последней записи
+    """
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """
+    Значения ключа сортировки из курсора с приведением к типам колонок
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursorError("Некорректный курсор") from e
+    if not isinstance(values, list) or len(values) != len(columns) or any(value is None for value in values):
+        raise InvalidCursorError("Некорректный курсор")
+
+    try:
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (TypeError, ValueError) as e:
+        raise InvalidCursorError("Некорректный курсор") from e
+
+
+def _keyset_condition(query: Query, sort_columns: Sequence[Any], values: List[Any], descending: bool):
+    columns, bounds = list(sort_columns), list(values)
+    if query.session.get_bind().dialect.name == "sqlite":
+        # SQLite хранит даты строками в разных форматах (с долями секунды и без),
+        # поэтому даты сравниваются как числа julianday, а не как строки
+        for i, column in enumerate(columns):
+            if isinstance(column.type, DateTime):
+                columns[i] = func.julianday(column)
+                bounds[i] = func.julianday(bounds[i].isoformat(sep=" "))
+    key, bound = tuple_(*columns), tuple_(*bounds)
+    return key < bound if descending else key > bound
+
+
+def paginate(
+    query: Query,
+    sort_columns: Sequence[Any],
+    *,
+    descending: bool = False,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> Page:
+    """
+    Страница запроса в детерминированном порядке sort_columns (последней должен быть id)
+
+    С курсором записи отбираются условием (ключ) > (ключ последней записи), которое
+    использует индекс, поэтому глубокие страницы читаются так же быстро, как первая.
+    Без курсора работает прежняя пагинация skip/limit. Курсор следующей страницы
+    возвращается в обоих случаях.
+    """
+    if cursor:
+        values = decode_cursor(cursor, sort_columns)
+        query = query.filter(_keyset_condition(query, sort_columns, values, descending))
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in sort_columns])
+    if skip and not cursor:
+        query = query.offset(skip)
+    # Лишняя запись показывает, есть ли следующая страница
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_cursor([getattr(last, column.key) for column in sort_columns]))
@@ -0,0 +1,2 @@
+# Миграции схемы базы данных
+from app.migrations.runner import Migration, current_version, discover, downgrade, upgrade
@@ -0,0 +1,35 @@
+"""
+Управление миграциями схемы
+
+    python -m app.migrations upgrade [версия]
+    python -m app.migrations downgrade <версия>
+    python -m app.migrations current
+"""
+import argparse
+import logging
+
+from app.config.database import engine
+from app.migrations import current_version, discover, downgrade, upgrade
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Миграции схемы базы данных")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="применить миграции до версии (по умолчанию до последней)")
+    upgrade_parser.add_argument("target", type=int, nargs="?")
+    downgrade_parser = commands.add_parser("downgrade", help="откатить миграции новее версии")
+    downgrade_parser.add_argument("target", type=int)
+    commands.add_parser("current", help="текущая версия схемы")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.command == "upgrade":
+        print(f"Применены миграции: {upgrade(engine, args.target)}")
+    elif args.command == "downgrade":
+        print(f"Откачены миграции: {downgrade(engine, args.target)}")
+    latest = discover()[-1].version if discover() else 0
+    print(f"Версия схемы: {current_version(engine)} (последняя {latest})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Callable, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.migrations import versions
+
+logger = logging.getLogger(__name__)
+
+# Таблица с номерами примененных миграций
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Версионированное обратимое изменение схемы БД
+    """
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    downgrade: Callable[[Connection], None]
+
+
+def _load(module: ModuleType) -> Migration:
+    return Migration(
+        version=module.version,
+        name=module.__name__.rsplit(".", 1)[-1],
+        upgrade=module.upgrade,
+        downgrade=module.downgrade,
+    )
+
+
+def discover() -> List[Migration]:
+    """
+    Миграции из пакета app.migrations.versions в порядке версий
+    """
+    migrations = [
+        _load(importlib.import_module(f"{versions.__name__}.{info.name}"))
+        for info in pkgutil.iter_modules(versions.__path__)
+    ]
+    migrations.sort(key=lambda migration: migration.version)
+    numbers = [migration.version for migration in migrations]
+    if len(set(numbers)) != len(numbers):
+        raise RuntimeError(f"Повторяющиеся номера миграций: {numbers}")
+    return migrations
+
+
+def applied_versions(connection: Connection) -> List[int]:
+    schema_migrations.create(connection, checkfirst=True)
+    return list(connection.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version)).scalars())
+
+
+def current_version(engine: Engine) -> int:
+    """
+    Номер последней примененной миграции (0 - ни одной)
+    """
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+    return applied[-1] if applied else 0
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """
+    Применение всех неприменённых миграций до target включительно (по умолчанию до последней)
+
+    Каждая миграция выполняется в своей транзакции вместе с записью в schema_migrations,
+    поэтому прерванное обновление продолжается с первой неприменённой миграции.
+    """
+    applied = []
+    for migration in discover():
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as connection:
+            if migration.version in applied_versions(connection):
+                continue
+            logger.info(f"Применение миграции {migration.version}: {migration.name}")
+            migration.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(version=migration.version, name=migration.name))
+        applied.append(migration.version)
+    return applied
+
+
+def downgrade(engine: Engine, target: int) -> List[int]:
+    """
+    Откат примененных миграций с номером больше target в обратном порядке
+    """
+    reverted = []
+    for migration in reversed(discover()):
+        if migration.version <= target:
+            break
+        with engine.begin() as connection:
+            if migration.version not in applied_versions(connection):
+                continue
+            logger.info(f"Откат миграции {migration.version}: {migration.name}")
+            migration.downgrade(connection)
+            connection.execute(schema_migrations.delete().where(schema_migrations.c.version == migration.version))
+        reverted.append(migration.version)
+    return reverted
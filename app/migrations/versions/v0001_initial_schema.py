@@ -0,0 +1,70 @@
+"""
+Исходная схема: пользователи, квартиры, избранное и таблица соседей
+
+Таблицы описаны здесь, а не берутся из моделей, чтобы миграция не менялась
+вместе с моделями. Таблицы создаются с проверкой существования, поэтому базы,
+созданные раньше через create_all, переходят на миграции без пересоздания.
+"""
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, func
+from sqlalchemy.engine import Connection
+
+version = 1
+
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("is_active", Boolean),
+)
+
+Table(
+    "apartments",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+    Column("metro", String, index=True),
+    Column("price", Float, index=True),
+    Column("minutes", Integer),
+    Column("way", String),
+    Column("provider", String),
+    Column("fee_percent", Float),
+    Column("views", Integer),
+    Column("storey", Integer),
+    Column("storeys", Integer),
+    Column("rooms", Integer, index=True),
+    Column("total_area", Float),
+    Column("living_area", Float),
+    Column("kitchen_area", Float),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+Table(
+    "favorites",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("apartment_id", Integer, ForeignKey("apartments.id")),
+)
+
+Table(
+    "apartment_neighbors",
+    metadata,
+    Column("apartment_id", Integer, ForeignKey("apartments.id", ondelete="CASCADE"), primary_key=True),
+    Column("rank", Integer, primary_key=True),
+    Column("neighbor_id", Integer, ForeignKey("apartments.id", ondelete="CASCADE")),
+    Column("distance", Float),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    metadata.create_all(connection, checkfirst=True)
+
+
+def downgrade(connection: Connection) -> None:
+    metadata.drop_all(connection, checkfirst=True)
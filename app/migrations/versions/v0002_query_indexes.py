@@ -0,0 +1,40 @@
+"""
+Индексы под запросы репозиториев и уникальность избранного
+
+- (created_at, id) - последние объявления и курсор по ним;
+- (owner_id, id) - объявления владельца в порядке id;
+- (views DESC, id) - рейтинг популярных квартир без сортировки таблицы;
+- (metro, rooms, price) - поиск по станции, числу комнат и диапазону цены;
+- уникальный (user_id, apartment_id) - избранное пользователя и проверка повторного добавления.
+
+Перед созданием уникального индекса повторы в избранном удаляются,
+остается самая ранняя запись каждой пары.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+version = 2
+
+INDEXES = [
+    "CREATE INDEX ix_apartments_created_at_id ON apartments (created_at, id)",
+    "CREATE INDEX ix_apartments_owner_id_id ON apartments (owner_id, id)",
+    "CREATE INDEX ix_apartments_views_id ON apartments (views DESC, id)",
+    "CREATE INDEX ix_apartments_metro_rooms_price ON apartments (metro, rooms, price)",
+    "CREATE UNIQUE INDEX uq_favorites_user_apartment ON favorites (user_id, apartment_id)",
+]
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text(
+        "DELETE FROM favorites WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM favorites GROUP BY user_id, apartment_id) AS first_rows"
+        ")"
+    ))
+    for statement in INDEXES:
+        connection.execute(text(statement))
+
+
+def downgrade(connection: Connection) -> None:
+    for statement in reversed(INDEXES):
+        name = statement.split(" INDEX ", 1)[1].split(" ", 1)[0]
+        connection.execute(text(f"DROP INDEX {name}"))
@@ -0,0 +1,49 @@
+"""
+Цена за квадратный метр и индексы для сортировки списка квартир
+
+price_per_m2 - вычисляемая колонка price / total_area (NULL при нулевой площади).
+В PostgreSQL она хранимая и заполняется для существующих строк при добавлении,
+SQLite не позволяет добавить хранимую колонку к существующей таблице, поэтому
+там она виртуальная, а значения хранит индекс по ней.
+
+Индексы (колонка, id) обслуживают сортировку и курсор в обоих направлениях.
+Индекс по цене заменяет одноколоночный, индекс по просмотрам перестраивается
+из (views DESC, id) в (views, id), чтобы рейтинг популярных и сортировка
+по убыванию просмотров с убыванием id читали его в обратном порядке.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+version = 3
+
+EXPRESSION = "price / NULLIF(total_area, 0)"
+
+
+def upgrade(connection: Connection) -> None:
+    if connection.dialect.name == "sqlite":
+        column = f"price_per_m2 REAL GENERATED ALWAYS AS ({EXPRESSION}) VIRTUAL"
+    else:
+        column = f"price_per_m2 DOUBLE PRECISION GENERATED ALWAYS AS ({EXPRESSION}) STORED"
+    for statement in (
+        f"ALTER TABLE apartments ADD COLUMN {column}",
+        "DROP INDEX ix_apartments_price",
+        "CREATE INDEX ix_apartments_price_id ON apartments (price, id)",
+        "CREATE INDEX ix_apartments_total_area_id ON apartments (total_area, id)",
+        "CREATE INDEX ix_apartments_price_per_m2_id ON apartments (price_per_m2, id)",
+        "DROP INDEX ix_apartments_views_id",
+        "CREATE INDEX ix_apartments_views_id ON apartments (views, id)",
+    ):
+        connection.execute(text(statement))
+
+
+def downgrade(connection: Connection) -> None:
+    for statement in (
+        "DROP INDEX ix_apartments_views_id",
+        "CREATE INDEX ix_apartments_views_id ON apartments (views DESC, id)",
+        "DROP INDEX ix_apartments_price_per_m2_id",
+        "DROP INDEX ix_apartments_total_area_id",
+        "DROP INDEX ix_apartments_price_id",
+        "CREATE INDEX ix_apartments_price ON apartments (price)",
+        "ALTER TABLE apartments DROP COLUMN price_per_m2",
+    ):
+        connection.execute(text(statement))
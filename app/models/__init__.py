@@ -1,4 +1,5 @@
 # Импорт моделей для обеспечения их регистрации в SQLAlchemy
 from app.models.user import User
 from app.models.apartment import Apartment
-from app.models.favorite import Favorite
\ No newline at end of file
+from app.models.favorite import Favorite
+from app.models.apartment_neighbor import ApartmentNeighbor
\ No newline at end of file
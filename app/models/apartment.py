@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Computed, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -11,7 +11,7 @@ class Apartment(Base):
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"))
     metro = Column(String, index=True)
-    price = Column(Float, index=True)
+    price = Column(Float)
     minutes = Column(Integer)  # время до метро в минутах
     way = Column(String)  # способ добраться до метро (пешком/транспорт)
     provider = Column(String)  # источник объявления
@@ -23,8 +23,20 @@ class Apartment(Base):
     total_area = Column(Float)  # общая площадь
     living_area = Column(Float)  # жилая площадь
     kitchen_area = Column(Float)  # площадь кухни
+    price_per_m2 = Column(Float, Computed("price / NULLIF(total_area, 0)", persisted=True))  # цена за квадратный метр
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Индексы под запросы репозитория, создаются миграциями v0002_query_indexes и v0003_price_per_m2
+    __table_args__ = (
+        Index("ix_apartments_created_at_id", created_at, id),
+        Index("ix_apartments_owner_id_id", owner_id, id),
+        Index("ix_apartments_views_id", views, id),
+        Index("ix_apartments_metro_rooms_price", metro, rooms, price),
+        Index("ix_apartments_price_id", price, id),
+        Index("ix_apartments_total_area_id", total_area, id),
+        Index("ix_apartments_price_per_m2_id", price_per_m2, id),
+    )
     
     # Отношения
     owner = relationship("User", back_populates="apartments")
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey
+
+from app.config.database import Base
+
+
+class ApartmentNeighbor(Base):
+    __tablename__ = "apartment_neighbors"
+
+    apartment_id = Column(Integer, ForeignKey("apartments.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)  # позиция соседа по возрастанию расстояния
+    neighbor_id = Column(Integer, ForeignKey("apartments.id", ondelete="CASCADE"))
+    distance = Column(Float)  # расстояние в пространстве признаков модели рекомендаций
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.config.database import Base
@@ -10,6 +10,11 @@ class Favorite(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     apartment_id = Column(Integer, ForeignKey("apartments.id"))
+
+    # Квартира добавляется в избранное пользователя не больше одного раза
+    __table_args__ = (
+        Index("uq_favorites_user_apartment", user_id, apartment_id, unique=True),
+    )
     
     # Отношения
     user = relationship("User", back_populates="favorites")
@@ -1,11 +1,44 @@
-from typing import List, Optional
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from sqlalchemy import case, func
+from sqlalchemy.orm import Query, Session
 
 from app.models.apartment import Apartment
 from app.models.user import User
 from app.schemas.apartment_schema import ApartmentCreate, ApartmentUpdate
 from app.repositories.base import BaseRepository
+from app.core.change_log import apartment_changes, apartment_views, snapshot, UPSERT, DELETE
+from app.config.settings import settings
+from app.core.pagination import Page, paginate
+
+
+def _bucket(column: Any, edges: Sequence[float]) -> Any:
+    """Номер интервала [edges[i-1], edges[i]) значения колонки, NULL для пустых значений"""
+    return case(
+        (column.is_(None), None),
+        *[(column < edge, i) for i, edge in enumerate(edges)],
+        else_=len(edges),
+    )
+
+
+# Колонки сортировки списка квартир, "-" перед именем - по убыванию
+SORT_COLUMNS = {
+    "price": Apartment.price,
+    "total_area": Apartment.total_area,
+    "price_per_m2": Apartment.price_per_m2,
+    "created_at": Apartment.created_at,
+    "views": Apartment.views,
+}
+
+
+def _sort_order(sort: Optional[str]) -> Tuple[List[Any], bool]:
+    """Колонки ключа сортировки (последней id) и направление"""
+    if not sort:
+        return [Apartment.id], False
+    column = SORT_COLUMNS.get(sort.lstrip("-"))
+    if column is None:
+        raise ValueError(f"Неизвестная сортировка: {sort}")
+    return [column, Apartment.id], sort.startswith("-")
 
 
 class ApartmentRepository(BaseRepository[Apartment, ApartmentCreate, ApartmentUpdate]):
@@ -18,47 +51,63 @@ class ApartmentRepository(BaseRepository[Apartment, ApartmentCreate, ApartmentUp
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        apartment_changes.append(UPSERT, db_obj.id, snapshot(db_obj))
         return db_obj
     
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Apartment,
+        obj_in: Union[ApartmentUpdate, Dict[str, Any]]
+    ) -> Apartment:
+        """Обновление квартиры с записью изменения в журнал"""
+        db_obj = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        apartment_changes.append(UPSERT, db_obj.id, snapshot(db_obj))
+        return db_obj
+    
+    def remove(self, db: Session, *, id: int) -> Apartment:
+        """Удаление квартиры с записью изменения в журнал"""
+        obj = super().remove(db, id=id)
+        apartment_changes.append(DELETE, id)
+        return obj
+    
     def get_multi_by_owner(
-        self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100
-    ) -> List[Apartment]:
+        self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> Page:
         """Получение списка квартир конкретного владельца"""
-        return (
-            db.query(Apartment)
-            .filter(Apartment.owner_id == owner_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        query = db.query(Apartment).filter(Apartment.owner_id == owner_id)
+        return paginate(query, [Apartment.id], skip=skip, limit=limit, cursor=cursor)
     
     def get_latest(
-        self, db: Session, *, skip: int = 0, limit: int = 10
-    ) -> List[Apartment]:
+        self, db: Session, *, skip: int = 0, limit: int = 10, cursor: Optional[str] = None
+    ) -> Page:
         """Получение списка последних добавленных квартир"""
-        return (
-            db.query(Apartment)
-            .order_by(desc(Apartment.created_at))
-            .offset(skip)
-            .limit(limit)
-            .all()
+        return paginate(
+            db.query(Apartment),
+            [Apartment.created_at, Apartment.id],
+            descending=True,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
         )
     
-    def search(
+    def _filtered(
         self,
-        db: Session,
+        query: Query,
         *,
         metro: Optional[str] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
         rooms: Optional[int] = None,
         min_area: Optional[float] = None,
-        skip: int = 0,
-        limit: int = 100
-    ) -> List[Apartment]:
-        """Поиск квартир по различным критериям"""
-        query = db.query(Apartment)
-        
+        sort: Optional[str] = None,
+    ) -> Query:
+        """Условия фильтров поиска"""
+        # Квартиры без значения поля сортировки не попадают в отсортированный список:
+        # NULL нельзя сравнить с ключом курсора
+        for column in _sort_order(sort)[0][:-1]:
+            query = query.filter(column.is_not(None))
         if metro:
             query = query.filter(Apartment.metro == metro)
         if min_price is not None:
@@ -69,8 +118,105 @@ class ApartmentRepository(BaseRepository[Apartment, ApartmentCreate, ApartmentUp
             query = query.filter(Apartment.rooms == rooms)
         if min_area is not None:
             query = query.filter(Apartment.total_area >= min_area)
-        
-        return query.offset(skip).limit(limit).all()
+        return query
+    
+    def search(
+        self,
+        db: Session,
+        *,
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        sort: Optional[str] = None,
+    ) -> Page:
+        """Поиск квартир по различным критериям в порядке sort (по умолчанию по id)"""
+        sort_columns, descending = _sort_order(sort)
+        query = self._filtered(
+            db.query(Apartment),
+            metro=metro, min_price=min_price, max_price=max_price, rooms=rooms, min_area=min_area, sort=sort,
+        )
+        return paginate(query, sort_columns, descending=descending, skip=skip, limit=limit, cursor=cursor)
+    
+    def count(
+        self,
+        db: Session,
+        *,
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+        sort: Optional[str] = None,
+        exact_limit: Optional[int] = None,
+    ) -> Tuple[int, bool]:
+        """
+        Число квартир, подходящих под фильтры, и признак точного значения
+
+        До exact_limit квартир считается точно запросом с LIMIT, дальше число
+        оценивается по id (exact_limit + 1)-й подходящей квартиры: доля подходящих
+        среди квартир до нее переносится на весь диапазон id. Все запросы читают
+        индексы, полного COUNT(*) по большой выборке нет.
+        """
+        exact_limit = settings.COUNT_EXACT_LIMIT if exact_limit is None else exact_limit
+        query = self._filtered(
+            db.query(Apartment.id),
+            metro=metro, min_price=min_price, max_price=max_price, rooms=rooms, min_area=min_area, sort=sort,
+        )
+        counted = db.query(func.count()).select_from(query.limit(exact_limit + 1).subquery()).scalar()
+        if counted <= exact_limit:
+            return counted, True
+
+        boundary = query.order_by(Apartment.id).offset(exact_limit).limit(1).scalar()
+        if boundary is None:
+            return counted, False
+        first_id, last_id = db.query(func.min(Apartment.id), func.max(Apartment.id)).one()
+        estimate = (exact_limit + 1) * (last_id - first_id + 1) / (boundary - first_id + 1)
+        return max(int(round(estimate)), counted), False
+    
+    def facets(
+        self,
+        db: Session,
+        *,
+        price_edges: Sequence[float],
+        area_edges: Sequence[float],
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Число квартир по станциям, комнатам и интервалам цены и площади одним группирующим запросом"""
+        price_bucket = _bucket(Apartment.price, price_edges)
+        area_bucket = _bucket(Apartment.total_area, area_edges)
+        query = self._filtered(
+            db.query(Apartment.metro, Apartment.rooms, price_bucket, area_bucket, func.count()),
+            metro=metro, min_price=min_price, max_price=max_price, rooms=rooms, min_area=min_area,
+        ).group_by(Apartment.metro, Apartment.rooms, price_bucket, area_bucket)
+
+        # Счетчики каждого фасета получаются суммированием групп по остальным колонкам
+        names = ("metro", "rooms", "price", "total_area")
+        counts: Dict[str, Any] = {"total": 0, **{name: Counter() for name in names}}
+        for *values, count in query.all():
+            counts["total"] += count
+            for name, value in zip(names, values):
+                if value is not None:
+                    counts[name][value] += count
+        return counts
+    
+    def get_by_ids_ordered(self, db: Session, *, ids: List[int]) -> List[Apartment]:
+        """Получение квартир по списку id одним запросом с сохранением порядка списка"""
+        if not ids:
+            return []
+        apartments = {
+            apartment.id: apartment
+            for apartment in db.query(Apartment).filter(Apartment.id.in_(ids)).all()
+        }
+        return [apartments[id] for id in ids if id in apartments]
     
     def increment_views(self, db: Session, *, id: int) -> Apartment:
         """Увеличение счетчика просмотров квартиры"""
@@ -80,6 +226,7 @@ class ApartmentRepository(BaseRepository[Apartment, ApartmentCreate, ApartmentUp
             db.add(db_obj)
             db.commit()
             db.refresh(db_obj)
+            apartment_views.append(UPSERT, db_obj.id, {"views": db_obj.views})
         return db_obj
 
 
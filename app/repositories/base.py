@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.config.database import Base
+from app.core.pagination import Page, paginate
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
@@ -23,10 +24,10 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return db.query(self.model).filter(self.model.id == id).first()
 
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
-    ) -> List[ModelType]:
-        """Получение списка экземпляров модели с пагинацией"""
-        return db.query(self.model).offset(skip).limit(limit).all()
+        self, db: Session, *, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> Page:
+        """Получение списка экземпляров модели с пагинацией по skip/limit или курсору в порядке id"""
+        return paginate(db.query(self.model), [self.model.id], skip=skip, limit=limit, cursor=cursor)
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
         """Создание нового экземпляра модели"""
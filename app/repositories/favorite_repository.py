@@ -5,6 +5,8 @@ from app.models.favorite import Favorite
 from app.models.apartment import Apartment
 from app.schemas.favorite_schema import FavoriteCreate, FavoriteInDB
 from app.repositories.base import BaseRepository
+from app.core.pagination import Page, paginate
+from app.core.change_log import favorite_changes, snapshot, UPSERT, DELETE
 
 
 class FavoriteRepository(BaseRepository[Favorite, FavoriteCreate, FavoriteInDB]):
@@ -22,17 +24,15 @@ class FavoriteRepository(BaseRepository[Favorite, FavoriteCreate, FavoriteInDB])
         )
     
     def get_user_favorites(
-        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
-    ) -> List[Apartment]:
-        """Получение списка избранных квартир пользователя"""
-        return (
+        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> Page:
+        """Получение списка избранных квартир пользователя в порядке id квартир"""
+        query = (
             db.query(Apartment)
             .join(Favorite, Favorite.apartment_id == Apartment.id)
             .filter(Favorite.user_id == user_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
+        return paginate(query, [Apartment.id], skip=skip, limit=limit, cursor=cursor)
     
     def create_with_user(
         self, db: Session, *, obj_in: FavoriteCreate, user_id: int
@@ -45,8 +45,24 @@ class FavoriteRepository(BaseRepository[Favorite, FavoriteCreate, FavoriteInDB])
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        favorite_changes.append(UPSERT, db_obj.id, snapshot(db_obj))
+        return db_obj
+    
+    def create(self, db: Session, *, obj_in: FavoriteCreate) -> Favorite:
+        """Создание записи избранного с записью изменения в журнал"""
+        db_obj = super().create(db, obj_in=obj_in)
+        favorite_changes.append(UPSERT, db_obj.id, snapshot(db_obj))
         return db_obj
     
+    def remove(self, db: Session, *, id: int) -> Favorite:
+        """Удаление записи избранного с записью изменения в журнал"""
+        obj = db.query(Favorite).get(id)
+        data = snapshot(obj) if obj else None
+        obj = super().remove(db, id=id)
+        if data:
+            favorite_changes.append(DELETE, id, data)
+        return obj
+    
     def remove_by_user_and_apartment(
         self, db: Session, *, user_id: int, apartment_id: int
     ) -> Favorite:
@@ -60,8 +76,10 @@ class FavoriteRepository(BaseRepository[Favorite, FavoriteCreate, FavoriteInDB])
             .first()
         )
         if obj:
+            data = snapshot(obj)
             db.delete(obj)
             db.commit()
+            favorite_changes.append(DELETE, data['id'], data)
         return obj
 
 
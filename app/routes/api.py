@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.routes.controllers import users, auth, apartments, favorites, predictions, recommendations
+from app.routes.controllers import users, auth, apartments, favorites, predictions, recommendations, admin
 
 # Создание основного роутера API
 router = APIRouter()
@@ -11,4 +11,5 @@ router.include_router(users.router, prefix="/users", tags=["users"])
 router.include_router(apartments.router, prefix="/apartments", tags=["apartments"])
 router.include_router(favorites.router, prefix="/favorites", tags=["favorites"])
 router.include_router(predictions.router, prefix="/predictions", tags=["predictions"])
-router.include_router(recommendations.router, prefix="/recommendations", tags=["recommendations"])
\ No newline at end of file
+router.include_router(recommendations.router, prefix="/recommendations", tags=["recommendations"])
+router.include_router(admin.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
@@ -0,0 +1,154 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+
+from app.models.user import User
+from app.routes.deps import get_current_admin_user
+from app.schemas.model_schema import CacheStats, ModelPin, ModelVersions
+from app.services.facets import facets
+from app.services.model_store import model_store
+from app.services.price_predictor import price_predictor
+from app.services.recommender import recommender
+from app.services.training_manager import training_manager
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _get_service_or_404(name: str) -> Any:
+    service = training_manager.get_service(name)
+    if service is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Модель не найдена",
+        )
+    return service
+
+
+def _describe(name: str) -> ModelVersions:
+    service = _get_service_or_404(name)
+    versions = [
+        {**meta, "compatible": model_store.is_compatible(meta, service.ARTIFACT_FORMAT)}
+        for meta in model_store.list_versions(name)
+    ]
+    return ModelVersions(
+        name=name,
+        active_version=service.model_version,
+        pinned_version=model_store.get_pinned(name),
+        versions=versions,
+    )
+
+
+@router.get("/models", response_model=List[ModelVersions])
+def list_models(
+    current_user: User = Depends(get_current_admin_user),
+) -> Any:
+    """
+    Список сохраненных версий всех моделей
+    """
+    return [_describe(name) for name in training_manager.model_names()]
+
+
+@router.post("/models/{name}/pin", response_model=ModelVersions)
+def pin_model_version(
+    *,
+    name: str,
+    pin_in: ModelPin,
+    current_user: User = Depends(get_current_admin_user),
+) -> Any:
+    """
+    Закрепление версии модели и ее немедленная активация
+    """
+    service = _get_service_or_404(name)
+    meta = model_store.get_meta(name, pin_in.version)
+    if meta is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Версия модели не найдена",
+        )
+    if not model_store.is_compatible(meta, service.ARTIFACT_FORMAT):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Версия модели несовместима с текущим кодом",
+        )
+    
+    training_manager.activate_version(name, pin_in.version)
+    model_store.pin(name, pin_in.version)
+    return _describe(name)
+
+
+@router.delete("/models/{name}/pin", response_model=ModelVersions)
+def unpin_model_version(
+    *,
+    name: str,
+    current_user: User = Depends(get_current_admin_user),
+) -> Any:
+    """
+    Снятие закрепления версии модели
+
+    Активная версия не меняется; при следующем запуске будет выбрана
+    самая новая версия, обученная на актуальных данных.
+    """
+    _get_service_or_404(name)
+    model_store.unpin(name)
+    return _describe(name)
+
+
+@router.post("/models/{name}/rollback", response_model=ModelVersions)
+def rollback_model_version(
+    *,
+    name: str,
+    current_user: User = Depends(get_current_admin_user),
+) -> Any:
+    """
+    Откат модели к предыдущей совместимой версии с ее закреплением
+    """
+    service = _get_service_or_404(name)
+    version = service.model_version
+    while True:
+        version = model_store.previous_version(name, version)
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Нет предыдущей версии для отката",
+            )
+        if model_store.is_compatible(model_store.get_meta(name, version), service.ARTIFACT_FORMAT):
+            break
+    
+    logger.info(f"Откат модели {name} к версии {version}")
+    training_manager.activate_version(name, version)
+    model_store.pin(name, version)
+    return _describe(name)
+
+
+@router.post("/models/{name}/train", status_code=status.HTTP_202_ACCEPTED)
+def retrain_model(
+    *,
+    name: str,
+    current_user: User = Depends(get_current_admin_user),
+) -> Any:
+    """
+    Запуск переобучения модели в фоне
+    """
+    _get_service_or_404(name)
+    started = training_manager.request_training(name, force=True)
+    return {
+        "started": started,
+        "status": training_manager.get_status(name).to_dict(),
+    }
+
+
+@router.get("/caches", response_model=Dict[str, CacheStats])
+def get_cache_stats(
+    current_user: User = Depends(get_current_admin_user),
+) -> Any:
+    """
+    Счетчики попаданий, промахов и вытеснений кэшей прогнозов и фасетов
+    """
+    return {
+        "price_predictions": price_predictor.cache.stats(),
+        "user_recommendations": recommender.user_cache.stats(),
+        "apartment_facets": facets.cache.stats(),
+    }
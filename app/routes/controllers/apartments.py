@@ -1,14 +1,18 @@
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 import logging
 
 from app.config.database import get_db
+from app.config.settings import settings
 from app.models.user import User
 from app.repositories.apartment_repository import apartment as apartment_repository
-from app.routes.deps import get_current_user
-from app.schemas.apartment_schema import Apartment, ApartmentCreate, ApartmentUpdate
+from app.core.pagination import InvalidCursorError
+from app.routes.deps import get_current_user, with_next_cursor, with_total_count
+from app.schemas.apartment_schema import Apartment, ApartmentCreate, ApartmentFacets, ApartmentSort, ApartmentUpdate
+from app.services.facets import facets as facet_service
+from app.services.search_index import search_index
 
 logger = logging.getLogger(__name__)
 
@@ -17,39 +21,59 @@ router = APIRouter()
 
 @router.get("/", response_model=List[Apartment])
 def read_apartments(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     metro: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     rooms: Optional[int] = None,
     min_area: Optional[float] = None,
+    sort: Optional[ApartmentSort] = None,
+    with_total: bool = False,
 ) -> Any:
     """
-    Получение списка квартир с возможностью фильтрации
+    Получение списка квартир с возможностью фильтрации и сортировки
+
+    Страницы выдаются по skip/limit или по курсору из заголовка X-Next-Cursor предыдущего ответа.
+    Курсор действует только с той же сортировкой. Квартиры без значения поля сортировки
+    (например, без площади при сортировке по цене за м²) в отсортированный список не попадают.
+    С with_total общее число квартир возвращается в заголовке X-Total-Count; для больших
+    выборок это оценка, о чем сообщает заголовок X-Total-Count-Estimated.
     """
     try:
-        logger.info(f"Запрос квартир с фильтрами: metro={metro}, min_price={min_price}, max_price={max_price}, rooms={rooms}, min_area={min_area}")
+        logger.info(f"Запрос квартир с фильтрами: metro={metro}, min_price={min_price}, max_price={max_price}, rooms={rooms}, min_area={min_area}, sort={sort}")
+        filters = dict(metro=metro, min_price=min_price, max_price=max_price, rooms=rooms, min_area=min_area)
+        sort_value = sort.value if sort else None
+        # Индекс в памяти хранит квартиры в порядке id, сортировку по другим полям выполняет БД
+        use_index = settings.SEARCH_INDEX_ENABLED and not sort_value
         
-        # Если указаны параметры фильтрации, используем метод поиска
-        if metro or min_price is not None or max_price is not None or rooms or min_area is not None:
-            apartments = apartment_repository.search(
-                db,
-                metro=metro,
-                min_price=min_price,
-                max_price=max_price,
-                rooms=rooms,
-                min_area=min_area,
-                skip=skip,
-                limit=limit
-            )
+        # Если указаны параметры фильтрации или сортировка, используем метод поиска
+        if sort_value or metro or min_price is not None or max_price is not None or rooms or min_area is not None:
+            if use_index:
+                # Индекс в памяти отбирает id, из БД загружается только страница
+                apartments = search_index.search(db, **filters, skip=skip, limit=limit, cursor=cursor)
+            else:
+                apartments = apartment_repository.search(
+                    db, **filters, skip=skip, limit=limit, cursor=cursor, sort=sort_value
+                )
         else:
             # Иначе получаем все квартиры
-            apartments = apartment_repository.get_multi(db, skip=skip, limit=limit)
+            apartments = apartment_repository.get_multi(db, skip=skip, limit=limit, cursor=cursor)
+        
+        if with_total:
+            if use_index:
+                total, exact = search_index.count(db, **filters)
+            else:
+                total, exact = apartment_repository.count(db, **filters, sort=sort_value)
+            with_total_count(response, total, exact)
         
         logger.info(f"Найдено {len(apartments)} квартир")
-        return apartments
+        return with_next_cursor(response, apartments)
+    except InvalidCursorError:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при поиске квартир: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -60,15 +84,36 @@ def read_apartments(
 
 @router.get("/latest", response_model=List[Apartment])
 def read_latest_apartments(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
 ) -> Any:
     """
     Получение списка последних добавленных квартир
     """
-    apartments = apartment_repository.get_latest(db, skip=skip, limit=limit)
-    return apartments
+    apartments = apartment_repository.get_latest(db, skip=skip, limit=limit, cursor=cursor)
+    return with_next_cursor(response, apartments)
+
+
+@router.get("/facets", response_model=ApartmentFacets)
+def read_apartment_facets(
+    db: Session = Depends(get_db),
+    metro: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    rooms: Optional[int] = None,
+    min_area: Optional[float] = None,
+) -> Any:
+    """
+    Число квартир по станциям метро, числу комнат и интервалам цены и площади
+
+    Принимает те же фильтры, что и список квартир, и считает только подходящие под них квартиры.
+    """
+    return facet_service.get_facets(
+        db, metro=metro, min_price=min_price, max_price=max_price, rooms=rooms, min_area=min_area
+    )
 
 
 @router.post("/", response_model=Apartment, status_code=status.HTTP_201_CREATED)
@@ -89,18 +134,20 @@ def create_apartment(
 
 @router.get("/my", response_model=List[Apartment])
 def read_user_apartments(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Получение списка квартир текущего пользователя
     """
     apartments = apartment_repository.get_multi_by_owner(
-        db=db, owner_id=current_user.id, skip=skip, limit=limit
+        db=db, owner_id=current_user.id, skip=skip, limit=limit, cursor=cursor
     )
-    return apartments
+    return with_next_cursor(response, apartments)
 
 
 @router.get("/{apartment_id}", response_model=Apartment)
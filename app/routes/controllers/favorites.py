@@ -1,6 +1,7 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.config.database import get_db
@@ -8,7 +9,7 @@ from app.models.user import User
 from app.models.apartment import Apartment
 from app.repositories.favorite_repository import favorite as favorite_repository
 from app.repositories.apartment_repository import apartment as apartment_repository
-from app.routes.deps import get_current_user
+from app.routes.deps import get_current_user, with_next_cursor
 from app.schemas.favorite_schema import Favorite, FavoriteCreate
 from app.schemas.apartment_schema import Apartment as ApartmentSchema
 
@@ -17,18 +18,22 @@ router = APIRouter()
 
 @router.get("/", response_model=List[ApartmentSchema])
 def read_user_favorites(
+    response: Response,
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Получение списка избранных квартир текущего пользователя
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
     """
     apartments = favorite_repository.get_user_favorites(
-        db=db, user_id=current_user.id, skip=skip, limit=limit
+        db=db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor
     )
-    return apartments
+    return with_next_cursor(response, apartments)
 
 
 @router.post("/", response_model=Favorite, status_code=status.HTTP_201_CREATED)
@@ -59,9 +64,18 @@ def create_favorite(
             detail="Эта квартира уже добавлена в избранное",
         )
     
-    favorite = favorite_repository.create_with_user(
-        db=db, obj_in=favorite_in, user_id=current_user.id
-    )
+    # Параллельный запрос мог добавить ту же квартиру после проверки,
+    # тогда повтор отклоняет уникальный индекс (user_id, apartment_id)
+    try:
+        favorite = favorite_repository.create_with_user(
+            db=db, obj_in=favorite_in, user_id=current_user.id
+        )
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Эта квартира уже добавлена в избранное",
+        )
     return favorite
 
 
@@ -0,0 +1,33 @@
+from typing import Any
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+
+from app.services.training_manager import training_manager
+
+router = APIRouter()
+
+
+@router.get("/live")
+def liveness() -> Any:
+    """
+    Проверка того, что процесс приложения запущен и отвечает
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+def readiness() -> Any:
+    """
+    Проверка готовности моделей к обслуживанию запросов
+    """
+    ready = training_manager.all_ready()
+    content = {
+        "status": "ready" if ready else "not_ready",
+        "models": training_manager.snapshot(),
+    }
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content=jsonable_encoder(content),
+    )
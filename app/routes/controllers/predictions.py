@@ -1,38 +1,39 @@
-from typing import Any, Dict
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
 
-from app.config.database import get_db
+from app.config.settings import settings
 from app.models.user import User
-from app.routes.deps import get_current_user
+from app.routes.deps import get_current_user, require_model_ready
+from app.schemas.prediction_schema import ApartmentFeatures, PricePredictionItem, PriceBatchResponse
 from app.services.price_predictor import price_predictor
+from app.services.training_manager import PRICE_PREDICTOR
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 
-@router.post("/price")
+@router.post("/price", dependencies=[Depends(require_model_ready(PRICE_PREDICTOR))])
 def predict_apartment_price(
     *,
-    db: Session = Depends(get_db),
-    apartment_data: Dict[str, Any],
+    apartment_data: ApartmentFeatures,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Прогнозирование стоимости аренды квартиры на основе ее характеристик
     """
-    # Проверяем, обучена ли модель
-    if not price_predictor.is_trained:
-        # Обучаем модель, если она еще не обучена
-        success = price_predictor.train(db)
-        if not success:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Не удалось обучить модель прогнозирования цен. Недостаточно данных.",
-            )
-    
     # Прогнозируем цену
-    predicted_price = price_predictor.predict_price(apartment_data)
+    predicted_price = price_predictor.predict_price(apartment_data.model_dump())
     
     if predicted_price is None:
         raise HTTPException(
@@ -43,4 +44,169 @@ def predict_apartment_price(
     return {
         "predicted_price": predicted_price,
         "message": "Рекомендуемая стоимость аренды на основе анализа рынка",
-    }
\ No newline at end of file
+    }
+
+
+class _InvalidLine:
+    """
+    Строка потока NDJSON, которую не удалось разобрать, с описанием ошибки для ответа
+    """
+    def __init__(self, error: str):
+        self.error = error
+
+
+class _RequestStreamingResponse(StreamingResponse):
+    """
+    Потоковый ответ, который формируется по мере чтения тела запроса
+
+    StreamingResponse параллельно ждет отключения клиента через receive() и забирал бы
+    себе части тела запроса. Здесь receive() читает только генератор ответа, а отключение
+    клиента он обнаруживает сам по ClientDisconnect.
+    """
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _predict_batch(items: List[Any], offset: int = 0) -> List[PricePredictionItem]:
+    """
+    Валидация элементов пакета и прогноз для корректных элементов одним вызовом модели
+    """
+    results: List[PricePredictionItem] = []
+    valid_indices: List[int] = []
+    valid_data: List[Dict[str, Any]] = []
+    
+    for position, item in enumerate(items):
+        index = offset + position
+        if isinstance(item, _InvalidLine):
+            results.append(PricePredictionItem(index=index, error=item.error))
+            continue
+        try:
+            features = ApartmentFeatures.model_validate(item)
+        except ValidationError as e:
+            results.append(PricePredictionItem(
+                index=index, error=e.errors(include_url=False, include_context=False)
+            ))
+            continue
+        valid_indices.append(len(results))
+        valid_data.append(features.model_dump())
+        results.append(PricePredictionItem(index=index))
+    
+    if valid_data:
+        try:
+            predicted_prices = price_predictor.predict_prices(valid_data)
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном прогнозировании цены: {e}", exc_info=True)
+            predicted_prices = None
+        
+        for position, result_index in enumerate(valid_indices):
+            if predicted_prices is None:
+                results[result_index].error = "Не удалось выполнить прогноз"
+            else:
+                results[result_index].predicted_price = float(predicted_prices[position])
+    
+    return results
+
+
+def _parse_ndjson_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return _InvalidLine("Некорректный JSON")
+
+
+async def _predict_ndjson_stream(request: Request) -> AsyncIterator[str]:
+    """
+    Прогноз для потока NDJSON порциями по PREDICTION_BATCH_MAX строк
+
+    Тело читается по мере поступления, результаты каждой порции сразу отправляются
+    клиенту, поэтому память не растет с длиной потока. Строка длиннее
+    PREDICTION_NDJSON_MAX_LINE байт не накапливается: ее остаток пропускается,
+    а в ответ для нее попадает ошибка.
+    """
+    max_line = settings.PREDICTION_NDJSON_MAX_LINE
+    too_long = f"Строка длиннее {max_line} байт"
+    buffer = b""
+    skipping = False  # Пропускается остаток слишком длинной строки
+    chunk: List[Any] = []
+    offset = 0
+    
+    async def flush() -> str:
+        nonlocal chunk, offset
+        results = await run_in_threadpool(_predict_batch, chunk, offset)
+        offset += len(chunk)
+        chunk = []
+        return "".join(result.model_dump_json(exclude_none=True) + "\n" for result in results)
+    
+    try:
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if skipping:
+                    skipping = False
+                elif len(line) > max_line:
+                    chunk.append(_InvalidLine(too_long))
+                elif line.strip():
+                    chunk.append(_parse_ndjson_line(line))
+                if len(chunk) >= settings.PREDICTION_BATCH_MAX:
+                    yield await flush()
+            if len(buffer) > max_line:
+                if not skipping:
+                    chunk.append(_InvalidLine(too_long))
+                    skipping = True
+                buffer = b""
+    except ClientDisconnect:
+        logger.info(f"Клиент отключился после {offset + len(chunk)} строк потока прогноза")
+        return
+    
+    if buffer.strip() and not skipping:
+        chunk.append(_parse_ndjson_line(buffer))
+    if chunk:
+        yield await flush()
+
+
+@router.post(
+    "/price/batch",
+    response_model=PriceBatchResponse,
+    dependencies=[Depends(require_model_ready(PRICE_PREDICTOR))],
+)
+async def predict_apartment_prices_batch(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Пакетное прогнозирование стоимости аренды
+    
+    Принимает JSON-массив характеристик (или объект с полем items) размером не больше
+    PREDICTION_BATCH_MAX, либо поток NDJSON с Content-Type application/x-ndjson
+    произвольной длины (ответ тогда тоже в формате NDJSON).
+    Для каждого элемента возвращается прогноз или описание ошибки.
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        return _RequestStreamingResponse(_predict_ndjson_stream(request), media_type=NDJSON_MEDIA_TYPE)
+    
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Тело запроса должно быть JSON",
+        )
+    
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Ожидается массив характеристик квартир",
+        )
+    if len(items) > settings.PREDICTION_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Размер пакета превышает {settings.PREDICTION_BATCH_MAX}",
+        )
+    
+    results = await run_in_threadpool(_predict_batch, items)
+    failed = sum(1 for result in results if result.error is not None)
+    return PriceBatchResponse(results=results, succeeded=len(results) - failed, failed=failed)
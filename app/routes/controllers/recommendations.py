@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
@@ -6,59 +6,99 @@ import logging
 
 from app.config.database import get_db
 from app.models.user import User
-from app.repositories.apartment_repository import apartment as apartment_repository
-from app.routes.deps import get_current_user
+from app.routes.deps import get_current_user, require_model_ready
 from app.schemas.apartment_schema import Apartment
-from app.services.recommender import recommender
+from app.schemas.recommendation_schema import SimilarityBatchRequest, SimilarityBatchResponse
+from app.services.popularity import popularity
+from app.services.recommender import recommender, SimilarityFilters
+from app.services.training_manager import RECOMMENDER
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-@router.get("/similar/{apartment_id}", response_model=List[Apartment])
+@router.get(
+    "/similar/{apartment_id}",
+    response_model=List[Apartment],
+    dependencies=[Depends(require_model_ready(RECOMMENDER))],
+)
 def get_similar_apartments(
     *,
     db: Session = Depends(get_db),
     apartment_id: int,
     limit: int = 5,
+    metro: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    rooms: Optional[int] = None,
+    min_area: Optional[float] = None,
 ) -> Any:
     """
     Получение похожих квартир для заданной квартиры
+
+    Фильтры такие же, как у поиска квартир, и применяются при поиске соседей.
     """
+    filters = SimilarityFilters(
+        metro=metro, min_price=min_price, max_price=max_price, rooms=rooms, min_area=min_area
+    )
     try:
-        # Проверяем, существует ли такая квартира
-        apartment = apartment_repository.get(db=db, id=apartment_id)
-        if not apartment:
-            logger.warning(f"Квартира с ID {apartment_id} не найдена")
+        # Получаем рекомендации вместе с проверкой, что квартира существует
+        similar_apartments = recommender.get_similar_apartments(
+            db=db, apartment_id=apartment_id, n_recommendations=limit, filters=filters
+        )
+        if similar_apartments is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Квартира не найдена",
             )
         
-        # Проверяем, обучена ли модель рекомендаций
-        if not recommender.is_trained:
-            # Обучаем модель, если она еще не обучена
-            logger.info("Модель рекомендаций не обучена, пытаемся обучить")
-            success = recommender.train(db)
-            if not success:
-                logger.warning("Не удалось обучить модель рекомендаций")
-                # Возвращаем пустой список вместо ошибки
-                return []
-        
-        # Получаем рекомендации
-        similar_apartments = recommender.get_similar_apartments(
-            db=db, apartment_id=apartment_id, n_recommendations=limit
-        )
-        
         return similar_apartments
+    except HTTPException:
+        raise
     except Exception as e:
         # Логируем ошибку, но возвращаем пустой список вместо ошибки
         logger.error(f"Ошибка при получении похожих квартир: {str(e)}", exc_info=True)
         return []
 
 
-@router.get("/personalized", response_model=List[Apartment])
+@router.post(
+    "/similar",
+    response_model=SimilarityBatchResponse,
+    dependencies=[Depends(require_model_ready(RECOMMENDER))],
+)
+def find_similar_to_attributes(
+    *,
+    db: Session = Depends(get_db),
+    request: SimilarityBatchRequest,
+) -> Any:
+    """
+    Поиск квартир, похожих на описанные характеристиками, для одного или нескольких запросов
+
+    Результаты возвращаются отдельно для каждого запроса в порядке их следования.
+    """
+    queries = [query.model_dump() for query in request.queries]
+    try:
+        results = recommender.find_similar_to_attributes(db, queries, n_recommendations=request.limit)
+    except Exception as e:
+        logger.error(f"Ошибка при поиске похожих квартир по характеристикам: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Не удалось выполнить поиск похожих квартир",
+        )
+    return {
+        "results": [
+            {"index": index, "apartments": apartments}
+            for index, apartments in enumerate(results)
+        ]
+    }
+
+
+@router.get(
+    "/personalized",
+    response_model=List[Apartment],
+    dependencies=[Depends(require_model_ready(RECOMMENDER))],
+)
 def get_personalized_recommendations(
     *,
     db: Session = Depends(get_db),
@@ -69,16 +109,6 @@ def get_personalized_recommendations(
     Получение персонализированных рекомендаций для текущего пользователя
     """
     try:
-        # Проверяем, обучена ли модель рекомендаций
-        if not recommender.is_trained:
-            # Обучаем модель, если она еще не обучена
-            logger.info("Модель рекомендаций не обучена, пытаемся обучить")
-            success = recommender.train(db)
-            if not success:
-                logger.warning("Не удалось обучить модель рекомендаций")
-                # Возвращаем популярные квартиры вместо ошибки
-                return db.query(Apartment).order_by(Apartment.views.desc()).limit(limit).all()
-        
         # Получаем персонализированные рекомендации
         recommended_apartments = recommender.get_recommendations_for_user(
             db=db, user_id=current_user.id, n_recommendations=limit
@@ -88,4 +118,4 @@ def get_personalized_recommendations(
     except Exception as e:
         # Логируем ошибку, но возвращаем популярные квартиры вместо ошибки
         logger.error(f"Ошибка при получении персонализированных рекомендаций: {str(e)}", exc_info=True)
-        return db.query(Apartment).order_by(Apartment.views.desc()).limit(limit).all()
\ No newline at end of file
+        return popularity.get_popular(db, limit)
\ No newline at end of file
@@ -1,15 +1,17 @@
-from typing import Generator, Optional
+from typing import Callable, Generator, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 
 from app.config.database import get_db
 from app.config.settings import settings
+from app.core.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_ESTIMATED_HEADER, TOTAL_COUNT_HEADER, Page
 from app.repositories.user_repository import user as user_repository
 from app.models.user import User
 from app.schemas.token_schema import TokenPayload
+from app.services.training_manager import training_manager
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
@@ -46,4 +48,54 @@ def get_current_user(
             detail="Пользователь неактивен",
         )
     
-    return user
\ No newline at end of file
+    return user
+
+
+def get_current_admin_user(
+    current_user: User = Depends(get_current_user),
+) -> User:
+    """
+    Получение текущего пользователя с проверкой прав администратора
+    """
+    if current_user.email not in settings.ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав",
+        )
+    return current_user
+
+
+def require_model_ready(name: str) -> Callable[[], None]:
+    """
+    Зависимость, отклоняющая запрос с кодом 503, пока модель не обучена
+
+    Сам запрос модель не обучает: при необходимости обучение запускается
+    в фоне, а клиент сразу получает ответ с заголовком Retry-After.
+    """
+    def dependency() -> None:
+        if not training_manager.is_ready(name):
+            training_manager.ensure_training(name)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Модель еще не готова, повторите запрос позже",
+                headers={"Retry-After": str(settings.MODEL_RETRY_AFTER_SECONDS)},
+            )
+    
+    return dependency
+
+
+def with_next_cursor(response: Response, page: Page) -> Page:
+    """
+    Передача курсора следующей страницы в заголовке ответа
+    """
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return page
+
+
+def with_total_count(response: Response, total: int, exact: bool) -> None:
+    """
+    Передача общего числа записей в заголовках ответа
+    """
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
+    response.headers[TOTAL_COUNT_ESTIMATED_HEADER] = "false" if exact else "true"
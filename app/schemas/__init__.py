@@ -1,5 +1,8 @@
 # Импорт схем
 from app.schemas.user_schema import UserCreate, UserUpdate, UserInDB, User
-from app.schemas.apartment_schema import ApartmentCreate, ApartmentUpdate, ApartmentInDB, Apartment
+from app.schemas.apartment_schema import ApartmentCreate, ApartmentUpdate, ApartmentInDB, Apartment, ApartmentSort, FacetCount, RangeFacetCount, ApartmentFacets
 from app.schemas.favorite_schema import FavoriteCreate, FavoriteInDB, Favorite
-from app.schemas.token_schema import Token, TokenPayload
\ No newline at end of file
+from app.schemas.token_schema import Token, TokenPayload
+from app.schemas.model_schema import ModelVersion, ModelVersions, ModelPin, CacheStats
+from app.schemas.prediction_schema import ApartmentFeatures, PricePredictionItem, PriceBatchResponse
+from app.schemas.recommendation_schema import SimilarityQuery, SimilarityBatchRequest, SimilarityResult, SimilarityBatchResponse
\ No newline at end of file
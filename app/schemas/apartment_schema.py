@@ -1,5 +1,6 @@
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import datetime
+from enum import Enum
 from pydantic import BaseModel, Field
 
 
@@ -46,6 +47,7 @@ class ApartmentInDB(ApartmentBase):
     id: int
     owner_id: int
     views: int
+    price_per_m2: Optional[float] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -56,4 +58,36 @@ class ApartmentInDB(ApartmentBase):
 # Свойства для возврата клиенту
 class Apartment(ApartmentInDB):
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# Порядок списка квартир: поле сортировки, "-" - по убыванию
+class ApartmentSort(str, Enum):
+    price = "price"
+    price_desc = "-price"
+    total_area = "total_area"
+    price_per_m2 = "price_per_m2"
+    created_at_desc = "-created_at"
+    views_desc = "-views"
+
+
+# Число квартир с одним значением поля
+class FacetCount(BaseModel):
+    value: Union[str, int]
+    count: int
+
+
+# Число квартир в интервале [min, max), None - без границы
+class RangeFacetCount(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+    count: int
+
+
+# Счетчики квартир для фильтров интерфейса поиска
+class ApartmentFacets(BaseModel):
+    total: int
+    metro: List[FacetCount]
+    rooms: List[FacetCount]
+    price: List[RangeFacetCount]
+    total_area: List[RangeFacetCount]
\ No newline at end of file
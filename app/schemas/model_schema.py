@@ -0,0 +1,38 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+
+# Метаданные сохраненной версии модели
+class ModelVersion(BaseModel):
+    version: str
+    created_at: str
+    artifact_format: int
+    sklearn_version: str
+    fingerprint: Dict[str, Any]
+    rows: Optional[int] = None
+    compatible: bool
+
+
+# Сводка по модели в хранилище
+class ModelVersions(BaseModel):
+    name: str
+    active_version: Optional[str] = None
+    pinned_version: Optional[str] = None
+    versions: List[ModelVersion]
+
+
+# Запрос на закрепление версии
+class ModelPin(BaseModel):
+    version: str
+
+
+# Счетчики кэша
+class CacheStats(BaseModel):
+    size: int
+    max_entries: int
+    ttl: Optional[float] = None
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    hit_rate: float
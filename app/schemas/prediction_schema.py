@@ -0,0 +1,29 @@
+from typing import Any, List, Optional
+from pydantic import BaseModel, Field
+
+
+# Характеристики квартиры для прогноза стоимости
+class ApartmentFeatures(BaseModel):
+    metro: str
+    way: str
+    minutes: float = Field(ge=0)
+    storey: int
+    storeys: int
+    rooms: int = Field(ge=0)
+    total_area: float = Field(gt=0)
+    living_area: Optional[float] = None
+    kitchen_area: Optional[float] = None
+
+
+# Результат прогноза для одного элемента пакета
+class PricePredictionItem(BaseModel):
+    index: int
+    predicted_price: Optional[float] = None
+    error: Optional[Any] = None
+
+
+# Результат пакетного прогноза
+class PriceBatchResponse(BaseModel):
+    results: List[PricePredictionItem]
+    succeeded: int
+    failed: int
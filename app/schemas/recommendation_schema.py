@@ -0,0 +1,32 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+from app.config.settings import settings
+from app.schemas.apartment_schema import Apartment
+
+
+# Желаемые характеристики квартиры, незаданные не влияют на поиск
+class SimilarityQuery(BaseModel):
+    metro: Optional[str] = None
+    way: Optional[str] = None
+    price: Optional[float] = Field(None, ge=0)
+    minutes: Optional[float] = Field(None, ge=0)
+    rooms: Optional[int] = Field(None, ge=0)
+    total_area: Optional[float] = Field(None, gt=0)
+
+
+# Пакет запросов похожих квартир по характеристикам
+class SimilarityBatchRequest(BaseModel):
+    queries: List[SimilarityQuery] = Field(min_length=1, max_length=settings.RECOMMENDER_QUERY_BATCH_MAX)
+    limit: int = Field(5, ge=1, le=100)
+
+
+# Похожие квартиры для одного запроса пакета
+class SimilarityResult(BaseModel):
+    index: int
+    apartments: List[Apartment]
+
+
+# Результат пакетного поиска похожих квартир
+class SimilarityBatchResponse(BaseModel):
+    results: List[SimilarityResult]
@@ -0,0 +1,444 @@
+import logging
+import math
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Сколько запросов обрабатывается одним матричным умножением
+SEARCH_CHUNK_SIZE = 1024
+
+
+def _squared_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', vectors, vectors)
+
+
+def _top_k(
+    queries: np.ndarray, vectors: np.ndarray, norms: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Точный поиск k ближайших векторов для каждого запроса по евклидову расстоянию
+
+    Возвращает расстояния и позиции в vectors, упорядоченные по возрастанию расстояния.
+    """
+    k = min(k, len(vectors))
+    if k == 0 or len(queries) == 0:
+        return np.empty((len(queries), k), dtype=np.float32), np.empty((len(queries), k), dtype=np.intp)
+
+    # |q - x|² = |q|² - 2·q·x + |x|², вычисляется одним умножением матриц
+    distances = _squared_norms(queries)[:, None] - 2.0 * (queries @ vectors.T) + norms[None, :]
+    if k < len(vectors):
+        indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(len(vectors)), distances.shape).copy()
+    partial = np.take_along_axis(distances, indices, axis=1)
+    order = np.argsort(partial, axis=1, kind='stable')
+    indices = np.take_along_axis(indices, order, axis=1)
+    partial = np.take_along_axis(partial, order, axis=1)
+    return np.sqrt(np.maximum(partial, 0.0)).astype(np.float32), indices
+
+
+def _search_rows(
+    queries: np.ndarray, vectors: np.ndarray, norms: np.ndarray, rows: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Точный поиск только среди заданных строк, возвращает номера строк
+    """
+    subset, subset_norms = vectors[rows], norms[rows]
+    distances, indices = [], []
+    for start in range(0, max(len(queries), 1), SEARCH_CHUNK_SIZE):
+        chunk_distances, positions = _top_k(queries[start:start + SEARCH_CHUNK_SIZE], subset, subset_norms, k)
+        distances.append(chunk_distances)
+        indices.append(rows[positions])
+    return np.concatenate(distances), np.concatenate(indices)
+
+
+def to_dense_float32(matrix) -> np.ndarray:
+    """
+    Приведение результата препроцессора к плотной матрице float32
+    """
+    if hasattr(matrix, 'toarray'):
+        matrix = matrix.toarray()
+    return np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+class ExactIndex:
+    """
+    Точный поиск ближайших соседей по плотной матрице float32
+
+    Запросы обрабатываются порциями, расстояния до всех векторов вычисляются
+    умножением матриц, поэтому время одного запроса линейно зависит от числа векторов.
+    """
+    name = "exact"
+
+    def __init__(self):
+        self.vectors: Optional[np.ndarray] = None
+        self.norms: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def fit(self, vectors: np.ndarray) -> "ExactIndex":
+        self.vectors = to_dense_float32(vectors)
+        self.norms = _squared_norms(self.vectors)
+        return self
+
+    def search(
+        self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k ближайших векторов для каждого запроса: расстояния и номера строк
+
+        mask ограничивает поиск разрешенными строками; если их меньше k,
+        результатов тоже меньше k.
+        """
+        queries = to_dense_float32(queries)
+        if mask is not None:
+            return _search_rows(queries, self.vectors, self.norms, np.flatnonzero(mask), k)
+        distances, indices = [], []
+        for start in range(0, max(len(queries), 1), SEARCH_CHUNK_SIZE):
+            chunk_distances, chunk_indices = _top_k(
+                queries[start:start + SEARCH_CHUNK_SIZE], self.vectors, self.norms, k
+            )
+            distances.append(chunk_distances)
+            indices.append(chunk_indices)
+        return np.concatenate(distances), np.concatenate(indices)
+
+    def search_all(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k ближайших векторов для каждого вектора индекса (включая его самого)
+        """
+        return self.search(self.vectors, k)
+
+
+class IVFIndex:
+    """
+    Приближенный поиск ближайших соседей с инвертированными списками (IVF)
+
+    Векторы разбиваются k-means на nlist кластеров, для каждого кластера хранится
+    список его строк. Запрос сравнивается с центроидами, и точный поиск выполняется
+    только по строкам nprobe ближайших кластеров. nprobe задает баланс между
+    полнотой (recall) и скоростью и может меняться без перестроения индекса.
+    """
+    name = "ivf"
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, random_state: int = 42):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.random_state = random_state
+        self.vectors: Optional[np.ndarray] = None
+        self.norms: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.centroid_norms: Optional[np.ndarray] = None
+        self.list_rows: Optional[np.ndarray] = None  # строки, упорядоченные по кластерам
+        self.list_offsets: Optional[np.ndarray] = None  # границы кластеров в list_rows
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def fit(self, vectors: np.ndarray) -> "IVFIndex":
+        self.vectors = to_dense_float32(vectors)
+        self.norms = _squared_norms(self.vectors)
+        n = len(self.vectors)
+        nlist = self.nlist if self.nlist > 0 else int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        # Центроиды обучаются на подвыборке, достаточной для стабильного разбиения
+        rng = np.random.RandomState(self.random_state)
+        sample_size = min(n, nlist * 64)
+        sample = self.vectors[rng.choice(n, sample_size, replace=False)] if sample_size < n else self.vectors
+        kmeans = MiniBatchKMeans(
+            n_clusters=nlist, n_init=1, batch_size=4096, random_state=self.random_state
+        ).fit(sample)
+        self.centroids = kmeans.cluster_centers_.astype(np.float32)
+        self.centroid_norms = _squared_norms(self.centroids)
+
+        assignments = self._nearest_lists(self.vectors, 1)[:, 0]
+        self.list_rows = np.argsort(assignments, kind='stable').astype(np.int32)
+        self.list_offsets = np.searchsorted(assignments[self.list_rows], np.arange(nlist + 1))
+        self.nlist = nlist
+        logger.info(f"Построен IVF-индекс: {n} векторов, {nlist} кластеров, nprobe = {self.nprobe}")
+        return self
+
+    def _nearest_lists(self, queries: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = []
+        for start in range(0, max(len(queries), 1), SEARCH_CHUNK_SIZE):
+            _, chunk = _top_k(
+                queries[start:start + SEARCH_CHUNK_SIZE], self.centroids, self.centroid_norms, nprobe
+            )
+            lists.append(chunk)
+        return np.concatenate(lists)
+
+    def _candidates(self, lists: np.ndarray) -> np.ndarray:
+        return np.concatenate([
+            self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+        ])
+
+    def _search_candidates(
+        self, queries: np.ndarray, candidates: np.ndarray, k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        # Если в выбранных кластерах меньше k строк, ищем точно по всем разрешенным векторам
+        if len(candidates) < k:
+            candidates = np.arange(len(self.vectors)) if allowed is None else np.flatnonzero(allowed)
+        distances, positions = _top_k(queries, self.vectors[candidates], self.norms[candidates], k)
+        return distances, candidates[positions]
+
+    def search(
+        self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Приближенные k ближайших векторов для каждого запроса: расстояния и номера строк
+
+        mask ограничивает поиск разрешенными строками. Если разрешенных строк меньше,
+        чем в среднем просматривается кластерами, поиск по ним выполняется точно.
+        """
+        queries = to_dense_float32(queries)
+        nprobe = max(1, min(self.nprobe, self.nlist))
+        n_allowed = len(self.vectors) if mask is None else int(mask.sum())
+        k = min(k, n_allowed)
+        if mask is not None and n_allowed <= len(self.vectors) * nprobe / self.nlist:
+            return _search_rows(queries, self.vectors, self.norms, np.flatnonzero(mask), k)
+
+        probes = self._nearest_lists(queries, nprobe)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        indices = np.empty((len(queries), k), dtype=np.intp)
+        for i, query in enumerate(queries):
+            distances[i], indices[i] = self._search_candidates(
+                query[None, :], self._candidates(probes[i]), k, mask
+            )
+        return distances, indices
+
+    def search_all(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Приближенные k ближайших векторов для каждого вектора индекса (включая его самого)
+
+        Для каждой строки, как в search, выбираются nprobe ближайших к ней кластеров.
+        Строки одного кластера ищутся вместе по объединению кластеров, выбранных для
+        каждой из них, поэтому полнота не ниже, чем у search, а расчет идет крупными
+        умножениями матриц, а не по одной строке.
+        """
+        k = min(k, len(self.vectors))
+        nprobe = max(1, min(self.nprobe, self.nlist))
+        probes = self._nearest_lists(self.vectors, nprobe)
+
+        distances = np.empty((len(self.vectors), k), dtype=np.float32)
+        indices = np.empty((len(self.vectors), k), dtype=np.intp)
+        for cluster in range(self.nlist):
+            rows = self.list_rows[self.list_offsets[cluster]:self.list_offsets[cluster + 1]]
+            if len(rows) == 0:
+                continue
+            for start in range(0, len(rows), SEARCH_CHUNK_SIZE):
+                chunk = rows[start:start + SEARCH_CHUNK_SIZE]
+                candidates = self._candidates(np.unique(probes[chunk]))
+                distances[chunk], indices[chunk] = self._search_candidates(self.vectors[chunk], candidates, k)
+        return distances, indices
+
+
+class DeltaBuffer:
+    """
+    Изменения поверх неизменяемого индекса до его следующего перестроения
+
+    Удаленные и измененные строки базового индекса помечаются надгробиями,
+    новые и измененные векторы хранятся отдельно по id и ищутся точно.
+    Вместе с вектором хранятся атрибуты записи для фильтрации при поиске: exact -
+    атрибуты с точным совпадением, ranges - диапазонные, как у AttributeIndex.
+    """
+    def __init__(self, n_base: int, exact: Sequence[str] = (), ranges: Sequence[str] = ()):
+        self.n_base = n_base
+        self.exact = list(exact)
+        self.ranges = list(ranges)
+        self.tombstones = np.zeros(n_base, dtype=bool)
+        self.n_tombstones = 0
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._attributes: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # id, векторы, их нормы и атрибуты в виде колонок, собираются при первом поиске после изменения
+        self._matrix: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, Optional["AttributeIndex"]]] = None
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._vectors
+
+    def get(self, key: int) -> Optional[np.ndarray]:
+        return self._vectors.get(key)
+
+    def _tombstone(self, row: Optional[int]) -> None:
+        if row is not None and not self.tombstones[row]:
+            self.tombstones[row] = True
+            self.n_tombstones += 1
+
+    def upsert(
+        self,
+        key: int,
+        vector: np.ndarray,
+        base_row: Optional[int] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Новый или измененный вектор; прежняя строка базового индекса скрывается
+        """
+        with self._lock:
+            self._tombstone(base_row)
+            self._vectors[key] = to_dense_float32(vector).reshape(-1)
+            self._attributes[key] = attributes or {}
+            self._matrix = None
+
+    def remove(self, key: int, base_row: Optional[int] = None) -> None:
+        with self._lock:
+            self._tombstone(base_row)
+            self._vectors.pop(key, None)
+            self._attributes.pop(key, None)
+            self._matrix = None
+
+    def drift(self) -> float:
+        """
+        Доля изменений относительно размера базового индекса
+        """
+        return (len(self._vectors) + self.n_tombstones) / max(self.n_base, 1)
+
+    def _build_matrix(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional["AttributeIndex"]]:
+        keys = np.fromiter(self._vectors, dtype=np.int64, count=len(self._vectors))
+        vectors = np.stack(list(self._vectors.values()))
+        attributes = None
+        if self.exact or self.ranges:
+            rows = [self._attributes[int(key)] for key in keys]
+            attributes = AttributeIndex(
+                exact={name: np.array([row.get(name) for row in rows], dtype=object) for name in self.exact},
+                ranges={
+                    name: np.array([row.get(name) for row in rows], dtype=np.float64) for name in self.ranges
+                },
+            )
+        return keys, vectors, _squared_norms(vectors), attributes
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        equals: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Точный поиск среди добавленных векторов: расстояния и id
+
+        equals и ranges отбирают записи по атрибутам так же, как AttributeIndex.mask.
+        """
+        with self._lock:
+            if self._matrix is None and self._vectors:
+                self._matrix = self._build_matrix()
+            matrix = self._matrix
+        empty = np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        if matrix is None:
+            return empty
+        keys, vectors, norms, attributes = matrix
+        mask = attributes.mask(equals, ranges) if attributes is not None else None
+        if mask is not None:
+            if not mask.any():
+                return empty
+            keys, vectors, norms = keys[mask], vectors[mask], norms[mask]
+        distances, positions = _top_k(to_dense_float32(queries), vectors, norms, k)
+        return distances, keys[positions]
+
+
+class AttributeIndex:
+    """
+    Разбиение строк индекса по значениям атрибутов для фильтрации при поиске
+
+    Для атрибутов с точным совпадением (станция метро, число комнат) хранятся
+    номера строк каждого значения, для диапазонных (цена, площадь) - строки,
+    упорядоченные по значению. Маска фильтра собирается за время, пропорциональное
+    числу строк самого избирательного условия, а не размеру индекса.
+    """
+    def __init__(self, exact: Dict[str, np.ndarray], ranges: Dict[str, np.ndarray]):
+        self.values = {name: np.asarray(values) for name, values in {**exact, **ranges}.items()}
+        self.n_rows = len(next(iter(self.values.values())))
+        self.partitions: Dict[str, Tuple[Dict[Any, int], np.ndarray, np.ndarray]] = {}
+        for name, values in exact.items():
+            uniques, inverse = np.unique(np.asarray(values), return_inverse=True)
+            order = np.argsort(inverse, kind='stable').astype(np.int32)
+            offsets = np.searchsorted(inverse[order], np.arange(len(uniques) + 1))
+            positions = {value.item() if hasattr(value, 'item') else value: i for i, value in enumerate(uniques)}
+            self.partitions[name] = (positions, order, offsets)
+
+        self.sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for name, values in ranges.items():
+            values = np.asarray(values, dtype=np.float64)
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            self.sorted[name] = (values[order], order)
+
+    def _rows_equal(self, name: str, value: Any) -> np.ndarray:
+        positions, order, offsets = self.partitions[name]
+        i = positions.get(value)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return order[offsets[i]:offsets[i + 1]]
+
+    def _rows_between(self, name: str, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        values, order = self.sorted[name]
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        end = len(values) if high is None else np.searchsorted(values, high, side='right')
+        return order[start:end]
+
+    def mask(
+        self,
+        equals: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Маска строк, удовлетворяющих всем условиям; None, если условий нет
+        """
+        conditions = [
+            (self._rows_equal(name, value), name, value, value)
+            for name, value in (equals or {}).items()
+        ]
+        conditions += [
+            (self._rows_between(name, low, high), name, low, high)
+            for name, (low, high) in (ranges or {}).items()
+            if low is not None or high is not None
+        ]
+        if not conditions:
+            return None
+
+        # Берем строки самого избирательного условия и проверяем на них остальные
+        conditions.sort(key=lambda condition: len(condition[0]))
+        rows = conditions[0][0]
+        for _, name, low, high in conditions[1:]:
+            values = self.values[name][rows]
+            keep = np.ones(len(rows), dtype=bool)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            rows = rows[keep]
+
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return mask
+
+
+def build_index(vectors, backend: Optional[str] = None):
+    """
+    Построение индекса ближайших соседей выбранного в настройках типа
+
+    "auto" выбирает точный поиск для небольших данных и IVF начиная
+    с RECOMMENDER_IVF_MIN_ROWS векторов.
+    """
+    backend = backend or settings.RECOMMENDER_INDEX
+    if backend == "auto":
+        backend = "ivf" if vectors.shape[0] >= settings.RECOMMENDER_IVF_MIN_ROWS else "exact"
+
+    if backend == "ivf":
+        return IVFIndex(
+            nlist=settings.RECOMMENDER_IVF_NLIST, nprobe=settings.RECOMMENDER_IVF_NPROBE
+        ).fit(vectors)
+    if backend == "exact":
+        return ExactIndex().fit(vectors)
+    raise ValueError(f"Неизвестный тип индекса: {backend}")
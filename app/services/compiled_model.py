@@ -0,0 +1,198 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedModelError(ValueError):
+    """
+    Пайплайн содержит шаги, для которых нет скомпилированной реализации
+    """
+
+
+class _TreeEnsemble:
+    """
+    Ансамбль деревьев решений в виде плоских массивов для одновременного обхода всех деревьев
+    """
+    def __init__(self, trees: List[Any]):
+        features, thresholds, left, right, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in trees:
+            tree_ = tree.tree_
+            node_ids = np.arange(tree_.node_count)
+            is_leaf = tree_.children_left == -1
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree_.feature))
+            thresholds.append(tree_.threshold)
+            # Лист ссылается сам на себя, чтобы обход всех деревьев шел одинаковое число шагов
+            left.append(np.where(is_leaf, node_ids, tree_.children_left) + offset)
+            right.append(np.where(is_leaf, node_ids, tree_.children_right) + offset)
+            values.append(tree_.value.reshape(tree_.node_count))
+            max_depth = max(max_depth, tree_.max_depth)
+            offset += tree_.node_count
+
+        self.features = np.concatenate(features).astype(np.intp)
+        self.thresholds = np.concatenate(thresholds)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.values = np.concatenate(values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+    def leaf_values(self, x: np.ndarray) -> np.ndarray:
+        # Деревья sklearn сравнивают признаки в float32
+        x = x.astype(np.float32)
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            go_left = x[self.features[nodes]] <= self.thresholds[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.values[nodes]
+
+
+class CompiledPricePipeline:
+    """
+    Скомпилированный путь вывода обученного пайплайна без pandas и ColumnTransformer
+
+    Хранит индексы one-hot кодирования категорий, параметры StandardScaler и параметры
+    регрессора (коэффициенты линейной модели или массивы деревьев) и вычисляет прогноз
+    для одной квартиры напрямую на массивах NumPy.
+    """
+    def __init__(self, pipeline: Pipeline, categorical_features: List[str], numerical_features: List[str]):
+        preprocessor = pipeline.named_steps['preprocessor']
+        regressor = pipeline.named_steps['regressor']
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise UnsupportedModelError(type(preprocessor).__name__)
+
+        self.categorical_features = categorical_features
+        self.numerical_features = numerical_features
+        self._compile_preprocessor(preprocessor)
+        self._compile_regressor(regressor)
+
+    def _compile_preprocessor(self, preprocessor: ColumnTransformer) -> None:
+        encoder, scaler = None, None
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == 'remainder' and transformer == 'drop':
+                continue
+            if isinstance(transformer, OneHotEncoder) and list(columns) == self.categorical_features:
+                encoder = transformer
+            elif isinstance(transformer, StandardScaler) and list(columns) == self.numerical_features:
+                scaler = transformer
+            else:
+                raise UnsupportedModelError(f"{name}: {type(transformer).__name__}")
+        if encoder is None or scaler is None or encoder.drop_idx_ is not None or encoder._infrequent_enabled:
+            raise UnsupportedModelError("препроцессор")
+        if [name for name, _, _ in preprocessor.transformers_ if name != 'remainder'] != ['cat', 'num']:
+            raise UnsupportedModelError("порядок признаков")
+
+        # Позиция признака в выходном векторе для каждого значения категории
+        self.category_index: List[Dict[Any, int]] = []
+        offset = 0
+        for categories in encoder.categories_:
+            self.category_index.append({value: offset + i for i, value in enumerate(categories)})
+            offset += len(categories)
+        self.n_categorical = offset
+        self.n_features = offset + len(self.numerical_features)
+
+        self.mean = scaler.mean_ if scaler.with_mean else np.zeros(len(self.numerical_features))
+        self.scale = scaler.scale_ if scaler.with_std else np.ones(len(self.numerical_features))
+
+    def _compile_regressor(self, regressor: Any) -> None:
+        self.coef = None
+        self.trees = None
+        coef = getattr(regressor, 'coef_', None) if not hasattr(regressor, 'estimators_') else None
+
+        if coef is not None:
+            if hasattr(coef, 'toarray'):
+                coef = coef.toarray()
+            coef = np.asarray(coef).reshape(-1)
+            self.coef = coef
+            self.coef_numerical = coef[self.n_categorical:]
+            self.intercept = float(np.asarray(regressor.intercept_).reshape(-1)[0])
+        elif isinstance(regressor, RandomForestRegressor):
+            self.trees = _TreeEnsemble(regressor.estimators_)
+            self.tree_weight = 1.0 / len(regressor.estimators_)
+            self.intercept = 0.0
+        elif isinstance(regressor, GradientBoostingRegressor):
+            self.trees = _TreeEnsemble(regressor.estimators_[:, 0])
+            self.tree_weight = regressor.learning_rate
+            if regressor.init_ == 'zero':
+                self.intercept = 0.0
+            else:
+                self.intercept = float(regressor.init_.predict(np.zeros((1, self.n_features)))[0])
+        else:
+            raise UnsupportedModelError(type(regressor).__name__)
+
+    def _numerical(self, features: Dict[str, Any]) -> np.ndarray:
+        values = np.array([features[column] for column in self.numerical_features], dtype=np.float64)
+        return (values - self.mean) / self.scale
+
+    def predict_one(self, features: Dict[str, Any]) -> float:
+        """
+        Прогноз для одной квартиры с уже нормализованными признаками
+        """
+        positions = [
+            index[features[column]]
+            for index, column in zip(self.category_index, self.categorical_features)
+            if features[column] in index
+        ]
+        numerical = self._numerical(features)
+
+        if self.coef is not None:
+            return self.intercept + float(self.coef[positions].sum()) + float(numerical @ self.coef_numerical)
+
+        x = np.zeros(self.n_features)
+        x[positions] = 1.0
+        x[self.n_categorical:] = numerical
+        return self.intercept + self.tree_weight * float(self.trees.leaf_values(x).sum())
+
+    def check_parity(self, pipeline: Pipeline, n_samples: int = 200, tolerance: float = 1e-6) -> bool:
+        """
+        Сравнение прогнозов с исходным пайплайном sklearn на синтетических данных
+        """
+        rng = np.random.RandomState(0)
+        rows = []
+        for _ in range(n_samples):
+            row = {}
+            for index, column in zip(self.category_index, self.categorical_features):
+                # Включаем и неизвестные модели значения
+                choices = list(index) + ['__unknown__']
+                row[column] = choices[rng.randint(len(choices))]
+            numerical = self.mean + self.scale * rng.randn(len(self.numerical_features))
+            for column, value in zip(self.numerical_features, numerical):
+                row[column] = float(value)
+            rows.append(row)
+
+        expected = pipeline.predict(pd.DataFrame(rows))
+        actual = np.array([self.predict_one(row) for row in rows])
+        error = np.max(np.abs(expected - actual) / np.maximum(np.abs(expected), 1.0))
+        if error > tolerance:
+            logger.warning(f"Скомпилированная модель расходится с пайплайном: относительная ошибка {error:.2e}")
+            return False
+        return True
+
+
+def compile_pipeline(
+    pipeline: Pipeline, categorical_features: List[str], numerical_features: List[str]
+) -> Optional[CompiledPricePipeline]:
+    """
+    Сборка скомпилированного пути вывода с проверкой совпадения прогнозов
+
+    Возвращает None, если модель не поддерживается или прогнозы расходятся;
+    тогда прогноз выполняется исходным пайплайном.
+    """
+    try:
+        compiled = CompiledPricePipeline(pipeline, categorical_features, numerical_features)
+    except UnsupportedModelError as e:
+        logger.info(f"Скомпилированный путь вывода недоступен: {e}")
+        return None
+    if not compiled.check_parity(pipeline):
+        return None
+    return compiled
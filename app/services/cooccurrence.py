@@ -0,0 +1,294 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.favorite import Favorite
+
+logger = logging.getLogger(__name__)
+
+# Сколько квартир обрабатывается за один шаг умножения при построении матрицы
+BUILD_BLOCK_SIZE = 4096
+
+# Меньшее число изменений словари учитывают без заметных затрат, перестроение не требуется
+MIN_DRIFT_BASE = 10000
+
+
+def load_favorite_pairs(db: Session, chunk_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Пары (пользователь, квартира) из избранного в порядке добавления
+    """
+    chunk_size = chunk_size or settings.FEATURE_CHUNK_SIZE
+    statement = (
+        select(Favorite.user_id, Favorite.apartment_id)
+        .where(Favorite.user_id.is_not(None), Favorite.apartment_id.is_not(None))
+        .order_by(Favorite.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    users, apartments = [], []
+    result = db.execute(statement)
+    try:
+        for partition in result.partitions(chunk_size):
+            chunk = np.array(partition, dtype=np.int64).reshape(-1, 2)
+            users.append(chunk[:, 0])
+            apartments.append(chunk[:, 1])
+    finally:
+        result.close()
+    if not users:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(users), np.concatenate(apartments)
+
+
+def _limit_user_items(users: np.ndarray, items: np.ndarray, max_user_items: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Уникальные пары с не более чем max_user_items последними квартирами каждого пользователя
+
+    Вклад пользователя в матрицу растет как квадрат числа его избранных,
+    поэтому ограничение делает время построения линейным по числу пользователей.
+    """
+    # Внутри пользователя последние добавленные идут первыми, из повторов остается последний
+    order = np.lexsort((-np.arange(len(users)), users))
+    users, items = users[order], items[order]
+    first = np.unique(np.stack([users, items], axis=1), axis=0, return_index=True)[1]
+    keep = np.sort(first)
+    users, items = users[keep], items[keep]
+
+    if max_user_items > 0 and len(users):
+        # Номер записи внутри пользователя
+        starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        lengths = np.diff(np.r_[starts, len(users)])
+        rank = np.arange(len(users)) - np.repeat(starts, lengths)
+        keep = rank < max_user_items
+        users, items = users[keep], items[keep]
+    return users, items
+
+
+class CooccurrenceIndex:
+    """
+    Матрица похожести квартир по совместному добавлению в избранное
+
+    Похожесть двух квартир - косинус между множествами добавивших их пользователей:
+    число общих пользователей, деленное на корень из произведения их количеств.
+    Для каждой квартиры хранятся только k самых похожих (CSR: indptr, indices, counts),
+    матрица пользователь-квартира сохраняется, чтобы обновлять счетчики инкрементально.
+    Изменения избранного после построения накапливаются в словарях поверх базовых
+    массивов до следующего перестроения.
+    """
+    def __init__(
+        self,
+        item_ids: np.ndarray,
+        item_counts: np.ndarray,
+        similar: sparse.csr_matrix,
+        user_ids: np.ndarray,
+        user_items: sparse.csr_matrix,
+    ):
+        self.item_ids = item_ids
+        self.item_counts = item_counts
+        self.similar = similar  # число общих пользователей для k самых похожих квартир
+        self.user_ids = user_ids
+        self.user_items = user_items
+        self._reset_delta()
+
+    def _reset_delta(self) -> None:
+        self._pairs: Dict[int, Dict[int, float]] = defaultdict(dict)
+        self._counts: Dict[int, float] = {}
+        self._users: Dict[int, Set[int]] = {}
+        self._changes = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict:
+        # Сохраняется только базовая матрица, изменения применяются заново из журнала
+        return {
+            name: getattr(self, name)
+            for name in ('item_ids', 'item_counts', 'similar', 'user_ids', 'user_items')
+        }
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._reset_delta()
+
+    @property
+    def n_interactions(self) -> int:
+        return self.user_items.nnz
+
+    @classmethod
+    def build(
+        cls,
+        users: np.ndarray,
+        items: np.ndarray,
+        k: int,
+        max_user_items: int = 0,
+        block_size: int = BUILD_BLOCK_SIZE,
+    ) -> "CooccurrenceIndex":
+        """
+        Построение матрицы из пар (пользователь, квартира)
+
+        Произведение Xᵀ·X считается блоками по block_size квартир, и в каждом блоке
+        сразу остается только k лучших соседей, поэтому в памяти не бывает полной
+        матрицы совместной встречаемости.
+        """
+        users, items = _limit_user_items(users, items, max_user_items)
+        user_ids, user_rows = np.unique(users, return_inverse=True)
+        item_ids, item_rows = np.unique(items, return_inverse=True)
+        n_items = len(item_ids)
+
+        user_items = sparse.csr_matrix(
+            (np.ones(len(users), dtype=np.float32), (user_rows, item_rows)),
+            shape=(len(user_ids), n_items),
+        )
+        item_users = user_items.T.tocsr()
+        item_counts = np.asarray(user_items.sum(axis=0), dtype=np.float32).reshape(-1)
+
+        indptr = [np.zeros(1, dtype=np.int64)]
+        indices, counts = [], []
+        for start in range(0, n_items, block_size):
+            block = (item_users[start:start + block_size] @ user_items).tocoo()
+            rows, columns, values = block.row, block.col, block.data
+            rows_global = rows + start
+            # Квартира не считается похожей сама на себя
+            keep = columns != rows_global
+            rows, columns, values = rows[keep], columns[keep], values[keep]
+            similarity = values / np.sqrt(item_counts[rows + start] * item_counts[columns])
+
+            # k лучших соседей в каждой строке блока
+            order = np.lexsort((-similarity, rows))
+            rows, columns, values = rows[order], columns[order], values[order]
+            row_starts = np.searchsorted(rows, np.arange(min(block_size, n_items - start) + 1))
+            rank = np.arange(len(rows)) - row_starts[rows]
+            keep = rank < k
+            rows, columns, values = rows[keep], columns[keep], values[keep]
+
+            row_lengths = np.bincount(rows, minlength=len(row_starts) - 1)
+            indptr.append(indptr[-1][-1] + np.cumsum(row_lengths))
+            indices.append(columns.astype(np.int32))
+            counts.append(values.astype(np.float32))
+
+        similar = sparse.csr_matrix(
+            (
+                np.concatenate(counts) if counts else np.empty(0, dtype=np.float32),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                np.concatenate(indptr),
+            ),
+            shape=(n_items, n_items),
+        )
+        logger.info(
+            f"Матрица совместного избранного: {n_items} квартир, {len(user_ids)} пользователей, "
+            f"{similar.nnz} пар"
+        )
+        return cls(item_ids, item_counts, similar, user_ids, user_items)
+
+    def _rows_of(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.searchsorted(self.item_ids, ids)
+        rows = np.minimum(rows, max(len(self.item_ids) - 1, 0))
+        found = (self.item_ids[rows] == ids) if len(self.item_ids) else np.zeros(len(ids), dtype=bool)
+        return rows, found
+
+    def _items_of(self, user_id: int) -> Set[int]:
+        items = self._users.get(user_id)
+        if items is not None:
+            return items
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            columns = self.user_items.indices[self.user_items.indptr[row]:self.user_items.indptr[row + 1]]
+            return {int(item) for item in self.item_ids[columns]}
+        return set()
+
+    def _update(self, user_id: int, apartment_id: int, sign: float) -> None:
+        with self._lock:
+            items = set(self._items_of(user_id))
+            if (apartment_id in items) == (sign > 0):
+                return
+            items.discard(apartment_id)
+            for other in items:
+                self._pairs[apartment_id][other] = self._pairs[apartment_id].get(other, 0.0) + sign
+                self._pairs[other][apartment_id] = self._pairs[other].get(apartment_id, 0.0) + sign
+            self._counts[apartment_id] = self._counts.get(apartment_id, 0.0) + sign
+            if sign > 0:
+                items.add(apartment_id)
+            self._users[user_id] = items
+            self._changes += 1
+
+    def add(self, user_id: int, apartment_id: int) -> None:
+        """
+        Пользователь добавил квартиру в избранное
+        """
+        self._update(user_id, apartment_id, 1.0)
+
+    def remove(self, user_id: int, apartment_id: int) -> None:
+        """
+        Пользователь убрал квартиру из избранного
+        """
+        self._update(user_id, apartment_id, -1.0)
+
+    def drift(self) -> float:
+        """
+        Доля изменений избранного относительно числа пар при построении
+        """
+        return self._changes / max(self.n_interactions, MIN_DRIFT_BASE)
+
+    def _counts_of(self, ids: np.ndarray, count_delta: Dict[int, float]) -> np.ndarray:
+        rows, found = self._rows_of(ids)
+        counts = np.where(found, self.item_counts[rows] if len(self.item_ids) else 0.0, 0.0)
+        if count_delta:
+            uniques, inverse = np.unique(ids, return_inverse=True)
+            extra = np.array([count_delta.get(int(i), 0.0) for i in uniques])
+            counts = counts + extra[inverse]
+        return counts
+
+    def score(self, favorite_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Оценка квартир по похожести на избранные: id кандидатов и сумма косинусов
+
+        Соседи всех избранных берутся из CSR-строк одним векторным проходом,
+        изменения после построения добавляются к счетчикам пар.
+        """
+        favorites = np.unique(np.asarray(list(favorite_ids), dtype=np.int64))
+        rows, found = self._rows_of(favorites)
+        rows = rows[found]
+
+        # Соседи всех избранных: номера строк источника и позиции в CSR
+        starts, ends = self.similar.indptr[rows], self.similar.indptr[rows + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        sources = [np.repeat(self.item_ids[rows], lengths)]
+        targets = [self.item_ids[self.similar.indices[positions]]]
+        counts = [self.similar.data[positions].astype(np.float64)]
+
+        with self._lock:
+            pairs = [(int(i), dict(self._pairs[int(i)])) for i in favorites if int(i) in self._pairs]
+            count_delta = dict(self._counts)
+        for source, neighbors in pairs:
+            if neighbors:
+                sources.append(np.full(len(neighbors), source, dtype=np.int64))
+                targets.append(np.fromiter(neighbors.keys(), dtype=np.int64, count=len(neighbors)))
+                counts.append(np.fromiter(neighbors.values(), dtype=np.float64, count=len(neighbors)))
+
+        sources, targets, counts = np.concatenate(sources), np.concatenate(targets), np.concatenate(counts)
+        if not len(targets):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        norms = np.sqrt(self._counts_of(sources, count_delta) * self._counts_of(targets, count_delta))
+        similarity = np.divide(counts, norms, out=np.zeros_like(counts), where=norms > 0)
+        candidates, inverse = np.unique(targets, return_inverse=True)
+        scores = np.bincount(inverse, weights=similarity, minlength=len(candidates))
+        keep = scores > 0
+        return candidates[keep], scores[keep]
+
+
+def build_cooccurrence(db: Session) -> CooccurrenceIndex:
+    """
+    Построение матрицы совместного избранного по текущим данным
+    """
+    users, items = load_favorite_pairs(db)
+    return CooccurrenceIndex.build(
+        users,
+        items,
+        k=settings.RECOMMENDER_CF_NEIGHBORS,
+        max_user_items=settings.RECOMMENDER_CF_MAX_USER_ITEMS,
+    )
@@ -0,0 +1,91 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.core.cache import TTLCache
+from app.core.change_log import ChangeEvent, apartment_changes
+from app.repositories.apartment_repository import apartment as apartment_repository
+from app.services.search_index import search_index
+
+logger = logging.getLogger(__name__)
+
+
+def _ranges(counts: Dict[int, int], edges: Sequence[float]) -> List[Dict[str, Any]]:
+    """
+    Все интервалы [min, max) по порядку, включая пустые, чтобы набор интервалов не зависел от фильтров
+    """
+    bounds = [None, *edges, None]
+    return [
+        {"min": bounds[i], "max": bounds[i + 1], "count": counts.get(i, 0)}
+        for i in range(len(edges) + 1)
+    ]
+
+
+class FacetService:
+    """
+    Число квартир по значениям фильтров для интерфейса поиска
+
+    Счетчики считаются индексом поиска в памяти, если он включен, иначе одним
+    группирующим запросом к БД, и кэшируются для каждого набора фильтров до
+    следующего изменения квартир.
+    """
+    def __init__(self, price_edges: Sequence[float], area_edges: Sequence[float]):
+        self.price_edges = sorted(price_edges)
+        self.area_edges = sorted(area_edges)
+        self.cache = TTLCache(settings.FACETS_CACHE_SIZE, settings.FACETS_CACHE_TTL)
+
+    def get_facets(
+        self,
+        db: Session,
+        *,
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Счетчики по станциям, числу комнат и интервалам цены и площади среди квартир, подходящих под фильтры
+        """
+        # Пустые станция и число комнат не фильтруют, как в поиске
+        filters = {
+            "metro": metro or None,
+            "min_price": min_price,
+            "max_price": max_price,
+            "rooms": rooms or None,
+            "min_area": min_area,
+        }
+        key = tuple(filters.values())
+        facets = self.cache.get(key)
+        if facets is not None:
+            return facets
+
+        source = search_index if settings.SEARCH_INDEX_ENABLED else apartment_repository
+        counts = source.facets(db, price_edges=self.price_edges, area_edges=self.area_edges, **filters)
+        facets = {
+            "total": counts["total"],
+            "metro": [
+                {"value": value, "count": count}
+                for value, count in sorted(counts["metro"].items(), key=lambda item: (-item[1], item[0]))
+            ],
+            "rooms": [{"value": value, "count": count} for value, count in sorted(counts["rooms"].items())],
+            "price": _ranges(counts["price"], self.price_edges),
+            "total_area": _ranges(counts["total_area"], self.area_edges),
+        }
+        self.cache.set(key, facets)
+        return facets
+
+    def apply_change(self, event: ChangeEvent) -> None:
+        """
+        Сброс кэша при изменении квартир
+        """
+        self.cache.clear()
+
+
+# Создаем синглтон для использования в приложении
+facets = FacetService(settings.FACET_PRICE_BUCKETS, settings.FACET_AREA_BUCKETS)
+
+# Счетчики устаревают при любом изменении квартир
+apartment_changes.subscribe(facets.apply_change)
@@ -0,0 +1,114 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.apartment import Apartment
+
+logger = logging.getLogger(__name__)
+
+# Тип колонки в DataFrame и значение для пропусков (None - оставить пропуск)
+APARTMENT_COLUMNS: Dict[str, Tuple[str, Any]] = {
+    'id': ('int64', None),
+    'metro': ('category', ''),
+    'way': ('category', ''),
+    'price': ('float64', 0.0),
+    'minutes': ('float32', 0.0),
+    'storey': ('float32', 0.0),
+    'storeys': ('float32', 0.0),
+    'rooms': ('float32', 0.0),
+    'total_area': ('float32', 0.0),
+    'living_area': ('float32', 0.0),
+    'kitchen_area': ('float32', 0.0),
+}
+
+
+def normalize_category(value: Any) -> str:
+    """
+    Приведение значения категориального признака к каноническому виду
+    """
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def normalize_features(
+    apartment_data: Dict[str, Any], categorical: List[str], numerical: List[str], required: bool = False
+) -> Dict[str, Any]:
+    """
+    Нормализация признаков одной квартиры так же, как при извлечении обучающих данных
+
+    Пустое или отсутствующее значение заменяется так же, как NULL в базе. С required
+    отсутствующий признак - ошибка: прогноз цены не должен строиться по нулям.
+    """
+    if required:
+        missing = [column for column in categorical + numerical if column not in apartment_data]
+        if missing:
+            raise ValueError(f"Не заданы признаки: {', '.join(missing)}")
+
+    features = {}
+    for column in categorical:
+        features[column] = normalize_category(apartment_data.get(column))
+    for column in numerical:
+        value = apartment_data.get(column)
+        features[column] = float(value) if value is not None else APARTMENT_COLUMNS[column][1]
+    return features
+
+
+def _build_column(name: str, values: Tuple[Any, ...]):
+    dtype, fill_value = APARTMENT_COLUMNS[name]
+    if dtype == 'category':
+        return pd.Categorical([normalize_category(value) for value in values])
+
+    # None превращается в NaN при создании массива с плавающей точкой
+    array = np.array(values, dtype='float64')
+    if fill_value is not None:
+        np.nan_to_num(array, copy=False, nan=fill_value)
+    return array.astype(dtype, copy=False)
+
+
+def load_apartment_frame(
+    db: Session, columns: List[str], chunk_size: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Загрузка выбранных колонок квартир в типизированный DataFrame без создания ORM-объектов
+
+    Строки читаются курсором на стороне сервера порциями по chunk_size и сразу
+    превращаются в массивы NumPy, поэтому в памяти одновременно находится одна порция
+    кортежей и уже собранные колонки.
+    """
+    chunk_size = chunk_size or settings.FEATURE_CHUNK_SIZE
+    statement = (
+        select(*[getattr(Apartment, column) for column in columns])
+        .order_by(Apartment.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+
+    chunks: Dict[str, list] = {column: [] for column in columns}
+    result = db.execute(statement)
+    try:
+        for partition in result.partitions(chunk_size):
+            for column, values in zip(columns, zip(*partition)):
+                chunks[column].append(_build_column(column, values))
+    finally:
+        result.close()
+
+    data = {}
+    for column in columns:
+        dtype = APARTMENT_COLUMNS[column][0]
+        parts = chunks[column]
+        if not parts:
+            data[column] = pd.Series([], dtype=dtype)
+        elif dtype == 'category':
+            data[column] = union_categoricals(parts)
+        else:
+            data[column] = np.concatenate(parts)
+
+    df = pd.DataFrame(data, columns=columns)
+    logger.info(f"Извлечено {len(df)} записей квартир, {df.memory_usage(deep=True).sum() / 2**20:.1f} МБ")
+    return df
@@ -0,0 +1,297 @@
+import logging
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+
+logger = logging.getLogger(__name__)
+
+# Данные, переданные процессу-исполнителю один раз при его запуске
+_worker_data: Optional[Tuple[Any, Any, Any, Any]] = None
+
+
+def evaluate_model(model, X_train, X_test, y_train, y_test) -> Dict[str, float]:
+    """
+    Оценка производительности модели на тестовых данных
+    """
+    started = time.perf_counter()
+
+    # Обучаем модель
+    model.fit(X_train, y_train)
+
+    # Предсказываем на обучающих и тестовых данных
+    y_train_pred = model.predict(X_train)
+    y_test_pred = model.predict(X_test)
+
+    # Вычисляем метрики
+    train_mse = mean_squared_error(y_train, y_train_pred)
+    test_mse = mean_squared_error(y_test, y_test_pred)
+    train_rmse = np.sqrt(train_mse)
+    test_rmse = np.sqrt(test_mse)
+    train_mae = mean_absolute_error(y_train, y_train_pred)
+    test_mae = mean_absolute_error(y_test, y_test_pred)
+    train_r2 = r2_score(y_train, y_train_pred)
+    test_r2 = r2_score(y_test, y_test_pred)
+
+    # Относительная ошибка (в процентах)
+    train_rel_error = np.mean(np.abs((y_train - y_train_pred) / y_train)) * 100
+    test_rel_error = np.mean(np.abs((y_test - y_test_pred) / y_test)) * 100
+
+    return {
+        'train_mse': train_mse,
+        'test_mse': test_mse,
+        'train_rmse': train_rmse,
+        'test_rmse': test_rmse,
+        'train_mae': train_mae,
+        'test_mae': test_mae,
+        'train_r2': train_r2,
+        'test_r2': test_r2,
+        'train_rel_error': train_rel_error,
+        'test_rel_error': test_rel_error,
+        'fit_time': time.perf_counter() - started,
+    }
+
+
+def _init_worker(X_train, X_test, y_train, y_test) -> None:
+    global _worker_data
+    _worker_data = (X_train, X_test, y_train, y_test)
+
+
+def _evaluate_task(pipeline, train_rows=None) -> Dict[str, float]:
+    """
+    Оценка одного кандидата на данных процесса, при необходимости на подвыборке строк
+    """
+    X_train, X_test, y_train, y_test = _worker_data
+    if train_rows is not None:
+        X_train = X_train.iloc[train_rows]
+        y_train = y_train.iloc[train_rows]
+    return evaluate_model(pipeline, X_train, X_test, y_train, y_test)
+
+
+def failed_scores(error: str, fit_time: float) -> Dict[str, Any]:
+    return {'test_r2': -float('inf'), 'fit_time': fit_time, 'error': error}
+
+
+class CandidateEvaluator:
+    """
+    Параллельная оценка моделей-кандидатов в пуле процессов
+
+    Данные передаются каждому процессу один раз при запуске пула. Одновременно
+    выполняется не больше задач, чем свободных процессов, поэтому время начала
+    каждой задачи известно и тайм-аут отсчитывается для каждого кандидата отдельно.
+    Процесс, превысивший тайм-аут, больше не получает задач и завершается вместе с пулом.
+    """
+    def __init__(self, X_train, X_test, y_train, y_test, *, workers: int = 0, timeout: Optional[float] = None):
+        self.data = (X_train, X_test, y_train, y_test)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self._pool = None
+        self._capacity = 0
+
+    def __enter__(self) -> "CandidateEvaluator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _start_pool(self) -> None:
+        # spawn вместо fork: обучение идет в фоновом потоке работающего сервера
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            processes=self.workers, initializer=_init_worker, initargs=self.data
+        )
+        self._capacity = self.workers
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def evaluate(
+        self,
+        candidates: Dict[str, Any],
+        train_rows=None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Оценка всех кандидатов, возвращает метрики по имени кандидата
+
+        timeout ограничивает время каждого кандидата в этом вызове сильнее тайм-аута оценщика,
+        deadline (момент по time.perf_counter) - время всего вызова: кандидаты, не успевшие
+        завершиться к этому моменту, исключаются из сравнения.
+        """
+        if self.workers == 1 or len(candidates) == 1:
+            return self._evaluate_inline(candidates, train_rows, deadline)
+        limits = [limit for limit in (self.timeout, timeout) if limit is not None]
+        return self._evaluate_parallel(candidates, train_rows, min(limits) if limits else None, deadline)
+
+    def _evaluate_inline(
+        self, candidates: Dict[str, Any], train_rows, deadline: Optional[float]
+    ) -> Dict[str, Dict[str, Any]]:
+        # Обучение в этом процессе нельзя прервать, поэтому срок проверяется между кандидатами
+        _init_worker(*self.data)
+        scores = {}
+        for name, pipeline in candidates.items():
+            started = time.perf_counter()
+            if deadline is not None and started >= deadline:
+                logger.warning(f"Бюджет времени исчерпан, модель {name} исключена из сравнения")
+                scores[name] = failed_scores("timeout", 0.0)
+                continue
+            try:
+                scores[name] = _evaluate_task(pipeline, train_rows)
+            except Exception as e:
+                logger.error(f"Ошибка при оценке модели {name}: {e}")
+                scores[name] = failed_scores(str(e), time.perf_counter() - started)
+        return scores
+
+    def _evaluate_parallel(
+        self, candidates: Dict[str, Any], train_rows, timeout: Optional[float], deadline: Optional[float]
+    ) -> Dict[str, Dict[str, Any]]:
+        queue: List[str] = list(candidates)
+        running: Dict[str, Tuple[Any, float]] = {}
+        scores: Dict[str, Dict[str, Any]] = {}
+
+        while queue or running:
+            if self._pool is None or (self._capacity == 0 and not running):
+                # Все процессы заняты зависшими задачами - запускаем новый пул
+                self.close()
+                self._start_pool()
+
+            while queue and len(running) < self._capacity:
+                name = queue.pop(0)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    logger.warning(f"Бюджет времени исчерпан, модель {name} исключена из сравнения")
+                    scores[name] = failed_scores("timeout", 0.0)
+                    continue
+                result = self._pool.apply_async(_evaluate_task, (candidates[name], train_rows))
+                running[name] = (result, time.perf_counter())
+
+            time.sleep(0.01)
+            now = time.perf_counter()
+            for name, (result, started) in list(running.items()):
+                if result.ready():
+                    del running[name]
+                    try:
+                        scores[name] = result.get()
+                    except Exception as e:
+                        logger.error(f"Ошибка при оценке модели {name}: {e}")
+                        scores[name] = failed_scores(str(e), now - started)
+                elif (
+                    (timeout is not None and now - started > timeout)
+                    or (deadline is not None and now > deadline)
+                ):
+                    del running[name]
+                    self._capacity -= 1
+                    logger.warning(f"Модель {name} не уложилась в отведенное время и исключена из сравнения")
+                    scores[name] = failed_scores("timeout", now - started)
+
+        return {name: scores[name] for name in candidates}
+
+
+def stratified_subsample(y, size: int, bins: int = 10, random_state: int = 42) -> Optional[np.ndarray]:
+    """
+    Позиции стратифицированной по квантилям целевой переменной подвыборки
+
+    При одинаковом random_state меньшая подвыборка почти целиком входит в большую,
+    поэтому результаты на соседних ступенях сравнимы. None означает всю выборку.
+    """
+    values = np.asarray(y)
+    n = len(values)
+    if size >= n:
+        return None
+
+    rng = np.random.RandomState(random_state)
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+    strata = np.searchsorted(edges, values, side='right')
+    order = rng.permutation(n)
+    ordered_strata = strata[order]
+
+    rows = []
+    for stratum in np.unique(strata):
+        members = order[ordered_strata == stratum]
+        take = max(1, int(round(size * len(members) / n)))
+        rows.append(members[:take])
+    return np.sort(np.concatenate(rows))
+
+
+def best_candidate(scores: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Имя лучшего кандидата по R² на тестовых данных
+
+    Сравниваются только кандидаты, дошедшие до последней ступени отбора: R² выбывших
+    получен на меньшей подвыборке и с R² финалистов не сравним.
+    """
+    last_rung = max(candidate_scores.get('rung', 0) for candidate_scores in scores.values())
+    finalists = [name for name, candidate_scores in scores.items() if candidate_scores.get('rung', 0) == last_rung]
+    return max(finalists, key=lambda name: scores[name]['test_r2'])
+
+
+def successive_halving(
+    evaluator: CandidateEvaluator,
+    candidates: Dict[str, Any],
+    y_train,
+    *,
+    min_samples: int,
+    factor: int,
+    budget: float,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Отбор кандидатов последовательным делением в пределах бюджета времени
+
+    Все кандидаты оцениваются на небольшой стратифицированной подвыборке, на следующую
+    ступень переходит лучшая 1/factor часть, а размер подвыборки растет в factor раз.
+    Отбор останавливается, когда остался один кандидат, достигнута полная выборка
+    или следующая ступень не укладывается в оставшийся бюджет.
+    Возвращает метрики каждого кандидата на последней пройденной им ступени,
+    победителя среди них выбирает best_candidate.
+    """
+    deadline = time.perf_counter() + budget
+    n_total = len(y_train)
+    sample_size = min(min_samples, n_total)
+    survivors = list(candidates)
+    scores: Dict[str, Dict[str, Any]] = {}
+    rung = 0
+
+    while True:
+        rung_started = time.perf_counter()
+        rows = stratified_subsample(y_train, sample_size)
+        # Даже при исчерпанном бюджете первой ступени дается секунда, чтобы было из чего выбрать
+        rung_scores = evaluator.evaluate(
+            {name: candidates[name] for name in survivors},
+            train_rows=rows,
+            deadline=max(deadline, rung_started + 1.0),
+        )
+        for name, candidate_scores in rung_scores.items():
+            scores[name] = {**candidate_scores, 'n_samples': sample_size, 'rung': rung}
+
+        survivors.sort(key=lambda name: scores[name]['test_r2'], reverse=True)
+        logger.info(
+            f"Ступень {rung}: {len(rung_scores)} моделей на {sample_size} записях, "
+            f"лидер {survivors[0]} с R² = {scores[survivors[0]]['test_r2']:.4f}"
+        )
+
+        if len(survivors) == 1 or sample_size >= n_total:
+            break
+        if time.perf_counter() >= deadline:
+            logger.info(f"Бюджет времени исчерпан на ступени {rung}")
+            break
+
+        # Прогноз длительности следующей ступени: меньше моделей, больше данных
+        keep = max(1, len(survivors) // factor)
+        rung_time = time.perf_counter() - rung_started
+        next_size = min(n_total, sample_size * factor)
+        projected = rung_time * keep / len(survivors) * next_size / sample_size
+        if time.perf_counter() + projected > deadline:
+            logger.info(f"Бюджет времени исчерпан на ступени {rung}")
+            break
+
+        survivors = survivors[:keep]
+        sample_size = next_size
+        rung += 1
+
+    return scores
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import joblib
+import sklearn
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.models.apartment import Apartment
+from app.models.favorite import Favorite
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FILE = "artifact.joblib"
+META_FILE = "meta.json"
+PINNED_FILE = "PINNED"
+
+
+def compute_data_fingerprint(db: Session, include_favorites: bool = False) -> Dict[str, Any]:
+    """
+    Отпечаток данных, на которых обучаются модели: количество строк и время последнего изменения
+
+    include_favorites добавляет состояние избранного для моделей, которые на нем обучаются.
+    """
+    rows, max_id, max_updated_at = db.query(
+        func.count(Apartment.id),
+        func.max(Apartment.id),
+        func.max(func.coalesce(Apartment.updated_at, Apartment.created_at)),
+    ).one()
+    fingerprint = {
+        "rows": rows,
+        "max_id": max_id,
+        "max_updated_at": max_updated_at.isoformat() if max_updated_at else None,
+    }
+    if include_favorites:
+        favorite_rows, favorite_max_id = db.query(func.count(Favorite.id), func.max(Favorite.id)).one()
+        fingerprint["favorites"] = [favorite_rows, favorite_max_id]
+    return fingerprint
+
+
+def fingerprint_hash(fingerprint: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ModelStore:
+    """
+    Версионированное хранилище обученных моделей на диске
+
+    Каждая версия хранится в отдельном каталоге <root>/<model>/<version>
+    с сериализованным состоянием модели и файлом метаданных.
+    """
+    def __init__(self, root_dir: str, keep_versions: int = 5):
+        self.root_dir = root_dir
+        self.keep_versions = keep_versions
+
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root_dir, name)
+
+    def _version_dir(self, name: str, version: str) -> str:
+        return os.path.join(self._model_dir(name), version)
+
+    def save(
+        self,
+        name: str,
+        state: Dict[str, Any],
+        *,
+        fingerprint: Dict[str, Any],
+        artifact_format: int,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Сохранение новой версии модели, возвращает идентификатор версии
+        """
+        created_at = datetime.now(timezone.utc)
+        fp_hash = fingerprint_hash(fingerprint)
+        version = f"{created_at.strftime('%Y%m%dT%H%M%S%f')}-{fp_hash[:8]}"
+        meta = {
+            "name": name,
+            "version": version,
+            "created_at": created_at.isoformat(),
+            "artifact_format": artifact_format,
+            "sklearn_version": sklearn.__version__,
+            "fingerprint": fingerprint,
+            "fingerprint_hash": fp_hash,
+            **(extra or {}),
+        }
+
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+
+        # Пишем во временный каталог и переименовываем, чтобы не оставлять неполных версий
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=model_dir)
+        try:
+            joblib.dump(state, os.path.join(tmp_dir, ARTIFACT_FILE))
+            with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+            os.replace(tmp_dir, self._version_dir(name, version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Сохранена версия {version} модели {name}")
+        self._prune(name)
+        return version
+
+    def load(self, name: str, version: str) -> Dict[str, Any]:
+        """
+        Загрузка сериализованного состояния модели заданной версии
+        """
+        return joblib.load(os.path.join(self._version_dir(name, version), ARTIFACT_FILE))
+
+    def get_meta(self, name: str, version: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._version_dir(name, version), META_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_versions(self, name: str) -> List[Dict[str, Any]]:
+        """
+        Список метаданных всех версий модели, от новых к старым
+        """
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+
+        versions = []
+        for version in os.listdir(model_dir):
+            if version.startswith("."):
+                continue
+            meta = self.get_meta(name, version)
+            if meta is not None:
+                versions.append(meta)
+        versions.sort(key=lambda meta: meta["version"], reverse=True)
+        return versions
+
+    def is_compatible(self, meta: Dict[str, Any], artifact_format: int) -> bool:
+        """
+        Проверка, может ли версия быть загружена текущим кодом
+        """
+        return (
+            meta.get("artifact_format") == artifact_format
+            and meta.get("sklearn_version") == sklearn.__version__
+        )
+
+    def find_latest(
+        self, name: str, *, fingerprint: Dict[str, Any], artifact_format: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Поиск самой новой совместимой версии, обученной на тех же данных
+        """
+        fp_hash = fingerprint_hash(fingerprint)
+        for meta in self.list_versions(name):
+            if meta.get("fingerprint_hash") == fp_hash and self.is_compatible(meta, artifact_format):
+                return meta
+        return None
+
+    def get_pinned(self, name: str) -> Optional[str]:
+        path = os.path.join(self._model_dir(name), PINNED_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        return version or None
+
+    def pin(self, name: str, version: str) -> None:
+        """
+        Закрепление версии: она используется независимо от изменения данных
+        """
+        if self.get_meta(name, version) is None:
+            raise KeyError(version)
+        with open(os.path.join(self._model_dir(name), PINNED_FILE), "w", encoding="utf-8") as f:
+            f.write(version)
+        logger.info(f"Версия {version} модели {name} закреплена")
+
+    def unpin(self, name: str) -> None:
+        path = os.path.join(self._model_dir(name), PINNED_FILE)
+        if os.path.isfile(path):
+            os.remove(path)
+            logger.info(f"Закрепление версии модели {name} снято")
+
+    def previous_version(self, name: str, version: Optional[str]) -> Optional[str]:
+        """
+        Версия, предшествующая заданной
+        """
+        versions = [meta["version"] for meta in self.list_versions(name)]
+        if version not in versions:
+            return versions[0] if versions else None
+        index = versions.index(version)
+        return versions[index + 1] if index + 1 < len(versions) else None
+
+    def _prune(self, name: str) -> None:
+        """
+        Удаление старых версий сверх лимита, кроме закрепленной
+        """
+        if self.keep_versions <= 0:
+            return
+        pinned = self.get_pinned(name)
+        for meta in self.list_versions(name)[self.keep_versions:]:
+            if meta["version"] != pinned:
+                shutil.rmtree(self._version_dir(name, meta["version"]), ignore_errors=True)
+
+
+# Создаем синглтон для использования в приложении
+model_store = ModelStore(settings.MODEL_STORE_DIR, keep_versions=settings.MODEL_STORE_KEEP_VERSIONS)
@@ -0,0 +1,163 @@
+import heapq
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.core.change_log import ChangeEvent, apartment_changes, apartment_views, DELETE
+from app.models.apartment import Apartment
+from app.repositories.apartment_repository import apartment as apartment_repository
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityService:
+    """
+    Рейтинг самых просматриваемых квартир в памяти
+
+    Хранит top_n квартир с наибольшим числом просмотров (при равенстве выше более
+    новая квартира) и кучу с минимумом рейтинга,
+    по которой за O(log n) решается, вытесняет ли квартира с новым счетчиком
+    последнюю в рейтинге. Рейтинг загружается из БД один раз и дальше обновляется
+    из журналов просмотров и изменений квартир, поэтому запросы популярных
+    квартир не сортируют таблицу.
+    """
+    def __init__(self, top_n: int):
+        self.top_n = top_n
+        self._views: Dict[int, int] = {}  # Просмотры квартир, входящих в рейтинг
+        self._heap: List[tuple] = []  # (просмотры, id) с устаревшими записями, минимум - последний в рейтинге
+        self._ordered: Optional[List[int]] = None  # Рейтинг по убыванию просмотров, пересчитывается лениво
+        self._complete = False  # В рейтинг входят все квартиры
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        """
+        Загрузка рейтинга из БД
+        """
+        rows = (
+            db.query(Apartment.id, Apartment.views)
+            .order_by(Apartment.views.desc(), Apartment.id.desc())
+            .limit(self.top_n + 1)
+            .all()
+        )
+        with self._lock:
+            self._complete = len(rows) <= self.top_n
+            self._views = {apartment_id: views or 0 for apartment_id, views in rows[:self.top_n]}
+            self._rebuild_heap()
+            self._loaded = True
+        logger.info(f"Загружен рейтинг популярных квартир: {len(self._views)}")
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(views, apartment_id) for apartment_id, views in self._views.items()]
+        heapq.heapify(self._heap)
+        self._ordered = None
+
+    def _min_entry(self) -> Optional[tuple]:
+        # Устаревшие записи кучи удаляются при обращении к минимуму
+        while self._heap:
+            views, apartment_id = self._heap[0]
+            if self._views.get(apartment_id) == views:
+                return views, apartment_id
+            heapq.heappop(self._heap)
+        return None
+
+    def update(self, apartment_id: int, views: int) -> None:
+        """
+        Новое значение счетчика просмотров квартиры
+        """
+        views = views or 0
+        with self._lock:
+            if not self._loaded:
+                return
+            if apartment_id in self._views:
+                if self._views[apartment_id] == views:
+                    return
+                if views < self._views[apartment_id] and not self._complete:
+                    # Квартира могла опуститься ниже тех, что не вошли в рейтинг
+                    self._views.pop(apartment_id)
+                    self._loaded = False
+                    return
+                self._views[apartment_id] = views
+            elif len(self._views) < self.top_n:
+                self._views[apartment_id] = views
+            else:
+                entry = self._min_entry()
+                if entry is None or (views, apartment_id) <= entry:
+                    self._complete = False
+                    return
+                del self._views[entry[1]]
+                self._complete = False
+                self._views[apartment_id] = views
+            heapq.heappush(self._heap, (views, apartment_id))
+            self._ordered = None
+            if len(self._heap) > 4 * max(self.top_n, 1):
+                self._rebuild_heap()
+
+    def remove(self, apartment_id: int) -> None:
+        with self._lock:
+            if self._views.pop(apartment_id, None) is not None:
+                self._ordered = None
+                # Место в рейтинге освободилось, следующую по популярности квартиру знает только БД
+                if not self._complete:
+                    self._loaded = False
+
+    def apply_change(self, event: ChangeEvent) -> None:
+        """
+        Обновление рейтинга при изменении квартиры или ее счетчика просмотров
+        """
+        if event.action == DELETE:
+            self.remove(event.key)
+        elif 'views' in event.data:
+            self.update(event.key, event.data['views'])
+
+    def top_ids(self, db: Session, n: int, exclude: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        id n самых популярных квартир, кроме exclude
+
+        Если после исключений в рейтинге не хватает квартир, остаток берется из БД.
+        """
+        if n <= 0:
+            return []
+        if not self._loaded:
+            self.load(db)
+
+        excluded = set(exclude or ())
+        with self._lock:
+            if self._ordered is None:
+                self._ordered = sorted(self._views, key=lambda apartment_id: (-self._views[apartment_id], -apartment_id))
+            ordered, complete = self._ordered, self._complete
+
+        result = []
+        for apartment_id in ordered:
+            if apartment_id not in excluded:
+                result.append(apartment_id)
+                if len(result) == n:
+                    return result
+
+        if not complete:
+            rows = (
+                db.query(Apartment.id)
+                .filter(~Apartment.id.in_(excluded.union(result)))
+                .order_by(Apartment.views.desc(), Apartment.id.desc())
+                .limit(n - len(result))
+                .all()
+            )
+            result.extend(row[0] for row in rows)
+        return result
+
+    def get_popular(self, db: Session, n: int, exclude: Optional[Iterable[int]] = None) -> List[Apartment]:
+        """
+        n самых популярных квартир, кроме exclude, одним запросом к БД
+        """
+        return apartment_repository.get_by_ids_ordered(db, ids=self.top_ids(db, n, exclude))
+
+
+# Создаем синглтон для использования в приложении
+popularity = PopularityService(settings.POPULAR_TOP_N)
+
+# Рейтинг обновляется при изменении квартир и счетчиков просмотров
+apartment_changes.subscribe(popularity.apply_change)
+apartment_views.subscribe(popularity.apply_change)
@@ -126,7 +126,11 @@
 # # Создаем синглтон для использования в приложении
 # price_predictor = PricePredictorService()
 
+import itertools
 import logging
+import os
+import time
+from dataclasses import dataclass, field, replace
 import numpy as np
 import pandas as pd
 from typing import Optional, Dict, List, Union, Any, Tuple
@@ -136,105 +140,173 @@ from sklearn.svm import SVR
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
 
 from sqlalchemy.orm import Session
-from app.models.apartment import Apartment
+from app.config.settings import settings
+from app.core.cache import TTLCache
+from app.services.compiled_model import CompiledPricePipeline, compile_pipeline
+from app.services.feature_extraction import load_apartment_frame, normalize_features
+from app.services.model_selection import (
+    CandidateEvaluator, best_candidate, stratified_subsample, successive_halving,
+)
 
 logger = logging.getLogger(__name__)
 
+# Номера поколений обученных моделей для ключей кэша
+_generations = itertools.count(1)
+
+
+@dataclass(frozen=True)
+class PriceModelBundle:
+    """
+    Неизменяемый набор всего, что нужно для прогноза одной обученной моделью
+
+    Новая модель собирается целиком в стороне и публикуется одной заменой ссылки,
+    поэтому запрос, уже получивший набор, до конца работает со старой моделью.
+    """
+    model: Pipeline
+    compiled: Optional[CompiledPricePipeline]
+    model_performance: Dict[str, Dict[str, float]]
+    training_rows: int
+    categorical_features: List[str]
+    numerical_features: List[str]
+    version: Optional[str] = None
+    generation: int = field(default_factory=lambda: next(_generations))
+
 
 class PricePredictorService:
     """
     Сервис для прогнозирования стоимости аренды квартир
     """
+    # Версия формата сериализованного состояния, меняется при несовместимых изменениях
+    ARTIFACT_FORMAT = 2
+
     def __init__(self):
-        self.model = None
         self.categorical_features = ['metro', 'way']
         self.numerical_features = ['minutes', 'storey', 'storeys', 'rooms', 'total_area', 'living_area', 'kitchen_area']
-        self.preprocessor = None
-        self.is_trained = False
-        self.model_performance = {}  # Для хранения метрик производительности модели
+        self._bundle: Optional[PriceModelBundle] = None  # Опубликованная обученная модель
+        self.cache = TTLCache(settings.PRICE_CACHE_SIZE, settings.PRICE_CACHE_TTL)  # Кэш прогнозов
+
+    @property
+    def is_trained(self) -> bool:
+        return self._bundle is not None
+
+    @property
+    def model(self) -> Optional[Pipeline]:
+        bundle = self._bundle
+        return bundle.model if bundle else None
+
+    @property
+    def model_performance(self) -> Dict[str, Dict[str, float]]:
+        bundle = self._bundle
+        return bundle.model_performance if bundle else {}
+
+    @property
+    def training_rows(self) -> int:
+        bundle = self._bundle
+        return bundle.training_rows if bundle else 0
+
+    @property
+    def model_version(self) -> Optional[str]:
+        bundle = self._bundle
+        return bundle.version if bundle else None
+
+    @model_version.setter
+    def model_version(self, version: Optional[str]) -> None:
+        # Версия известна после сохранения модели, набор заменяется копией с версией
+        if self._bundle is not None:
+            self._bundle = replace(self._bundle, version=version)
+
+    def _publish(self, bundle: PriceModelBundle) -> None:
+        """
+        Атомарная замена обслуживающей модели
+        """
+        self._bundle = bundle
+        self.cache.clear()
 
-    def _prepare_data(self, apartments: List[Apartment]) -> pd.DataFrame:
+    def _prepare_data(self, db: Session) -> pd.DataFrame:
         """
         Подготовка данных для обучения модели
         """
-        data = []
-        
-        for apartment in apartments:
-            apartment_data = {
-                'metro': apartment.metro,
-                'price': apartment.price,
-                'minutes': apartment.minutes,
-                'way': apartment.way,
-                'storey': apartment.storey,
-                'storeys': apartment.storeys,
-                'rooms': apartment.rooms,
-                'total_area': apartment.total_area,
-                'living_area': apartment.living_area if apartment.living_area else 0,
-                'kitchen_area': apartment.kitchen_area if apartment.kitchen_area else 0,
-            }
-            data.append(apartment_data)
-        
-        df = pd.DataFrame(data)
-        return df
+        return load_apartment_frame(
+            db, self.categorical_features + ['price'] + self.numerical_features
+        )
 
-    def _evaluate_model(self, model, X_train, X_test, y_train, y_test) -> Dict[str, float]:
+    def _candidate_grid(self) -> Dict[str, Any]:
         """
-        Оценка производительности модели на тестовых данных
+        Модели и варианты гиперпараметров для отбора в режиме с бюджетом времени
         """
-        # Обучаем модель
-        model.fit(X_train, y_train)
-        
-        # Предсказываем на обучающих и тестовых данных
-        y_train_pred = model.predict(X_train)
-        y_test_pred = model.predict(X_test)
-        
-        # Вычисляем метрики
-        train_mse = mean_squared_error(y_train, y_train_pred)
-        test_mse = mean_squared_error(y_test, y_test_pred)
-        train_rmse = np.sqrt(train_mse)
-        test_rmse = np.sqrt(test_mse)
-        train_mae = mean_absolute_error(y_train, y_train_pred)
-        test_mae = mean_absolute_error(y_test, y_test_pred)
-        train_r2 = r2_score(y_train, y_train_pred)
-        test_r2 = r2_score(y_test, y_test_pred)
+        grid = {'Linear Regression': LinearRegression()}
+        for alpha in [0.1, 1.0, 10.0]:
+            grid[f'Ridge(alpha={alpha})'] = Ridge(alpha=alpha)
+        for alpha in [0.1, 10.0]:
+            grid[f'Lasso(alpha={alpha})'] = Lasso(alpha=alpha)
+        for alpha, l1_ratio in [(0.1, 0.5), (1.0, 0.5), (0.1, 0.9)]:
+            grid[f'ElasticNet(alpha={alpha}, l1_ratio={l1_ratio})'] = ElasticNet(alpha=alpha, l1_ratio=l1_ratio)
+        for c in [1.0, 10.0]:
+            grid[f'SVR(C={c})'] = SVR(kernel='linear', C=c)
+        for n_estimators, max_depth in [(100, 10), (100, 20), (200, None)]:
+            grid[f'Random Forest(n_estimators={n_estimators}, max_depth={max_depth})'] = RandomForestRegressor(
+                n_estimators=n_estimators,
+                max_depth=max_depth,
+                random_state=42
+            )
+        for learning_rate, max_depth in [(0.1, 5), (0.1, 3), (0.05, 5)]:
+            grid[f'Gradient Boosting(learning_rate={learning_rate}, max_depth={max_depth})'] = GradientBoostingRegressor(
+                n_estimators=100,
+                learning_rate=learning_rate,
+                max_depth=max_depth,
+                random_state=42
+            )
+        return grid
+
+    def _final_fit_rows(
+        self, model_scores: Dict[str, Dict[str, Any]], y, deadline: Optional[float]
+    ) -> Optional[np.ndarray]:
+        """
+        Строки для обучения финальной модели
+
+        Без бюджета времени (deadline None) финальная модель обучается на всех данных.
+        В режиме halving размер выборки ограничивается так, чтобы обучение уложилось
+        в остаток бюджета, но не меньше выборки, на которой модель была выбрана.
+        """
+        if deadline is None:
+            return None
         
-        # Относительная ошибка (в процентах)
-        train_rel_error = np.mean(np.abs((y_train - y_train_pred) / y_train)) * 100
-        test_rel_error = np.mean(np.abs((y_test - y_test_pred) / y_test)) * 100
+        best = model_scores[best_candidate(model_scores)]
+        n_samples = best.get('n_samples', len(y))
+        if n_samples >= len(y):
+            return None
         
-        return {
-            'train_mse': train_mse,
-            'test_mse': test_mse,
-            'train_rmse': train_rmse,
-            'test_rmse': test_rmse,
-            'train_mae': train_mae,
-            'test_mae': test_mae,
-            'train_r2': train_r2,
-            'test_r2': test_r2,
-            'train_rel_error': train_rel_error,
-            'test_rel_error': test_rel_error
-        }
+        remaining = deadline - time.perf_counter()
+        seconds_per_row = best['fit_time'] / n_samples
+        affordable = int(remaining / seconds_per_row) if seconds_per_row > 0 else len(y)
+        return stratified_subsample(y, max(n_samples, affordable))
 
-    def _compare_models(self, X_train, X_test, y_train, y_test) -> Tuple[Pipeline, Dict[str, Dict[str, float]]]:
+    def _compare_models(
+        self, X_train, X_test, y_train, y_test, deadline: Optional[float] = None
+    ) -> Tuple[Pipeline, Dict[str, Dict[str, float]]]:
         """
         Сравнение различных моделей регрессии и выбор лучшей
+
+        С deadline кандидаты отбираются последовательным делением до этого момента,
+        без него все модели из списка оцениваются на полной выборке.
         """
         # Создаем препроцессор для обработки категориальных и числовых признаков
         categorical_transformer = OneHotEncoder(handle_unknown='ignore')
         numerical_transformer = StandardScaler()
         
-        self.preprocessor = ColumnTransformer(
+        preprocessor = ColumnTransformer(
             transformers=[
                 ('cat', categorical_transformer, self.categorical_features),
                 ('num', numerical_transformer, self.numerical_features)
             ])
         
         # Определяем модели для сравнения
-        models = {
+        halving = deadline is not None
+        models = self._candidate_grid() if halving else {
             'Linear Regression': LinearRegression(),
             'Ridge': Ridge(alpha=1.0),
             'Lasso': Lasso(alpha=0.1),
@@ -253,25 +325,36 @@ class PricePredictorService:
             )
         }
         
-        # Создаем пайплайны для каждой модели
+        # Создаем пайплайны для каждой модели, у каждого свой экземпляр препроцессора
         pipelines = {name: Pipeline(steps=[
-            ('preprocessor', self.preprocessor),
+            ('preprocessor', clone(preprocessor)),
             ('regressor', model)
         ]) for name, model in models.items()}
         
-        # Оцениваем каждую модель
-        model_scores = {}
-        for name, pipeline in pipelines.items():
-            logger.info(f"Оценка модели: {name}")
-            try:
-                model_scores[name] = self._evaluate_model(pipeline, X_train, X_test, y_train, y_test)
-                logger.info(f"Модель {name}: R² = {model_scores[name]['test_r2']:.4f}, RMSE = {model_scores[name]['test_rmse']:.2f}, MAE = {model_scores[name]['test_mae']:.2f}")
-            except Exception as e:
-                logger.error(f"Ошибка при оценке модели {name}: {e}")
-                model_scores[name] = {'test_r2': -float('inf')}
+        # Оцениваем модели параллельно в пуле процессов
+        with CandidateEvaluator(
+            X_train, X_test, y_train, y_test,
+            workers=min(settings.PRICE_MODEL_WORKERS or os.cpu_count() or 1, len(pipelines)),
+            timeout=settings.PRICE_MODEL_CANDIDATE_TIMEOUT,
+        ) as evaluator:
+            if halving:
+                model_scores = successive_halving(
+                    evaluator, pipelines, y_train,
+                    min_samples=settings.PRICE_MODEL_MIN_SAMPLES,
+                    factor=max(2, settings.PRICE_MODEL_HALVING_FACTOR),
+                    budget=deadline - time.perf_counter(),
+                )
+            else:
+                model_scores = evaluator.evaluate(pipelines)
+        
+        for name, scores in model_scores.items():
+            if 'error' in scores:
+                logger.error(f"Модель {name} не оценена ({scores['error']}) за {scores['fit_time']:.2f} с")
+            else:
+                logger.info(f"Модель {name}: R² = {scores['test_r2']:.4f}, RMSE = {scores['test_rmse']:.2f}, MAE = {scores['test_mae']:.2f}, время = {scores['fit_time']:.2f} с")
         
-        # Выбираем лучшую модель по R² на тестовых данных
-        best_model_name = max(model_scores.keys(), key=lambda name: model_scores[name]['test_r2'])
+        # Выбираем лучшую модель по R² на тестовых данных среди дошедших до последней ступени
+        best_model_name = best_candidate(model_scores)
         best_model = pipelines[best_model_name]
         
         logger.info(f"Выбрана лучшая модель: {best_model_name} с R² = {model_scores[best_model_name]['test_r2']:.4f}")
@@ -283,16 +366,13 @@ class PricePredictorService:
         Обучение модели на основе данных из базы с выбором лучшей модели
         """
         try:
-            # Получаем все квартиры из базы
-            apartments = db.query(Apartment).all()
+            # Получаем признаки всех квартир из базы
+            df = self._prepare_data(db)
             
-            if not apartments or len(apartments) < 10:
+            if len(df) < 10:
                 logger.warning("Недостаточно данных для обучения модели")
                 return False
             
-            # Подготовка данных
-            df = self._prepare_data(apartments)
-            
             # Разделение на признаки и целевую переменную
             X = df.drop('price', axis=1)
             y = df['price']
@@ -302,50 +382,126 @@ class PricePredictorService:
                 X, y, test_size=0.2, random_state=42
             )
             
-            # Сравниваем разные модели и выбираем лучшую
-            best_model, model_scores = self._compare_models(X_train, X_test, y_train, y_test)
-            
-            # Сохраняем лучшую модель и её показатели
-            self.model = best_model
-            self.model_performance = model_scores
+            # Сравниваем разные модели и выбираем лучшую; в режиме halving отбор
+            # и обучение финальной модели укладываются в общий бюджет времени
+            deadline = None
+            if settings.PRICE_MODEL_SELECTION == "halving":
+                deadline = time.perf_counter() + settings.PRICE_MODEL_TIME_BUDGET
+            best_model, model_scores = self._compare_models(X_train, X_test, y_train, y_test, deadline)
             
-            # Обучаем модель на всех данных
-            logger.info("Обучение финальной модели на всех данных...")
-            self.model.fit(X, y)
+            # Обучаем модель на всех данных или на части, укладывающейся в бюджет времени
+            fit_rows = self._final_fit_rows(model_scores, y, deadline)
+            if fit_rows is None:
+                logger.info("Обучение финальной модели на всех данных...")
+                best_model.fit(X, y)
+            else:
+                logger.info(f"Обучение финальной модели на {len(fit_rows)} из {len(y)} записей...")
+                best_model.fit(X.iloc[fit_rows], y.iloc[fit_rows])
             
-            self.is_trained = True
+            # Публикуем лучшую модель и её показатели только после полного обучения
+            self._publish(PriceModelBundle(
+                model=best_model,
+                compiled=compile_pipeline(best_model, self.categorical_features, self.numerical_features),
+                model_performance=model_scores,
+                training_rows=len(df),
+                categorical_features=list(self.categorical_features),
+                numerical_features=list(self.numerical_features),
+            ))
             
-            logger.info(f"Модель прогнозирования цены обучена на {len(apartments)} экземплярах")
+            logger.info(f"Модель прогнозирования цены обучена на {len(df)} экземплярах")
             return True
             
         except Exception as e:
             logger.error(f"Ошибка при обучении модели: {e}")
             return False
 
+    def export_state(self) -> Dict[str, Any]:
+        """
+        Состояние обученной модели для сохранения в хранилище
+        """
+        bundle = self._bundle
+        return {
+            'model': bundle.model,
+            'model_performance': bundle.model_performance,
+            'training_rows': bundle.training_rows,
+            'categorical_features': bundle.categorical_features,
+            'numerical_features': bundle.numerical_features,
+        }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Восстановление обученной модели из хранилища
+        """
+        self._publish(PriceModelBundle(
+            model=state['model'],
+            compiled=compile_pipeline(state['model'], state['categorical_features'], state['numerical_features']),
+            model_performance=state['model_performance'],
+            training_rows=state['training_rows'],
+            categorical_features=state['categorical_features'],
+            numerical_features=state['numerical_features'],
+        ))
+
     def predict_price(self, apartment_data: Dict[str, Any]) -> Optional[float]:
         """
         Прогнозирование стоимости аренды для заданной квартиры
         """
-        if not self.is_trained or not self.model:
+        bundle = self._bundle
+        if bundle is None:
             logger.warning("Модель не обучена")
             return None
         
         try:
-            # Подготовка входных данных
-            input_data = pd.DataFrame([apartment_data])
+            # Подготовка входных данных так же, как при обучении
+            features = normalize_features(
+                apartment_data, bundle.categorical_features, bundle.numerical_features, required=True
+            )
             
-            # Прогноз
-            predicted_price = self.model.predict(input_data)[0]
+            # Повторный запрос с теми же признаками к той же модели берем из кэша
+            cache_key = (bundle.generation,) + tuple(features.values())
+            cached_price = self.cache.get(cache_key)
+            if cached_price is not None:
+                return cached_price
+            
+            # Прогноз скомпилированной моделью, если она доступна
+            if bundle.compiled is not None:
+                predicted_price = bundle.compiled.predict_one(features)
+            else:
+                predicted_price = bundle.model.predict(pd.DataFrame([features]))[0]
             
             # Округляем и ограничиваем минимальную цену
             predicted_price = max(round(predicted_price, 2), 10000)
             
+            self.cache.set(cache_key, predicted_price)
             return predicted_price
             
         except Exception as e:
             logger.error(f"Ошибка при прогнозировании цены: {e}")
             return None
     
+    def predict_prices(self, apartments_data: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Прогнозирование стоимости аренды для пакета квартир одним вызовом модели
+        """
+        bundle = self._bundle
+        if bundle is None:
+            logger.warning("Модель не обучена")
+            return None
+        
+        if not apartments_data:
+            return np.empty(0)
+        
+        # Подготовка входных данных так же, как при обучении
+        input_data = pd.DataFrame([
+            normalize_features(
+                apartment_data, bundle.categorical_features, bundle.numerical_features, required=True
+            )
+            for apartment_data in apartments_data
+        ])
+        
+        # Прогноз, округление и ограничение минимальной цены
+        predicted_prices = bundle.model.predict(input_data)
+        return np.maximum(np.round(predicted_prices, 2), 10000)
+    
     def get_performance_metrics(self) -> Dict[str, Dict[str, float]]:
         """
         Получение метрик производительности модели
@@ -195,90 +195,265 @@
 # # Создаем синглтон для использования в приложении
 # recommender = RecommenderService()
 
+
+import itertools
 import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 import numpy as np
-from typing import List, Dict, Optional, Any
-from sklearn.neighbors import NearestNeighbors
+from typing import List, Dict, Optional, Any, Tuple
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
+from sqlalchemy import delete, insert
 from sqlalchemy.orm import Session
 import pandas as pd
 
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.core.cache import TTLCache
+from app.core.change_log import ChangeEvent, apartment_changes, favorite_changes, DELETE
 from app.models.apartment import Apartment
+from app.models.apartment_neighbor import ApartmentNeighbor
 from app.models.favorite import Favorite
+from app.services.ann_index import AttributeIndex, DeltaBuffer, build_index, to_dense_float32
+from app.services.cooccurrence import CooccurrenceIndex, build_cooccurrence
+from app.repositories.apartment_repository import apartment as apartment_repository
+from app.services.feature_extraction import load_apartment_frame, normalize_category, normalize_features
+from app.services.popularity import popularity
+from app.services.training_manager import training_manager, RECOMMENDER
 
 logger = logging.getLogger(__name__)
 
+# Атрибуты, по которым фильтруются похожие квартиры: с точным совпадением и диапазонные
+EXACT_FILTER_COLUMNS = ['metro', 'rooms']
+RANGE_FILTER_COLUMNS = ['price', 'total_area']
+FILTER_COLUMNS = EXACT_FILTER_COLUMNS + RANGE_FILTER_COLUMNS
+
+# Номера поколений опубликованных моделей для ключей кэша
+_generations = itertools.count(1)
+
+
+@dataclass(frozen=True)
+class SimilarityFilters:
+    """
+    Условия отбора похожих квартир, те же, что у поиска квартир
+    """
+    metro: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    rooms: Optional[int] = None
+    min_area: Optional[float] = None
+
+    def __post_init__(self):
+        if self.metro:
+            object.__setattr__(self, 'metro', normalize_category(self.metro))
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.metro or self.rooms
+            or self.min_price is not None or self.max_price is not None or self.min_area is not None
+        )
+
+    def equals(self) -> Dict[str, Any]:
+        conditions = {}
+        if self.metro:
+            conditions['metro'] = self.metro
+        if self.rooms:
+            conditions['rooms'] = self.rooms
+        return conditions
+
+    def ranges(self) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+        return {
+            'price': (self.min_price, self.max_price),
+            'total_area': (self.min_area, None),
+        }
+
+
+@dataclass(frozen=True)
+class RecommenderBundle:
+    """
+    Неизменяемый набор препроцессора, индекса соседей и идентификаторов квартир
+
+    Все части обучены на одних данных и публикуются одной заменой ссылки.
+    Строки индекса (плотная матрица признаков float32) совпадают с apartment_ids.
+    neighbor_rows[i] - номера строк ближайших квартир для строки i по возрастанию
+    расстояния, neighbor_distances[i] - расстояния до них. Изменения квартир после
+    обучения накапливаются в delta до следующего перестроения. cooccurrence - похожесть
+    квартир по совместному избранному (None, если она отключена).
+    """
+    preprocessor: ColumnTransformer
+    index: Any  # ExactIndex или IVFIndex
+    attributes: AttributeIndex  # атрибуты строк индекса для фильтрации
+    apartment_ids: np.ndarray
+    neighbor_rows: np.ndarray
+    neighbor_distances: np.ndarray
+    training_rows: int
+    cooccurrence: Optional[CooccurrenceIndex] = None
+    version: Optional[str] = None
+    delta: DeltaBuffer = field(default=None, compare=False)
+    generation: int = field(default_factory=lambda: next(_generations))
+
+    def __post_init__(self):
+        if self.delta is None:
+            object.__setattr__(self, 'delta', DeltaBuffer(
+                len(self.apartment_ids), exact=EXACT_FILTER_COLUMNS, ranges=RANGE_FILTER_COLUMNS
+            ))
+
+    def row_of(self, apartment_id: int) -> Optional[int]:
+        """
+        Номер строки квартиры в модели (идентификаторы отсортированы при извлечении)
+        """
+        row = int(np.searchsorted(self.apartment_ids, apartment_id))
+        if row < len(self.apartment_ids) and self.apartment_ids[row] == apartment_id:
+            return row
+        return None
+
+    def vector_of(self, apartment_id: int) -> Optional[np.ndarray]:
+        """
+        Актуальный вектор признаков квартиры с учетом изменений после обучения
+        """
+        vector = self.delta.get(apartment_id)
+        if vector is not None:
+            return vector
+        row = self.row_of(apartment_id)
+        if row is None or self.delta.tombstones[row]:
+            return None
+        return self.index.vectors[row]
+
+
+def compute_neighbors(index: Any, k: int):
+    """
+    Таблица k ближайших соседей каждой квартиры за один пакетный проход
+
+    Возвращает номера строк соседей (int32) и расстояния до них (float32),
+    упорядоченные по возрастанию расстояния, без самой квартиры.
+    """
+    n = len(index)
+    k = max(0, min(k, n - 1))
+    distances, indices = index.search_all(k + 1)
+
+    # Сама квартира обычно первая, но при совпадающих признаках может стоять дальше
+    is_self = indices == np.arange(n)[:, None]
+    order = np.argsort(is_self, axis=1, kind='stable')[:, :k]
+    return (
+        np.take_along_axis(indices, order, axis=1).astype(np.int32),
+        np.take_along_axis(distances, order, axis=1).astype(np.float32),
+    )
+
 
 class RecommenderService:
     """
     Сервис для формирования рекомендаций по объектам недвижимости
     """
+    # Версия формата сериализованного состояния, меняется при несовместимых изменениях
+    ARTIFACT_FORMAT = 7
+
     def __init__(self):
-        self.model = None
-        self.apartments_data = None
-        self.apartment_ids = None
         self.categorical_features = ['metro', 'way']
         self.numerical_features = ['price', 'minutes', 'rooms', 'total_area']
-        self.preprocessor = None
-        self.is_trained = False
+        self._bundle: Optional[RecommenderBundle] = None  # Опубликованная обученная модель
+        self._change_lock = threading.Lock()  # Согласует применение изменений с публикацией модели
+        self.user_cache = TTLCache(settings.RECOMMENDER_USER_CACHE_SIZE, settings.RECOMMENDER_USER_CACHE_TTL)
+        self._favorite_revisions: "OrderedDict[int, int]" = OrderedDict()  # Версии избранного по пользователю
+        self._revision_floor = 0  # Версия избранного пользователей, которых нет в _favorite_revisions
+        self._revisions = itertools.count(1)  # Общий счетчик версий избранного
+        self._active_users: "OrderedDict[int, int]" = OrderedDict()  # Недавние пользователи и их limit
+        self._precompute_lock = threading.Lock()
+        self._precompute_thread: Optional[threading.Thread] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self._bundle is not None
+
+    @property
+    def training_rows(self) -> int:
+        bundle = self._bundle
+        return bundle.training_rows if bundle else 0
+
+    @property
+    def model_version(self) -> Optional[str]:
+        bundle = self._bundle
+        return bundle.version if bundle else None
+
+    @model_version.setter
+    def model_version(self, version: Optional[str]) -> None:
+        if self._bundle is not None:
+            self._bundle = replace(self._bundle, version=version)
 
     def train(self, db: Session) -> bool:
         """
         Обучение модели рекомендаций на основе данных из базы
         """
         try:
-            # Получаем все квартиры из базы
-            apartments = db.query(Apartment).all()
+            # Изменения, записанные после этой точки, применяются к новой модели после обучения
+            log_position = apartment_changes.position
+            favorites_position = favorite_changes.position
+            
+            # Получаем признаки всех квартир из базы
+            features_df = load_apartment_frame(
+                db, ['id'] + self.categorical_features + self.numerical_features
+            )
             
-            if not apartments or len(apartments) < 5:
+            if len(features_df) < 5:
                 logger.warning("Недостаточно данных для обучения модели рекомендаций")
                 return False
             
-            # Подготовка данных
-            features = []
-            self.apartment_ids = []
-            
-            for apartment in apartments:
-                apartment_features = {
-                    'metro': apartment.metro,
-                    'price': apartment.price,
-                    'minutes': apartment.minutes,
-                    'way': apartment.way,
-                    'rooms': apartment.rooms,
-                    'total_area': apartment.total_area,
-                }
-                features.append(apartment_features)
-                self.apartment_ids.append(apartment.id)
-            
-            self.apartments_data = features
-            
-            # Преобразуем список словарей в DataFrame
-            features_df = pd.DataFrame(features)
+            apartment_ids = features_df.pop('id').to_numpy()
             
             # Создание препроцессора для обработки категориальных и числовых признаков
             categorical_transformer = OneHotEncoder(handle_unknown='ignore')
             numerical_transformer = StandardScaler()
             
-            self.preprocessor = ColumnTransformer(
+            preprocessor = ColumnTransformer(
                 transformers=[
                     ('cat', categorical_transformer, self.categorical_features),
                     ('num', numerical_transformer, self.numerical_features)
                 ])
             
-            # Преобразование данных
-            transformed_features = self.preprocessor.fit_transform(features_df)
+            # Атрибуты для фильтрации похожих квартир
+            attributes = AttributeIndex(
+                exact={
+                    'metro': features_df['metro'].to_numpy(dtype=object),
+                    'rooms': features_df['rooms'].to_numpy(),
+                },
+                ranges={
+                    'price': features_df['price'].to_numpy(),
+                    'total_area': features_df['total_area'].to_numpy(),
+                },
+            )
+            
+            # Преобразование данных в плотную матрицу float32
+            transformed_features = to_dense_float32(preprocessor.fit_transform(features_df))
+            
+            # Построение индекса ближайших соседей
+            index = build_index(transformed_features)
             
-            # Создание и обучение модели
-            self.model = NearestNeighbors(
-                n_neighbors=min(6, len(apartments)),  # Максимум 5 рекомендаций + 1 (сам объект)
-                algorithm='auto',
-                metric='euclidean'
+            # Заранее вычисляем похожие квартиры для всех квартир одним проходом
+            neighbor_rows, neighbor_distances = compute_neighbors(
+                index, settings.RECOMMENDER_NEIGHBORS_K
             )
-            self.model.fit(transformed_features)
             
-            self.is_trained = True
-            logger.info(f"Модель рекомендаций обучена на {len(apartments)} экземплярах")
+            # Похожесть квартир по совместному добавлению в избранное
+            cooccurrence = build_cooccurrence(db) if settings.RECOMMENDER_CF_WEIGHT > 0 else None
+            
+            bundle = RecommenderBundle(
+                preprocessor=preprocessor,
+                index=index,
+                attributes=attributes,
+                apartment_ids=apartment_ids,
+                neighbor_rows=neighbor_rows,
+                neighbor_distances=neighbor_distances,
+                training_rows=len(features_df),
+                cooccurrence=cooccurrence,
+            )
+            
+            if settings.RECOMMENDER_NEIGHBORS_TABLE:
+                self._save_neighbor_table(db, bundle)
+            
+            # Публикуем модель целиком, запросы продолжают работать со старой до замены
+            self._publish(bundle, log_position, favorites_position)
+            logger.info(f"Модель рекомендаций обучена на {len(features_df)} экземплярах")
             
             return True
             
@@ -286,112 +461,508 @@ class RecommenderService:
             logger.error(f"Ошибка при обучении модели рекомендаций: {e}")
             return False
 
-    def get_similar_apartments(self, db: Session, apartment_id: int, n_recommendations: int = 5) -> List[Apartment]:
+    def export_state(self) -> Dict[str, Any]:
+        """
+        Состояние обученной модели для сохранения в хранилище
+        """
+        bundle = self._bundle
+        return {
+            'preprocessor': bundle.preprocessor,
+            'index': bundle.index,
+            'attributes': bundle.attributes,
+            'apartment_ids': bundle.apartment_ids,
+            'neighbor_rows': bundle.neighbor_rows,
+            'neighbor_distances': bundle.neighbor_distances,
+            'training_rows': bundle.training_rows,
+            'cooccurrence': bundle.cooccurrence,
+        }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Восстановление обученной модели из хранилища
+        """
+        self._publish(RecommenderBundle(
+            preprocessor=state['preprocessor'],
+            index=state['index'],
+            attributes=state['attributes'],
+            apartment_ids=state['apartment_ids'],
+            neighbor_rows=state['neighbor_rows'],
+            neighbor_distances=state['neighbor_distances'],
+            training_rows=state['training_rows'],
+            cooccurrence=state['cooccurrence'],
+        ))
+
+    def _publish(
+        self,
+        bundle: RecommenderBundle,
+        log_position: Optional[int] = None,
+        favorites_position: Optional[int] = None,
+    ) -> None:
+        """
+        Публикация новой модели с применением изменений, записанных во время ее обучения
+        """
+        with self._change_lock:
+            if log_position is not None:
+                events = apartment_changes.since(log_position)
+                if events is None:
+                    logger.warning("Часть изменений квартир вытеснена из журнала и не попадет в модель до перестроения")
+                    events = apartment_changes.since(apartment_changes.position) or []
+                for event in events:
+                    self._apply(bundle, event)
+            if favorites_position is not None and bundle.cooccurrence is not None:
+                events = favorite_changes.since(favorites_position)
+                if events is None:
+                    logger.warning("Часть изменений избранного вытеснена из журнала и не попадет в модель до перестроения")
+                    events = []
+                for event in events:
+                    self._apply_favorite(bundle, event)
+            self._bundle = bundle
+        
+        # Рекомендации активных пользователей считаются заранее для новой модели
+        self._schedule_precompute()
+
+    def _encode(self, bundle: RecommenderBundle, records: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Векторы признаков квартир уже обученным препроцессором
+        """
+        features_df = pd.DataFrame([
+            normalize_features(record, self.categorical_features, self.numerical_features)
+            for record in records
+        ])
+        return to_dense_float32(bundle.preprocessor.transform(features_df))
+
+    def _apply(self, bundle: RecommenderBundle, event: ChangeEvent) -> None:
+        row = bundle.row_of(event.key)
+        if event.action == DELETE:
+            bundle.delta.remove(event.key, row)
+        else:
+            features = normalize_features(event.data, self.categorical_features, self.numerical_features)
+            bundle.delta.upsert(
+                event.key,
+                self._encode(bundle, [features])[0],
+                row,
+                attributes={column: features[column] for column in FILTER_COLUMNS},
+            )
+
+    def apply_change(self, event: ChangeEvent) -> None:
+        """
+        Инкрементальное обновление индекса при создании, изменении или удалении квартиры
+
+        Новый вектор вычисляется обученным препроцессором и добавляется в буфер изменений,
+        прежняя строка индекса скрывается. Когда доля изменений превышает
+        RECOMMENDER_REBUILD_DRIFT, запускается полное перестроение в фоне.
+        """
+        with self._change_lock:
+            bundle = self._bundle
+            if bundle is None:
+                return
+            self._apply(bundle, event)
+        
+        drift = bundle.delta.drift()
+        if drift > settings.RECOMMENDER_REBUILD_DRIFT and training_manager.request_training(RECOMMENDER, force=True):
+            logger.info(f"Доля изменений индекса рекомендаций {drift:.1%}, запущено перестроение")
+
+    def _apply_favorite(self, bundle: RecommenderBundle, event: ChangeEvent) -> None:
+        user_id, apartment_id = event.data.get('user_id'), event.data.get('apartment_id')
+        if user_id is None or apartment_id is None:
+            return
+        if event.action == DELETE:
+            bundle.cooccurrence.remove(user_id, apartment_id)
+        else:
+            bundle.cooccurrence.add(user_id, apartment_id)
+
+    def apply_favorite_change(self, event: ChangeEvent) -> None:
+        """
+        Инкрементальное обновление похожести по избранному при добавлении или удалении избранного
+
+        Новая версия избранного пользователя делает недействительными его кэшированные рекомендации.
+        Версии хранятся в памяти процесса: другие процессы приложения продолжают отдавать
+        прежние рекомендации пользователя, пока их записи в кэше не истекут
+        (RECOMMENDER_USER_CACHE_TTL).
+        """
+        with self._change_lock:
+            bundle = self._bundle
+            if bundle is not None and bundle.cooccurrence is not None:
+                self._apply_favorite(bundle, event)
+        
+        user_id = event.data.get('user_id')
+        if user_id is not None:
+            with self._precompute_lock:
+                self._bump_favorite_revision(user_id)
+                active = user_id in self._active_users
+            if active:
+                self._schedule_precompute([user_id])
+        
+        if bundle is None or bundle.cooccurrence is None:
+            return
+        drift = bundle.cooccurrence.drift()
+        if drift > settings.RECOMMENDER_REBUILD_DRIFT and training_manager.request_training(RECOMMENDER, force=True):
+            logger.info(f"Доля изменений избранного {drift:.1%}, запущено перестроение рекомендаций")
+
+    def _bump_favorite_revision(self, user_id: int) -> None:
+        """
+        Новая версия избранного пользователя (вызывается под _precompute_lock)
+
+        Версии берутся из общего счетчика, а хранятся только для RECOMMENDER_USER_CACHE_SIZE
+        пользователей, последними менявших избранное. Вытесненный пользователь получает
+        версию _revision_floor - не меньше любой его прежней версии, поэтому устаревшие
+        ключи кэша к нему не вернутся; у остальных пользователей кэш просто промахнется.
+        """
+        self._favorite_revisions[user_id] = next(self._revisions)
+        self._favorite_revisions.move_to_end(user_id)
+        while len(self._favorite_revisions) > max(settings.RECOMMENDER_USER_CACHE_SIZE, 1):
+            # Вытесняется самая старая версия, поэтому порог только растет
+            _, self._revision_floor = self._favorite_revisions.popitem(last=False)
+
+    def _search(
+        self,
+        bundle: RecommenderBundle,
+        queries: np.ndarray,
+        k: int,
+        filters: Optional[SimilarityFilters] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск k ближайших квартир в индексе с учетом изменений после обучения
+
+        Фильтры и скрытые строки применяются маской внутри поиска, поэтому
+        результат полон, пока подходящих квартир не меньше k.
+        Возвращает расстояния и id квартир (результатов может быть меньше k).
+        """
+        delta = bundle.delta
+        equals, ranges = (filters.equals(), filters.ranges()) if filters else (None, None)
+        mask = bundle.attributes.mask(equals, ranges)
+        if delta.n_tombstones:
+            mask = ~delta.tombstones if mask is None else mask & ~delta.tombstones
+        distances, rows = bundle.index.search(queries, k, mask=mask)
+        ids = bundle.apartment_ids[rows].astype(np.int64)
+        
+        if len(delta):
+            delta_distances, delta_ids = delta.search(queries, k, equals, ranges)
+            distances = np.concatenate([distances, delta_distances], axis=1)
+            ids = np.concatenate([ids, delta_ids], axis=1)
+        
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def _save_neighbor_table(self, db: Session, bundle: RecommenderBundle) -> None:
+        """
+        Запись таблицы соседей в БД порциями
+        """
+        try:
+            db.execute(delete(ApartmentNeighbor))
+            n_rows, k = bundle.neighbor_rows.shape
+            chunk_size = max(1, settings.FEATURE_CHUNK_SIZE // max(k, 1))
+            for start in range(0, n_rows, chunk_size):
+                rows = []
+                for row in range(start, min(start + chunk_size, n_rows)):
+                    apartment_id = int(bundle.apartment_ids[row])
+                    for rank in range(k):
+                        rows.append({
+                            'apartment_id': apartment_id,
+                            'rank': rank,
+                            'neighbor_id': int(bundle.apartment_ids[bundle.neighbor_rows[row, rank]]),
+                            'distance': float(bundle.neighbor_distances[row, rank]),
+                        })
+                if rows:
+                    db.execute(insert(ApartmentNeighbor), rows)
+            db.commit()
+            logger.info(f"Таблица соседей сохранена: {n_rows} квартир по {k} соседей")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Не удалось сохранить таблицу соседей: {e}", exc_info=True)
+
+    def get_similar_ids(self, apartment_id: int, n_recommendations: int = 5) -> Optional[List[int]]:
+        """
+        Идентификаторы похожих квартир из заранее вычисленной таблицы по возрастанию расстояния
+
+        Соседи, удаленные или измененные после обучения, отбрасываются, а квартиры из
+        буфера изменений добавляются точным поиском. Возвращает None, если квартиры нет
+        в таблице (новая или измененная) или в таблице не хватает соседей.
+        """
+        bundle = self._bundle
+        if bundle is None:
+            return None
+        delta = bundle.delta
+        row = bundle.row_of(apartment_id)
+        if row is None or delta.tombstones[row] or n_recommendations > bundle.neighbor_rows.shape[1]:
+            return None
+        
+        neighbors = bundle.neighbor_rows[row]
+        alive = ~delta.tombstones[neighbors]
+        if alive.sum() < n_recommendations:
+            return None
+        ids = bundle.apartment_ids[neighbors[alive]].astype(np.int64)
+        distances = bundle.neighbor_distances[row][alive]
+        
+        if len(delta):
+            delta_distances, delta_ids = delta.search(bundle.index.vectors[row:row + 1], n_recommendations)
+            distances = np.concatenate([distances, delta_distances[0]])
+            ids = np.concatenate([ids, delta_ids[0]])
+            ids = ids[np.argsort(distances, kind='stable')]
+        return [int(i) for i in ids[:n_recommendations]]
+
+    def get_similar_apartments(
+        self,
+        db: Session,
+        apartment_id: int,
+        n_recommendations: int = 5,
+        filters: Optional[SimilarityFilters] = None,
+    ) -> Optional[List[Apartment]]:
         """
         Получение списка похожих квартир для заданной квартиры
+
+        С фильтрами соседи ищутся только среди подходящих квартир. Сама квартира
+        загружается из БД одним запросом вместе с соседями. Возвращает None,
+        если квартиры нет.
         """
-        if not self.is_trained or not self.model:
+        bundle = self._bundle
+        if bundle is None:
             logger.warning("Модель рекомендаций не обучена")
             # Вместо повторной попытки обучения просто вернем пустой список
             return []
         
+        # Квартира есть в таблице соседей - поиск по индексу не нужен
+        recommended_ids = None if filters else self.get_similar_ids(apartment_id, n_recommendations)
+        if recommended_ids is not None:
+            return self._with_apartment(db, apartment_id, recommended_ids)
+        
         try:
-            # Получаем квартиру по ID
-            apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
-            
-            if not apartment:
-                logger.warning(f"Квартира с ID {apartment_id} не найдена")
-                return []
-            
-            # Подготовка входных данных
-            apartment_features = {
-                'metro': apartment.metro,
-                'price': apartment.price,
-                'minutes': apartment.minutes,
-                'way': apartment.way,
-                'rooms': apartment.rooms,
-                'total_area': apartment.total_area,
-            }
-            
-            # Преобразуем в DataFrame
-            features_df = pd.DataFrame([apartment_features])
-            
-            # Преобразуем признаки
-            transformed_features = self.preprocessor.transform(features_df)
+            # Вектор квартиры из индекса или буфера изменений, иначе по данным из БД
+            vector = bundle.vector_of(apartment_id)
+            if vector is None:
+                apartment = db.query(Apartment).filter(Apartment.id == apartment_id).first()
+                
+                if not apartment:
+                    logger.warning(f"Квартира с ID {apartment_id} не найдена")
+                    return None
+                
+                vector = self._encode(bundle, [{
+                    column: getattr(apartment, column)
+                    for column in self.categorical_features + self.numerical_features
+                }])[0]
             
             # Получаем рекомендации
-            _, indices = self.model.kneighbors(transformed_features)
+            distances, ids = self._search(bundle, vector[None, :], n_recommendations + 1, filters)
             
             # Получаем ID рекомендованных квартир, исключая текущую
-            recommended_ids = [self.apartment_ids[i] for i in indices[0] if self.apartment_ids[i] != apartment_id][:n_recommendations]
+            recommended_ids = [
+                int(i) for i, distance in zip(ids[0], distances[0])
+                if i != apartment_id and np.isfinite(distance)
+            ][:n_recommendations]
             
-            # Получаем объекты квартир по ID
-            recommended_apartments = db.query(Apartment).filter(Apartment.id.in_(recommended_ids)).all()
-            
-            return recommended_apartments
+            # Получаем объекты квартир по ID в порядке близости
+            return self._with_apartment(db, apartment_id, recommended_ids)
             
         except Exception as e:
             logger.error(f"Ошибка при получении рекомендаций: {e}", exc_info=True)
             return []
 
+    def _with_apartment(
+        self, db: Session, apartment_id: int, recommended_ids: List[int]
+    ) -> Optional[List[Apartment]]:
+        """
+        Похожие квартиры в порядке recommended_ids, загруженные одним запросом вместе с самой
+        квартирой; None, если квартиры уже нет в БД
+        """
+        apartments = apartment_repository.get_by_ids_ordered(db, ids=[apartment_id] + recommended_ids)
+        if not apartments or apartments[0].id != apartment_id:
+            logger.warning(f"Квартира с ID {apartment_id} не найдена")
+            return None
+        return apartments[1:]
+
+    def find_similar_to_attributes(
+        self, db: Session, queries: List[Dict[str, Any]], n_recommendations: int = 5
+    ) -> List[List[Apartment]]:
+        """
+        Похожие квартиры для каждого набора желаемых характеристик
+
+        Все наборы преобразуются одним вызовом препроцессора и ищутся одним пакетным
+        запросом к индексу, квартиры всех результатов загружаются одним запросом к БД.
+        Незаданный числовой признак заменяется средним по обучающим данным, а незаданная
+        категория передается пустой: кодировщик не находит ее среди обученных категорий
+        (если в данных нет квартир без этого признака) и оставляет ее столбцы нулевыми,
+        поэтому они не смещают поиск.
+        """
+        bundle = self._bundle
+        if bundle is None:
+            logger.warning("Модель рекомендаций не обучена")
+            return [[] for _ in queries]
+        
+        scaler = bundle.preprocessor.named_transformers_['num']
+        means = dict(zip(self.numerical_features, scaler.mean_))
+        records = [
+            {
+                **{column: None for column in self.categorical_features},
+                **{column: means[column] for column in self.numerical_features},
+                **{column: value for column, value in query.items() if value is not None},
+            }
+            for query in queries
+        ]
+        
+        distances, ids = self._search(bundle, self._encode(bundle, records), n_recommendations)
+        per_query = [
+            [int(i) for i, distance in zip(row_ids, row_distances) if np.isfinite(distance)]
+            for row_ids, row_distances in zip(ids, distances)
+        ]
+        
+        apartments = {
+            apartment.id: apartment
+            for apartment in apartment_repository.get_by_ids_ordered(
+                db, ids=list(dict.fromkeys(i for row in per_query for i in row))
+            )
+        }
+        return [[apartments[i] for i in row if i in apartments] for row in per_query]
+
+    def _rank_for_favorites(
+        self, bundle: RecommenderBundle, favorite_ids: List[int], n_recommendations: int
+    ) -> List[int]:
+        """
+        Ранжирование кандидатов по близости сразу ко всем избранным квартирам
+
+        Векторы избранных квартир берутся из индекса и буфера изменений, соседи ищутся
+        одним пакетным запросом к индексу. Оценка кандидата - сумма 1 / (1 + расстояние) по всем
+        избранным, рядом с которыми он найден, поэтому выше оказываются квартиры,
+        похожие сразу на несколько избранных. К ней с весом RECOMMENDER_CF_WEIGHT
+        добавляется сумма косинусов похожести по совместному избранному.
+        """
+        weight = settings.RECOMMENDER_CF_WEIGHT if bundle.cooccurrence is not None else 0.0
+        candidate_ids, candidate_scores = [], []
+        
+        vectors = [bundle.vector_of(apartment_id) for apartment_id in favorite_ids]
+        vectors = [vector for vector in vectors if vector is not None]
+        if vectors:
+            # Соседей берем с запасом, чтобы после исключения избранных осталось достаточно
+            distances, ids = self._search(bundle, np.stack(vectors), n_recommendations + len(vectors))
+            found = np.isfinite(distances)
+            candidate_ids.append(ids[found])
+            candidate_scores.append((1.0 - weight) / (1.0 + distances[found]))
+        
+        if weight > 0:
+            ids, scores = bundle.cooccurrence.score(favorite_ids)
+            candidate_ids.append(ids)
+            candidate_scores.append(weight * scores)
+        
+        if not candidate_ids:
+            return []
+        
+        # Обе оценки суммируются по кандидату одним проходом
+        candidates, inverse = np.unique(np.concatenate(candidate_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(candidate_scores), minlength=len(candidates))
+        
+        scores[np.isin(candidates, favorite_ids)] = -np.inf
+        top = np.argsort(-scores, kind='stable')[:n_recommendations]
+        return [int(candidates[i]) for i in top if np.isfinite(scores[i])]
+
+    def _compute_recommended_ids(
+        self, db: Session, bundle: RecommenderBundle, user_id: int, n_recommendations: int
+    ) -> List[int]:
+        """
+        Расчет персональных рекомендаций: id квартир в порядке показа
+        """
+        # Получаем избранные квартиры пользователя
+        favorite_ids = db.query(Favorite.apartment_id).filter(Favorite.user_id == user_id).all()
+        favorite_ids = [fav[0] for fav in favorite_ids]
+        
+        recommended_ids = []
+        if favorite_ids:
+            # Рекомендации по всем избранным квартирам одним запросом к модели
+            recommended_ids = self._rank_for_favorites(bundle, favorite_ids, n_recommendations)
+        else:
+            logger.info(f"У пользователя с ID {user_id} нет избранных квартир для формирования рекомендаций")
+        
+        # Если рекомендаций недостаточно, добавляем популярные квартиры (с наибольшим числом просмотров)
+        if len(recommended_ids) < n_recommendations:
+            try:
+                recommended_ids.extend(popularity.top_ids(
+                    db, n_recommendations - len(recommended_ids), exclude=set(recommended_ids).union(favorite_ids)
+                ))
+            except Exception as e:
+                logger.error(f"Ошибка при получении популярных квартир: {e}")
+        
+        return recommended_ids
+
+    def get_recommended_ids(
+        self, db: Session, user_id: int, n_recommendations: int = 5, bundle: Optional[RecommenderBundle] = None
+    ) -> List[int]:
+        """
+        Персональные рекомендации из кэша или с расчетом и сохранением в кэш
+
+        Ключ кэша - пользователь, версия его избранного, поколение модели и число рекомендаций,
+        поэтому изменение избранного или публикация новой модели сразу дают новый ключ.
+        Это верно только в пределах процесса (см. apply_favorite_change).
+        """
+        bundle = bundle or self._bundle
+        with self._precompute_lock:
+            revision = self._favorite_revisions.get(user_id, self._revision_floor)
+            self._active_users[user_id] = n_recommendations
+            self._active_users.move_to_end(user_id)
+            while len(self._active_users) > max(settings.RECOMMENDER_PRECOMPUTE_USERS, 0):
+                self._active_users.popitem(last=False)
+        
+        cache_key = (user_id, revision, bundle.generation, n_recommendations)
+        recommended_ids = self.user_cache.get(cache_key)
+        if recommended_ids is None:
+            recommended_ids = self._compute_recommended_ids(db, bundle, user_id, n_recommendations)
+            self.user_cache.set(cache_key, recommended_ids)
+        return recommended_ids
+
+    def _schedule_precompute(self, user_ids: Optional[List[int]] = None) -> None:
+        """
+        Фоновый расчет рекомендаций недавно активных пользователей (всех или только user_ids)
+        """
+        if settings.RECOMMENDER_PRECOMPUTE_USERS <= 0 or not self.user_cache.enabled:
+            return
+        with self._precompute_lock:
+            users = {
+                user_id: limit for user_id, limit in self._active_users.items()
+                if user_ids is None or user_id in user_ids
+            }
+            if not users or (self._precompute_thread is not None and self._precompute_thread.is_alive()):
+                return
+            self._precompute_thread = threading.Thread(
+                target=self._precompute, args=(users,), name="recommendations-precompute", daemon=True
+            )
+            self._precompute_thread.start()
+
+    def _precompute(self, users: Dict[int, int]) -> None:
+        bundle = self._bundle
+        if bundle is None:
+            return
+        db = SessionLocal()
+        try:
+            for user_id, limit in users.items():
+                self.get_recommended_ids(db, user_id, limit, bundle=bundle)
+            logger.info(f"Рекомендации рассчитаны заранее для {len(users)} пользователей")
+        except Exception as e:
+            logger.error(f"Ошибка при фоновом расчете рекомендаций: {e}", exc_info=True)
+        finally:
+            db.close()
+
     def get_recommendations_for_user(self, db: Session, user_id: int, n_recommendations: int = 5) -> List[Apartment]:
         """
         Получение персонализированных рекомендаций для пользователя на основе его избранных квартир
+
+        При попадании в кэш запрос к БД один - за самими квартирами.
         """
-        if not self.is_trained or not self.model:
+        bundle = self._bundle
+        if bundle is None:
             logger.warning("Модель рекомендаций не обучена")
             # Вместо повторной попытки обучения просто вернем популярные квартиры
-            return db.query(Apartment).order_by(Apartment.views.desc()).limit(n_recommendations).all()
+            return popularity.get_popular(db, n_recommendations)
         
         try:
-            # Получаем избранные квартиры пользователя
-            favorite_ids = db.query(Favorite.apartment_id).filter(Favorite.user_id == user_id).all()
-            favorite_ids = [fav[0] for fav in favorite_ids]
-            
-            if not favorite_ids:
-                logger.info(f"У пользователя с ID {user_id} нет избранных квартир для формирования рекомендаций")
-                # Возвращаем просто популярные квартиры (с наибольшим числом просмотров)
-                return db.query(Apartment).order_by(Apartment.views.desc()).limit(n_recommendations).all()
-            
-            # Получаем рекомендации для каждой избранной квартиры
-            all_recommendations = []
-            for fav_id in favorite_ids:
-                try:
-                    recommendations = self.get_similar_apartments(db, fav_id, n_recommendations=3)
-                    all_recommendations.extend(recommendations)
-                except Exception as e:
-                    logger.error(f"Ошибка при получении рекомендаций для квартиры {fav_id}: {e}")
-                    continue
-            
-            # Удаляем дубликаты и избранные квартиры из рекомендаций
-            unique_recommendations = []
-            recommendation_ids = set()
-            
-            for apartment in all_recommendations:
-                if apartment.id not in recommendation_ids and apartment.id not in favorite_ids:
-                    unique_recommendations.append(apartment)
-                    recommendation_ids.add(apartment.id)
-                    if len(unique_recommendations) >= n_recommendations:
-                        break
-            
-            # Если рекомендаций недостаточно, добавляем популярные квартиры
-            if len(unique_recommendations) < n_recommendations:
-                try:
-                    popular_apartments = db.query(Apartment).filter(
-                        ~Apartment.id.in_(recommendation_ids.union(favorite_ids))
-                    ).order_by(Apartment.views.desc()).limit(n_recommendations - len(unique_recommendations)).all()
-                    
-                    unique_recommendations.extend(popular_apartments)
-                except Exception as e:
-                    logger.error(f"Ошибка при получении популярных квартир: {e}")
-            
-            return unique_recommendations
+            recommended_ids = self.get_recommended_ids(db, user_id, n_recommendations, bundle=bundle)
+            return apartment_repository.get_by_ids_ordered(db, ids=recommended_ids)
             
         except Exception as e:
             logger.error(f"Ошибка при получении персонализированных рекомендаций: {e}")
             # В случае ошибки возвращаем просто популярные квартиры
-            return db.query(Apartment).order_by(Apartment.views.desc()).limit(n_recommendations).all()
+            return popularity.get_popular(db, n_recommendations)
 
 
 # Создаем синглтон для использования в приложении
-recommender = RecommenderService()
\ No newline at end of file
+recommender = RecommenderService()
+
+# Индекс рекомендаций обновляется при каждом изменении квартир и избранного
+apartment_changes.subscribe(recommender.apply_change)
+favorite_changes.subscribe(recommender.apply_favorite_change)
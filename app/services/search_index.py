@@ -0,0 +1,374 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.change_log import ChangeEvent, apartment_changes, DELETE
+from app.core.pagination import InvalidCursorError, Page, decode_cursor, encode_cursor
+from app.models.apartment import Apartment
+from app.repositories.apartment_repository import apartment as apartment_repository
+
+logger = logging.getLogger(__name__)
+
+# Начальная емкость колонок, дальше емкость удваивается
+INITIAL_CAPACITY = 1024
+
+# Удаленные строки вычищаются, когда их становится больше половины и больше этого числа
+MIN_COMPACT_ROWS = 1024
+
+
+class ApartmentSearchIndex:
+    """
+    Колоночный индекс квартир в памяти для фильтров поиска
+
+    Для каждой квартиры хранятся id, код станции метро (словарное кодирование),
+    цена, число комнат и площадь в массивах NumPy, упорядоченных по id, а для
+    каждой станции и каждого числа комнат - битовая маска строк с этим значением.
+    Фильтры search() вычисляются векторными операциями над масками, к БД
+    обращается только загрузка квартир найденной страницы.
+
+    Индекс загружается из БД при первом запросе и дальше обновляется из журнала
+    изменений квартир. Удаленные квартиры помечаются в маске alive и вычищаются
+    при накоплении.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset(0)
+
+    def _reset(self, capacity: int) -> None:
+        self._size = 0
+        self._dead = 0
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._metro = np.full(capacity, -1, dtype=np.int32)
+        self._price = np.full(capacity, np.nan)
+        self._rooms = np.full(capacity, -1, dtype=np.int64)
+        self._total_area = np.full(capacity, np.nan)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._metro_codes: Dict[str, int] = {}
+        self._metro_values: List[str] = []
+        # Битовые маски строк по значениям станции и числа комнат
+        self._metro_bitmaps: Dict[int, np.ndarray] = {}
+        self._rooms_bitmaps: Dict[int, np.ndarray] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    def _arrays(self) -> List[np.ndarray]:
+        return [
+            self._ids, self._metro, self._price, self._rooms, self._total_area, self._alive,
+            *self._metro_bitmaps.values(), *self._rooms_bitmaps.values(),
+        ]
+
+    def _grow(self, capacity: int) -> None:
+        def grown(array: np.ndarray) -> np.ndarray:
+            fill = -1 if array.dtype.kind == 'i' else (np.nan if array.dtype.kind == 'f' else False)
+            result = np.full(capacity, fill, dtype=array.dtype)
+            result[:self._size] = array[:self._size]
+            return result
+
+        self._ids, self._metro, self._price, self._rooms, self._total_area, self._alive = (
+            grown(self._ids), grown(self._metro), grown(self._price),
+            grown(self._rooms), grown(self._total_area), grown(self._alive),
+        )
+        self._metro_bitmaps = {code: grown(bitmap) for code, bitmap in self._metro_bitmaps.items()}
+        self._rooms_bitmaps = {value: grown(bitmap) for value, bitmap in self._rooms_bitmaps.items()}
+
+    def _bitmap(self, bitmaps: Dict[int, np.ndarray], value: int) -> np.ndarray:
+        bitmap = bitmaps.get(value)
+        if bitmap is None:
+            bitmap = bitmaps[value] = np.zeros(len(self._ids), dtype=bool)
+        return bitmap
+
+    def _metro_code(self, metro: Optional[str]) -> int:
+        if not metro:
+            return -1
+        code = self._metro_codes.get(metro)
+        if code is None:
+            code = self._metro_codes[metro] = len(self._metro_values)
+            self._metro_values.append(metro)
+        return code
+
+    def _write(self, row: int, data: Dict[str, Any]) -> None:
+        # Строка убирается из масок прежних значений и добавляется в маски новых
+        if self._metro[row] >= 0:
+            self._metro_bitmaps[int(self._metro[row])][row] = False
+        if self._rooms[row] >= 0:
+            self._rooms_bitmaps[int(self._rooms[row])][row] = False
+
+        metro = self._metro_code(data.get('metro'))
+        rooms = data.get('rooms')
+        rooms = int(rooms) if rooms is not None and rooms >= 0 else -1
+        self._metro[row] = metro
+        self._rooms[row] = rooms
+        self._price[row] = np.nan if data.get('price') is None else data['price']
+        self._total_area[row] = np.nan if data.get('total_area') is None else data['total_area']
+        if metro >= 0:
+            self._bitmap(self._metro_bitmaps, metro)[row] = True
+        if rooms >= 0:
+            self._bitmap(self._rooms_bitmaps, rooms)[row] = True
+
+    def _row_of(self, apartment_id: int) -> int:
+        row = int(np.searchsorted(self._ids[:self._size], apartment_id))
+        if row < self._size and self._ids[row] == apartment_id and self._alive[row]:
+            return row
+        return -1
+
+    def _upsert(self, apartment_id: int, data: Dict[str, Any]) -> None:
+        row = self._row_of(apartment_id)
+        if row < 0:
+            row = int(np.searchsorted(self._ids[:self._size], apartment_id))
+            if row < self._size and self._ids[row] == apartment_id:
+                # Строка удаленной квартиры с тем же id используется повторно
+                self._dead -= 1
+            else:
+                if self._size == len(self._ids):
+                    self._grow(max(INITIAL_CAPACITY, 2 * len(self._ids)))
+                if row < self._size:
+                    # id меньше последнего - строки после него сдвигаются, чтобы сохранить порядок
+                    for array in self._arrays():
+                        array[row + 1:self._size + 1] = array[row:self._size]
+                    self._metro[row] = -1
+                    self._rooms[row] = -1
+                    for bitmap in (*self._metro_bitmaps.values(), *self._rooms_bitmaps.values()):
+                        bitmap[row] = False
+                self._size += 1
+                self._ids[row] = apartment_id
+            self._alive[row] = True
+        self._write(row, data)
+
+    def _remove(self, apartment_id: int) -> None:
+        row = self._row_of(apartment_id)
+        if row < 0:
+            return
+        self._alive[row] = False
+        self._dead += 1
+        if self._dead > MIN_COMPACT_ROWS and self._dead * 2 > self._size:
+            self._compact()
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self._alive[:self._size])
+        size = len(keep)
+        for name in ('_ids', '_metro', '_price', '_rooms', '_total_area', '_alive'):
+            array = getattr(self, name)
+            array[:size] = array[keep]
+        for bitmaps in (self._metro_bitmaps, self._rooms_bitmaps):
+            for bitmap in bitmaps.values():
+                bitmap[:size] = bitmap[keep]
+                bitmap[size:] = False
+        self._alive[size:] = False
+        self._metro[size:] = -1
+        self._rooms[size:] = -1
+        self._size, self._dead = size, 0
+
+    def load(self, db: Session) -> None:
+        """
+        Загрузка индекса из БД с применением изменений, случившихся во время загрузки
+        """
+        position = apartment_changes.position
+        rows = (
+            db.query(Apartment.id, Apartment.metro, Apartment.price, Apartment.rooms, Apartment.total_area)
+            .order_by(Apartment.id)
+            .all()
+        )
+        with self._lock:
+            self._reset(max(INITIAL_CAPACITY, len(rows)))
+            size = len(rows)
+            if size:
+                ids, metros, prices, rooms, areas = zip(*rows)
+                self._ids[:size] = ids
+                self._price[:size] = np.array(prices, dtype=float)
+                self._total_area[:size] = np.array(areas, dtype=float)
+                self._rooms[:size] = [value if value is not None and value >= 0 else -1 for value in rooms]
+                self._metro[:size] = [self._metro_code(metro) for metro in metros]
+                self._alive[:size] = True
+                self._size = size
+                for code in np.unique(self._metro[:size]):
+                    if code >= 0:
+                        self._metro_bitmaps[int(code)] = self._metro == code
+                for value in np.unique(self._rooms[:size]):
+                    if value >= 0:
+                        self._rooms_bitmaps[int(value)] = self._rooms == value
+
+            for event in apartment_changes.since(position) or []:
+                self._apply(event)
+            self._loaded = True
+        logger.info(f"Загружен индекс поиска квартир: {size} квартир, {len(self._metro_values)} станций")
+
+    def _apply(self, event: ChangeEvent) -> None:
+        if event.action == DELETE:
+            self._remove(event.key)
+        else:
+            self._upsert(event.key, event.data)
+
+    def apply_change(self, event: ChangeEvent) -> None:
+        """
+        Обновление индекса при изменении квартиры
+        """
+        with self._lock:
+            if self._loaded:
+                self._apply(event)
+
+    def invalidate(self) -> None:
+        """
+        Перезагрузка индекса из БД при следующем запросе
+        """
+        with self._lock:
+            self._loaded = False
+
+    def _mask(
+        self,
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+    ) -> np.ndarray:
+        # Условия те же, что в ApartmentRepository.search; сравнение с NaN ложно, как с NULL в SQL
+        size = self._size
+        mask = self._alive[:size].copy()
+        if metro:
+            code = self._metro_codes.get(metro)
+            mask &= self._metro_bitmaps[code][:size] if code in self._metro_bitmaps else False
+        if rooms:
+            mask &= self._rooms_bitmaps[rooms][:size] if rooms in self._rooms_bitmaps else False
+        if min_price is not None:
+            mask &= self._price[:size] >= min_price
+        if max_price is not None:
+            mask &= self._price[:size] <= max_price
+        if min_area is not None:
+            mask &= self._total_area[:size] >= min_area
+        return mask
+
+    def search_ids(
+        self,
+        db: Session,
+        *,
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+    ) -> List[int]:
+        """
+        id квартир, подходящих под фильтры, в порядке id: не больше limit после skip или after_id
+        """
+        if not self._loaded:
+            self.load(db)
+        with self._lock:
+            mask = self._mask(metro, min_price, max_price, rooms, min_area)
+            if after_id is not None:
+                mask[:int(np.searchsorted(self._ids[:self._size], after_id, side='right'))] = False
+            rows = np.flatnonzero(mask)[skip:skip + limit]
+            return self._ids[rows].tolist()
+
+    def count(
+        self,
+        db: Session,
+        *,
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+    ) -> Tuple[int, bool]:
+        """
+        Точное число квартир, подходящих под фильтры, совместимое с ApartmentRepository.count
+        """
+        if not self._loaded:
+            self.load(db)
+        with self._lock:
+            return int(self._mask(metro, min_price, max_price, rooms, min_area).sum()), True
+
+    def facets(
+        self,
+        db: Session,
+        *,
+        price_edges: Sequence[float],
+        area_edges: Sequence[float],
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Число квартир по станциям, комнатам и интервалам цены и площади, совместимое с ApartmentRepository.facets
+        """
+        if not self._loaded:
+            self.load(db)
+        with self._lock:
+            mask = self._mask(metro, min_price, max_price, rooms, min_area)
+            metro_codes = self._metro[:self._size][mask]
+            rooms_values = self._rooms[:self._size][mask]
+            prices = self._price[:self._size][mask]
+            areas = self._total_area[:self._size][mask]
+            metro_values = list(self._metro_values)
+
+        def buckets(values: np.ndarray, edges: Sequence[float]) -> Dict[int, int]:
+            # Номер интервала [edges[i-1], edges[i]), пустые значения не учитываются
+            values = values[~np.isnan(values)]
+            counts = np.bincount(np.searchsorted(np.asarray(edges, dtype=float), values, side='right'))
+            return {int(i): int(count) for i, count in enumerate(counts) if count}
+
+        metro_counts = np.bincount(metro_codes[metro_codes >= 0], minlength=len(metro_values))
+        rooms_counts = np.bincount(rooms_values[rooms_values >= 0])
+        return {
+            "total": int(mask.sum()),
+            "metro": {metro_values[code]: int(count) for code, count in enumerate(metro_counts) if count},
+            "rooms": {int(value): int(count) for value, count in enumerate(rooms_counts) if count},
+            "price": buckets(prices, price_edges),
+            "total_area": buckets(areas, area_edges),
+        }
+
+    def search(
+        self,
+        db: Session,
+        *,
+        metro: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Page:
+        """
+        Страница поиска квартир, совместимая с ApartmentRepository.search
+
+        Фильтры вычисляются в памяти, из БД одним запросом загружаются только
+        квартиры страницы. Курсоры взаимозаменяемы с курсорами репозитория.
+        """
+        after_id = None
+        if cursor:
+            try:
+                after_id = int(decode_cursor(cursor, [Apartment.id])[0])
+            except (TypeError, ValueError) as e:
+                raise InvalidCursorError("Некорректный курсор") from e
+            skip = 0
+        # Лишний id показывает, есть ли следующая страница
+        ids = self.search_ids(
+            db, metro=metro, min_price=min_price, max_price=max_price, rooms=rooms,
+            min_area=min_area, skip=skip, limit=limit + 1, after_id=after_id,
+        )
+        apartments = apartment_repository.get_by_ids_ordered(db, ids=ids[:limit])
+        if len(ids) <= limit:
+            return Page(apartments)
+        return Page(apartments, encode_cursor([ids[limit - 1]]))
+
+
+# Создаем синглтон для использования в приложении
+search_index = ApartmentSearchIndex()
+
+# Индекс обновляется при изменении квартир
+apartment_changes.subscribe(search_index.apply_change)
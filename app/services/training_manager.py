@@ -0,0 +1,344 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.services.model_store import model_store, compute_data_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Имена моделей, регистрируемых в менеджере обучения
+PRICE_PREDICTOR = "price_predictor"
+RECOMMENDER = "recommender"
+
+
+class ModelState(str, Enum):
+    """
+    Состояние модели машинного обучения
+    """
+    PENDING = "pending"
+    TRAINING = "training"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class ModelStatus:
+    """
+    Информация о ходе обучения отдельной модели
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.state = ModelState.PENDING
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.duration: Optional[float] = None
+        self.rows: Optional[int] = None
+        self.error: Optional[str] = None
+        self.version: Optional[str] = None
+        self.source: Optional[str] = None  # "artifact" или "trained"
+        self.retraining = False  # Идет переобучение, запросы обслуживает предыдущая модель
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": self.duration,
+            "rows": self.rows,
+            "error": self.error,
+            "version": self.version,
+            "source": self.source,
+            "retraining": self.retraining,
+        }
+
+
+class TrainingManager:
+    """
+    Управление фоновым обучением моделей и отслеживание их готовности
+    """
+    def __init__(self):
+        self._services: Dict[str, Any] = {}
+        self._statuses: Dict[str, ModelStatus] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._runs: Dict[str, threading.Event] = {}  # Идущие запуски обучения по имени модели
+        self._fingerprints: Dict[str, Dict[str, Any]] = {}  # Отпечатки данных, на которых обучены активные модели
+
+    def register(self, name: str, service: Any) -> None:
+        """
+        Регистрация сервиса с методом train(db)
+        """
+        with self._lock:
+            self._services[name] = service
+            self._statuses[name] = ModelStatus(name)
+
+    def is_ready(self, name: str) -> bool:
+        """
+        Проверка, готова ли модель обслуживать запросы
+        """
+        status = self._statuses.get(name)
+        return status is not None and status.state == ModelState.READY
+
+    def get_status(self, name: str) -> Optional[ModelStatus]:
+        return self._statuses.get(name)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Текущее состояние всех зарегистрированных моделей
+        """
+        with self._lock:
+            return {name: status.to_dict() for name, status in self._statuses.items()}
+
+    def all_ready(self) -> bool:
+        return all(status.state == ModelState.READY for status in self._statuses.values())
+
+    def _load_artifact(self, name: str, service: Any, fingerprint: Dict[str, Any]) -> Optional[str]:
+        """
+        Загрузка закрепленной версии или самой новой версии, обученной на текущих данных
+        """
+        version = model_store.get_pinned(name)
+        if version is None:
+            meta = model_store.find_latest(
+                name, fingerprint=fingerprint, artifact_format=service.ARTIFACT_FORMAT
+            )
+            version = meta["version"] if meta else None
+        if version is None:
+            return None
+
+        try:
+            service.load_state(model_store.load(name, version))
+        except Exception as e:
+            logger.error(f"Не удалось загрузить версию {version} модели {name}: {e}", exc_info=True)
+            return None
+
+        service.model_version = version
+        logger.info(f"Модель {name} загружена из хранилища, версия {version}")
+        return version
+
+    def _train_and_save(self, name: str, service: Any, db: Any, fingerprint: Dict[str, Any]) -> bool:
+        """
+        Обучение модели и сохранение новой версии в хранилище
+        """
+        if not service.train(db):
+            return False
+
+        try:
+            service.model_version = model_store.save(
+                name,
+                service.export_state(),
+                fingerprint=fingerprint,
+                artifact_format=service.ARTIFACT_FORMAT,
+                extra={"rows": getattr(service, "training_rows", None)},
+            )
+        except Exception as e:
+            # Модель обучена и может работать, даже если сохранить ее не удалось
+            logger.error(f"Не удалось сохранить модель {name}: {e}", exc_info=True)
+            service.model_version = None
+        return True
+
+    def is_training(self, name: str) -> bool:
+        with self._lock:
+            return name in self._runs
+
+    def train_model(self, name: str, force: bool = False) -> bool:
+        """
+        Подготовка одной модели в отдельной сессии БД с обновлением ее статуса
+
+        Если в хранилище есть версия, обученная на тех же данных, она загружается
+        без переобучения. При force=True модель всегда обучается заново.
+        Одновременно идет не больше одного обучения каждой модели: повторный вызов
+        во время обучения дожидается его завершения и возвращает его результат.
+        """
+        with self._lock:
+            run = self._runs.get(name)
+            if run is None:
+                self._runs[name] = threading.Event()
+
+        if run is not None:
+            logger.info(f"Модель {name} уже обучается, ожидаем завершения")
+            run.wait()
+            return self.is_ready(name)
+
+        try:
+            return self._train_model(name, force)
+        finally:
+            with self._lock:
+                self._runs.pop(name).set()
+
+    def request_training(self, name: str, force: bool = False) -> bool:
+        """
+        Запуск обучения модели в фоновом потоке без ожидания результата
+
+        Возвращает False, если обучение этой модели уже идет.
+        """
+        if self.is_training(name):
+            return False
+
+        threading.Thread(
+            target=self.train_model, args=(name, force), name=f"model-training-{name}", daemon=True
+        ).start()
+        return True
+
+    def ensure_training(self, name: str) -> None:
+        """
+        Повторный запуск обучения неготовой модели по запросу клиента
+
+        Упавшее обучение перезапускается не чаще одного раза в MODEL_RETRAIN_COOLDOWN секунд,
+        модель в ожидании - только если фоновое обучение при запуске уже не идет.
+        """
+        status = self._statuses.get(name)
+        if status is None or self.is_training(name):
+            return
+
+        if status.state == ModelState.FAILED:
+            elapsed = (datetime.now(timezone.utc) - status.finished_at).total_seconds()
+            if elapsed < settings.MODEL_RETRAIN_COOLDOWN:
+                return
+        elif status.state == ModelState.PENDING:
+            if self._thread is not None and self._thread.is_alive():
+                return
+        else:
+            return
+
+        if self.request_training(name):
+            logger.info(f"Запущено фоновое обучение модели {name} по запросу")
+
+    def _train_model(self, name: str, force: bool) -> bool:
+        service = self._services[name]
+        status = self._statuses[name]
+
+        # Пока новая модель обучается, запросы обслуживает уже опубликованная
+        serving = service.is_trained
+        with self._lock:
+            if not serving:
+                status.state = ModelState.TRAINING
+            status.retraining = serving
+            status.started_at = datetime.now(timezone.utc)
+            status.finished_at = None
+            status.error = None
+
+        started = time.perf_counter()
+        source = None
+        fingerprint = None
+        db = SessionLocal()
+        try:
+            fingerprint = compute_data_fingerprint(db, include_favorites=name == RECOMMENDER)
+            if not force and self._load_artifact(name, service, fingerprint):
+                success, source = True, "artifact"
+            else:
+                success = self._train_and_save(name, service, db, fingerprint)
+                source = "trained" if success else None
+            error = None if success else "Недостаточно данных для обучения"
+        except Exception as e:
+            logger.error(f"Ошибка при обучении модели {name}: {e}", exc_info=True)
+            success = False
+            error = str(e)
+        finally:
+            db.close()
+
+        with self._lock:
+            if success:
+                self._fingerprints[name] = fingerprint
+            status.duration = round(time.perf_counter() - started, 3)
+            status.finished_at = datetime.now(timezone.utc)
+            status.rows = getattr(service, "training_rows", None)
+            status.state = ModelState.READY if success or service.is_trained else ModelState.FAILED
+            status.retraining = False
+            status.error = error
+            status.version = getattr(service, "model_version", None)
+            status.source = source
+
+        logger.info(f"Обучение модели {name} завершено: {status.state.value} за {status.duration} с")
+        return success
+
+    def activate_version(self, name: str, version: str) -> None:
+        """
+        Загрузка указанной версии модели из хранилища в работающий сервис
+        """
+        service = self._services[name]
+        service.load_state(model_store.load(name, version))
+        service.model_version = version
+
+        with self._lock:
+            meta = model_store.get_meta(name, version) or {}
+            self._fingerprints[name] = meta.get("fingerprint")
+            status = self._statuses[name]
+            status.state = ModelState.READY
+            status.rows = getattr(service, "training_rows", None)
+            status.error = None
+            status.version = version
+            status.source = "artifact"
+        logger.info(f"Активирована версия {version} модели {name}")
+
+    def get_service(self, name: str) -> Optional[Any]:
+        return self._services.get(name)
+
+    def model_names(self) -> List[str]:
+        return list(self._services)
+
+    def train_all(self) -> None:
+        """
+        Последовательное обучение всех зарегистрированных моделей
+        """
+        for name in list(self._services):
+            self.train_model(name)
+
+    def refresh_model(self, name: str) -> bool:
+        """
+        Переобучение модели, если данные изменились с момента ее обучения
+
+        Закрепленные версии не переобучаются. Новая модель публикуется сервисом
+        атомарно, поэтому запросы во время переобучения не прерываются.
+        Избранное в сравнении не участвует: рекомендации учитывают его инкрементально
+        и сами запускают перестроение, когда доля изменений превышает RECOMMENDER_REBUILD_DRIFT.
+        """
+        if model_store.get_pinned(name) is not None:
+            return False
+
+        db = SessionLocal()
+        try:
+            current = compute_data_fingerprint(db)
+        finally:
+            db.close()
+        trained = self._fingerprints.get(name)
+        if trained is not None and current == {key: value for key, value in trained.items() if key != "favorites"}:
+            return False
+
+        logger.info(f"Данные изменились, переобучаем модель {name}")
+        return self.train_model(name)
+
+    def _run_background(self) -> None:
+        self.train_all()
+
+        interval = settings.MODEL_RETRAIN_INTERVAL
+        while interval > 0:
+            time.sleep(interval)
+            for name in list(self._services):
+                try:
+                    self.refresh_model(name)
+                except Exception as e:
+                    logger.error(f"Ошибка при плановом переобучении модели {name}: {e}", exc_info=True)
+
+    def start_background(self) -> threading.Thread:
+        """
+        Запуск обучения всех моделей в фоновом потоке
+
+        При MODEL_RETRAIN_INTERVAL > 0 поток продолжает работать и периодически
+        переобучает модели, данные которых изменились.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+
+        self._thread = threading.Thread(
+            target=self._run_background, name="model-training", daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+
+# Создаем синглтон для использования в приложении
+training_manager = TrainingManager()
@@ -1,15 +1,20 @@
 import logging
 import os
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
-from app.config.database import get_db, engine, Base
+from app.config.database import get_db, engine
 from app.config.settings import settings
+from app.core.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_ESTIMATED_HEADER, TOTAL_COUNT_HEADER, InvalidCursorError
+from app.migrations import upgrade as upgrade_schema
 from app.routes.api import router as api_router
+from app.routes.controllers import health
 from app.services.data_loader import init_db
 from app.services.price_predictor import price_predictor
 from app.services.recommender import recommender
+from app.services.training_manager import training_manager, PRICE_PREDICTOR, RECOMMENDER
 
 # Настройка логирования
 logging.basicConfig(
@@ -34,11 +39,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, TOTAL_COUNT_ESTIMATED_HEADER],
 )
 
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    """
+    Некорректный курсор пагинации - ошибка клиента
+    """
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)})
+
 # Подключение API роутеров
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+# Эндпоинты проверки состояния для оркестратора
+app.include_router(health.router, prefix="/health", tags=["health"])
+
+# Регистрация моделей, обучаемых в фоне
+training_manager.register(PRICE_PREDICTOR, price_predictor)
+training_manager.register(RECOMMENDER, recommender)
+
 
 # События приложения
 @app.on_event("startup")
@@ -48,21 +69,23 @@ async def startup_event():
     """
     logger.info("Инициализация приложения...")
     
-    # Создание таблиц в базе данных
-    Base.metadata.create_all(bind=engine)
+    # Применение миграций схемы базы данных
+    applied = upgrade_schema(engine)
+    if applied:
+        logger.info(f"Применены миграции схемы: {applied}")
     
     # Инициализация базы данных начальными данными
     db = next(get_db())
-    init_db(db)
-    
-    # Обучение моделей
-    logger.info("Обучение модели прогнозирования цен...")
-    price_predictor.train(db)
+    try:
+        init_db(db)
+    finally:
+        db.close()
     
-    logger.info("Обучение рекомендательной системы...")
-    recommender.train(db)
+    # Обучение моделей выполняется в фоне, чтобы не задерживать прием запросов
+    logger.info("Запуск фонового обучения моделей...")
+    training_manager.start_background()
     
-    logger.info("Приложение инициализировано и готово к работе")
+    logger.info("Приложение инициализировано, модели обучаются в фоне")
 
 
 @app.get("/")
@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+# База и каталог моделей задаются до импорта приложения: настройки и движок
+# создаются при импорте app.config
+_tmp_dir = tempfile.mkdtemp(prefix="vkr-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'app.db')}")
+os.environ.setdefault("MODEL_STORE_DIR", os.path.join(_tmp_dir, "models"))
+
+from datetime import datetime, timedelta  # noqa: E402
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.migrations import upgrade  # noqa: E402
+from app.models.apartment import Apartment  # noqa: E402
+
+METRO_STATIONS = ["Арбатская", "Сокол", "Таганская", "Чистые пруды"]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """
+    Пустая база SQLite во временном каталоге
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """
+    Сессия базы с примененными миграциями
+    """
+    upgrade(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def apartments(db):
+    """
+    Квартиры с повторяющимися значениями полей сортировки и пропусками (NULL)
+    """
+    rng = np.random.RandomState(7)
+    started = datetime(2024, 1, 1)
+    rows = []
+    for i in range(120):
+        total_area = [30.0, 45.5, 60.0, 0.0, None][rng.randint(5)]
+        rows.append({
+            "metro": [*METRO_STATIONS, None][rng.randint(5)],
+            "price": [20000.0, 35000.0, 50000.0, None][rng.randint(4)],
+            "rooms": [1, 2, 3, None][rng.randint(4)],
+            "total_area": total_area,
+            "views": [0, 3, 10, None][rng.randint(4)],
+            # Часть квартир создана в одну и ту же секунду
+            "created_at": started + timedelta(hours=int(rng.randint(10))),
+        })
+    db.execute(insert(Apartment), rows)
+    db.commit()
+    return db.query(Apartment).order_by(Apartment.id).all()
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from app.services.ann_index import DeltaBuffer, ExactIndex, IVFIndex
+
+
+@pytest.fixture
+def vectors():
+    """
+    Векторы, сгруппированные вокруг центров, как признаки квартир одной станции
+    """
+    rng = np.random.RandomState(3)
+    centers = rng.normal(size=(40, 12)) * 3
+    return (centers[rng.randint(40, size=4000)] + rng.normal(size=(4000, 12))).astype(np.float32)
+
+
+def recall(found, exact):
+    return np.mean([len(set(row) & set(expected)) / len(expected) for row, expected in zip(found, exact)])
+
+
+def test_ivf_neighbor_table_recall_matches_search(vectors):
+    k = 10
+    _, exact = ExactIndex().fit(vectors).search_all(k)
+    index = IVFIndex(nprobe=2).fit(vectors)
+
+    _, search_rows = index.search(vectors, k)
+    _, table_rows = index.search_all(k)
+
+    # Каждая строка таблицы просматривает не меньше кластеров, чем при поиске через search
+    assert recall(table_rows, exact) >= recall(search_rows, exact)
+    assert np.all(table_rows[:, 0] == np.arange(len(vectors)))
+
+
+@pytest.mark.parametrize("equals, ranges", [
+    (None, None),
+    ({"metro": "Сокол"}, None),
+    ({"rooms": 2}, {"price": (None, 40000)}),
+    ({"metro": "Сокол", "rooms": 1}, {"price": (30000, None), "total_area": (40, None)}),
+    ({"metro": "Нет такой станции"}, None),
+    (None, {"total_area": (None, None)}),
+])
+def test_delta_buffer_filters(equals, ranges):
+    rng = np.random.RandomState(5)
+    delta = DeltaBuffer(0, exact=["metro", "rooms"], ranges=["price", "total_area"])
+    attributes = {}
+    for key in range(300):
+        attributes[key] = {
+            "metro": ["Сокол", "Арбатская", ""][key % 3],
+            "rooms": float(key % 4),
+            "price": float(rng.choice([20000, 30000, 40000, 50000])),
+            "total_area": float(rng.uniform(20, 80)),
+        }
+        delta.upsert(key, rng.normal(size=8), attributes=attributes[key])
+    # Изменение и удаление после первой сборки колонок
+    delta.search(np.zeros((1, 8)), 5)
+    delta.upsert(0, np.zeros(8), attributes={**attributes[0], "metro": "Арбатская"})
+    attributes[0]["metro"] = "Арбатская"
+    delta.remove(1)
+    del attributes[1]
+
+    def matches(values):
+        for name, value in (equals or {}).items():
+            if values[name] != value:
+                return False
+        for name, (low, high) in (ranges or {}).items():
+            if (low is not None and values[name] < low) or (high is not None and values[name] > high):
+                return False
+        return True
+
+    expected = sorted(key for key, values in attributes.items() if matches(values))
+    _, ids = delta.search(np.zeros((1, 8)), 1000, equals, ranges)
+    assert sorted(ids[0].tolist()) == expected
@@ -0,0 +1,81 @@
+import pytest
+
+from app.core import cache as cache_module
+from app.core.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Управляемое время для проверки срока жизни записей
+    """
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(10, ttl=5)
+    cache.set("a", 1)
+
+    clock[0] += 4.9
+    assert cache.get("a") == 1
+
+    clock[0] += 0.1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_overwrite_extends_ttl(clock):
+    cache = TTLCache(10, ttl=5)
+    cache.set("a", 1)
+    clock[0] += 4
+    cache.set("a", 2)
+    clock[0] += 4
+
+    assert cache.get("a") == 2
+
+
+@pytest.mark.parametrize("ttl", [None, 0])
+def test_entries_without_ttl_do_not_expire(clock, ttl):
+    cache = TTLCache(10, ttl=ttl)
+    cache.set("a", 1)
+    clock[0] += 10 ** 6
+
+    assert cache.get("a") == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(3)
+    for key in "abc":
+        cache.set(key, key)
+
+    # Обращение к "a" делает самой старой запись "b"
+    assert cache.get("a") == "a"
+    cache.set("d", "d")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache(0)
+    cache.set("a", 1)
+
+    assert not cache.enabled
+    assert cache.get("a", "default") == "default"
+
+
+def test_stats_count_hits_and_misses():
+    cache = TTLCache(2)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+    cache.get("a")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 0)
+    assert stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-4)
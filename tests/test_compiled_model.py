@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.svm import SVR
+
+from app.services.compiled_model import CompiledPricePipeline, compile_pipeline
+from app.services.price_predictor import price_predictor
+from tests.conftest import METRO_STATIONS
+
+CATEGORICAL = price_predictor.categorical_features
+NUMERICAL = price_predictor.numerical_features
+
+
+def apartments_frame(n, seed_value, metro=METRO_STATIONS):
+    rng = np.random.RandomState(seed_value)
+    return pd.DataFrame({
+        "metro": rng.choice(metro, n),
+        "way": rng.choice(["пешком", "транспорт"], n),
+        "minutes": rng.randint(1, 30, n).astype(float),
+        "storey": rng.randint(1, 10, n).astype(float),
+        "storeys": rng.randint(5, 25, n).astype(float),
+        "rooms": rng.randint(1, 4, n).astype(float),
+        "total_area": rng.uniform(20, 90, n),
+        "living_area": rng.uniform(10, 50, n),
+        "kitchen_area": rng.uniform(5, 15, n),
+    })
+
+
+def fit_pipeline(regressor):
+    """
+    Пайплайн той же структуры, что и при обучении модели цены
+    """
+    frame = apartments_frame(300, 0)
+    target = frame["total_area"] * 1000 + frame["metro"].map({m: i * 3000 for i, m in enumerate(METRO_STATIONS)})
+    return Pipeline(steps=[
+        ("preprocessor", ColumnTransformer(transformers=[
+            ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL),
+            ("num", StandardScaler(), NUMERICAL),
+        ])),
+        ("regressor", regressor),
+    ]).fit(frame, target)
+
+
+@pytest.mark.parametrize("regressor", [
+    LinearRegression(),
+    Ridge(alpha=1.0),
+    Lasso(alpha=0.1),
+    ElasticNet(alpha=0.1, l1_ratio=0.5),
+    SVR(kernel="linear"),
+    RandomForestRegressor(n_estimators=20, max_depth=8, random_state=42),
+    GradientBoostingRegressor(n_estimators=30, learning_rate=0.1, max_depth=4, random_state=42),
+], ids=lambda regressor: type(regressor).__name__)
+def test_compiled_matches_pipeline(regressor):
+    pipeline = fit_pipeline(regressor)
+    compiled = compile_pipeline(pipeline, CATEGORICAL, NUMERICAL)
+    assert compiled is not None
+
+    # Квартиры, которых не было при обучении, включая неизвестную станцию метро
+    frame = apartments_frame(100, 1, metro=[*METRO_STATIONS, "Новая станция"])
+    expected = pipeline.predict(frame)
+    actual = [compiled.predict_one(row) for row in frame.to_dict("records")]
+
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-6)
+
+
+def test_unsupported_regressor_falls_back():
+    pipeline = fit_pipeline(KNeighborsRegressor(n_neighbors=3))
+
+    assert compile_pipeline(pipeline, CATEGORICAL, NUMERICAL) is None
+
+
+def test_divergent_compilation_is_rejected():
+    pipeline = fit_pipeline(Ridge(alpha=1.0))
+    compiled = CompiledPricePipeline(pipeline, CATEGORICAL, NUMERICAL)
+    assert compiled.check_parity(pipeline)
+
+    compiled.intercept += 1.0
+    assert not compiled.check_parity(pipeline)
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from app.services.cooccurrence import CooccurrenceIndex
+
+
+@pytest.fixture
+def favorites():
+    """
+    Пары (пользователь, квартира): часть квартир популярна, у части пользователей одно избранное
+    """
+    rng = np.random.RandomState(11)
+    pairs = set()
+    for user in range(60):
+        for item in rng.choice(40, size=rng.randint(1, 8), replace=False):
+            pairs.add((user, int(item) * 3 + 100))
+    users, items = zip(*sorted(pairs))
+    return np.array(users, dtype=np.int64), np.array(items, dtype=np.int64)
+
+
+def user_sets(users, items):
+    result = {}
+    for user, item in zip(users, items):
+        result.setdefault(int(user), set()).add(int(item))
+    return result
+
+
+def brute_force(user_items, favorite_ids):
+    """
+    Сумма косинусов между множествами пользователей для каждой квартиры-кандидата
+    """
+    item_users = {}
+    for user, items in user_items.items():
+        for item in items:
+            item_users.setdefault(item, set()).add(user)
+    scores = {}
+    for favorite in set(favorite_ids) & set(item_users):
+        for item, users in item_users.items():
+            common = len(users & item_users[favorite])
+            if item != favorite and common:
+                scores[item] = scores.get(item, 0.0) + common / np.sqrt(len(users) * len(item_users[favorite]))
+    return scores
+
+
+def assert_matches(index, user_items, favorite_ids):
+    ids, scores = index.score(favorite_ids)
+    expected = brute_force(user_items, favorite_ids)
+    assert sorted(ids.tolist()) == sorted(expected)
+    for item, score in zip(ids.tolist(), scores):
+        assert score == pytest.approx(expected[item], rel=1e-5)
+
+
+@pytest.mark.parametrize("favorite_ids", [[100], [103, 130, 205], [100, 999], [999]])
+def test_built_index_matches_brute_force(favorites, favorite_ids):
+    users, items = favorites
+    # Соседей больше, чем квартир, и блоки меньше числа квартир: обрезка не влияет на результат
+    index = CooccurrenceIndex.build(users, items, k=100, block_size=7)
+
+    assert_matches(index, user_sets(users, items), favorite_ids)
+
+
+def test_index_after_changes_matches_brute_force(favorites):
+    users, items = favorites
+    index = CooccurrenceIndex.build(users, items, k=100, block_size=7)
+    user_items = user_sets(users, items)
+
+    rng = np.random.RandomState(5)
+    for _ in range(150):
+        # Новые пользователи, новые квартиры, повторы и удаление отсутствующего
+        user, item = int(rng.randint(70)), int(rng.randint(45)) * 3 + 100
+        if rng.rand() < 0.5:
+            index.add(user, item)
+            user_items.setdefault(user, set()).add(item)
+        else:
+            index.remove(user, item)
+            user_items.get(user, set()).discard(item)
+
+    for favorite_ids in ([100], [103, 130, 205], [199, 232], list(range(100, 235, 3))):
+        assert_matches(index, user_items, favorite_ids)
+
+
+def test_repeated_changes_do_not_count_twice(favorites):
+    users, items = favorites
+    index = CooccurrenceIndex.build(users, items, k=100)
+    user, item = int(users[0]), int(items[0])
+
+    index.add(user, item)
+    index.remove(user, 999)
+    assert index.drift() == 0
+
+    index.remove(user, item)
+    index.remove(user, item)
+    user_items = user_sets(users, items)
+    user_items[user].discard(item)
+    assert index.drift() > 0
+    assert_matches(index, user_items, [item, int(items[1])])
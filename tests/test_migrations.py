@@ -0,0 +1,85 @@
+from sqlalchemy import inspect, text
+
+from app.migrations import current_version, discover, downgrade, upgrade
+from app.migrations.versions import v0001_initial_schema
+
+QUERY_INDEXES = {
+    "ix_apartments_created_at_id",
+    "ix_apartments_owner_id_id",
+    "ix_apartments_views_id",
+    "ix_apartments_metro_rooms_price",
+    "ix_apartments_price_id",
+    "ix_apartments_total_area_id",
+    "ix_apartments_price_per_m2_id",
+}
+
+
+def create_legacy_database(engine):
+    """
+    База в том виде, в каком ее создавал create_all до появления миграций, с повторами в избранном
+    """
+    v0001_initial_schema.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (id, username, email, is_active) VALUES (1, 'ivan', 'ivan@example.com', 1)"))
+        connection.execute(text(
+            "INSERT INTO apartments (id, owner_id, metro, price, total_area, views) VALUES "
+            "(1, 1, 'Сокол', 40000, 40, 5), (2, 1, 'Сокол', 30000, 0, 1), (3, NULL, NULL, NULL, NULL, NULL)"
+        ))
+        connection.execute(text(
+            "INSERT INTO favorites (id, user_id, apartment_id) VALUES (1, 1, 1), (2, 1, 1), (3, 1, 2), (4, 1, 1)"
+        ))
+
+
+def indexes(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def columns(engine, table):
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def test_upgrade_existing_database(engine):
+    create_legacy_database(engine)
+
+    assert upgrade(engine) == [migration.version for migration in discover()]
+    assert current_version(engine) == discover()[-1].version
+    assert QUERY_INDEXES <= indexes(engine, "apartments")
+    assert "uq_favorites_user_apartment" in indexes(engine, "favorites")
+    with engine.connect() as connection:
+        # Из повторов осталась самая ранняя запись
+        assert connection.execute(text("SELECT id FROM favorites ORDER BY id")).scalars().all() == [1, 3]
+        assert connection.execute(text("SELECT price_per_m2 FROM apartments ORDER BY id")).scalars().all() == [
+            1000.0, None, None
+        ]
+    # Повторный запуск ничего не применяет
+    assert upgrade(engine) == []
+
+
+def test_downgrade_and_upgrade_again(engine):
+    create_legacy_database(engine)
+    upgrade(engine)
+
+    assert downgrade(engine, 1) == [3, 2]
+    assert current_version(engine) == 1
+    assert not QUERY_INDEXES & indexes(engine, "apartments")
+    assert "ix_apartments_price" in indexes(engine, "apartments")
+    assert "price_per_m2" not in columns(engine, "apartments")
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM apartments")).scalar() == 3
+
+    assert upgrade(engine) == [2, 3]
+    assert QUERY_INDEXES <= indexes(engine, "apartments")
+
+
+def test_downgrade_to_empty_database(engine):
+    upgrade(engine)
+    downgrade(engine, 0)
+
+    assert current_version(engine) == 0
+    assert set(inspect(engine).get_table_names()) == {"schema_migrations"}
+
+
+def test_upgrade_to_target(engine):
+    assert upgrade(engine, target=1) == [1]
+    assert "price_per_m2" not in columns(engine, "apartments")
+    assert upgrade(engine) == [2, 3]
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.dummy import DummyRegressor
+from sklearn.linear_model import LinearRegression
+
+from app.services.model_selection import CandidateEvaluator, best_candidate, successive_halving
+from app.services.price_predictor import PricePredictorService
+
+
+class ScriptedEvaluator:
+    """
+    Оценщик с заранее заданным R² каждого кандидата на каждой ступени
+    """
+    def __init__(self, r2_by_rung):
+        self.r2_by_rung = r2_by_rung
+        self.calls = []
+
+    def evaluate(self, candidates, train_rows=None, timeout=None, deadline=None):
+        rung = len(self.calls)
+        self.calls.append((sorted(candidates), deadline))
+        return {name: {'test_r2': self.r2_by_rung[rung][name], 'fit_time': 0.01 * (rung + 1)} for name in candidates}
+
+
+def test_winner_is_taken_from_last_rung():
+    # C лучше финалистов на первой ступени, но выбывает на ней
+    evaluator = ScriptedEvaluator([
+        {'A': 0.9, 'B': 0.8, 'C': 0.7, 'D': 0.1},
+        {'A': 0.5, 'B': 0.6},
+    ])
+    scores = successive_halving(
+        evaluator, dict.fromkeys('ABCD'), np.arange(200.0), min_samples=100, factor=2, budget=60
+    )
+
+    assert [names for names, _ in evaluator.calls] == [['A', 'B', 'C', 'D'], ['A', 'B']]
+    assert scores['C']['rung'] == 0 and scores['B']['rung'] == 1
+    assert best_candidate(scores) == 'B'
+
+
+def test_best_candidate_without_rungs():
+    assert best_candidate({'A': {'test_r2': 0.2}, 'B': {'test_r2': 0.4}}) == 'B'
+
+
+def test_halving_limits_time_per_call_without_changing_evaluator():
+    X = pd.DataFrame({'x': np.arange(200.0)})
+    y = pd.Series(np.arange(200.0) * 2)
+    candidates = {'linear': LinearRegression(), 'dummy': DummyRegressor()}
+    with CandidateEvaluator(X, X, y, y, workers=1) as evaluator:
+        scores = successive_halving(evaluator, candidates, y, min_samples=50, factor=2, budget=60)
+        assert evaluator.timeout is None
+
+    assert best_candidate(scores) == 'linear'
+
+
+def test_final_fit_rows_sized_by_winner():
+    y = pd.Series(np.arange(10000.0))
+    scores = {
+        # Выбывший кандидат обучался быстро на маленькой подвыборке
+        'early': {'test_r2': 0.99, 'fit_time': 0.0001, 'n_samples': 100, 'rung': 0},
+        'winner': {'test_r2': 0.9, 'fit_time': 1.0, 'n_samples': 1000, 'rung': 1},
+    }
+    service = PricePredictorService()
+
+    rows = service._final_fit_rows(scores, y, time.perf_counter() + 2)
+    assert 1000 <= len(rows) < 3000
+    assert service._final_fit_rows(scores, y, None) is None
+
+
+class SlowRegressor(BaseEstimator, RegressorMixin):
+    """
+    Модель, обучение которой занимает заданное время
+    """
+    def __init__(self, seconds=0.2):
+        self.seconds = seconds
+
+    def fit(self, X, y):
+        time.sleep(self.seconds)
+        self.mean_ = float(np.mean(y))
+        return self
+
+    def predict(self, X):
+        return np.full(len(X), self.mean_)
+
+
+def test_inline_evaluation_stops_at_deadline():
+    X = pd.DataFrame({'x': np.arange(100.0)})
+    y = pd.Series(np.arange(100.0))
+    candidates = {f'slow{i}': SlowRegressor(0.2) for i in range(5)}
+    with CandidateEvaluator(X, X, y, y, workers=1) as evaluator:
+        started = time.perf_counter()
+        scores = evaluator.evaluate(candidates, deadline=started + 0.3)
+        elapsed = time.perf_counter() - started
+
+    # Начатое обучение не прерывается, следующие кандидаты не запускаются
+    assert [name for name, result in scores.items() if 'error' not in result] == ['slow0', 'slow1']
+    assert all(scores[f'slow{i}']['error'] == 'timeout' for i in range(2, 5))
+    assert elapsed < 0.6
+
+
+def test_inline_halving_respects_budget():
+    X = pd.DataFrame({'x': np.arange(4000.0)})
+    y = pd.Series(np.arange(4000.0))
+    candidates = {f'slow{i}': SlowRegressor(0.3) for i in range(8)}
+    with CandidateEvaluator(X, X, y, y, workers=1) as evaluator:
+        started = time.perf_counter()
+        scores = successive_halving(evaluator, candidates, y, min_samples=100, factor=2, budget=1.0)
+        elapsed = time.perf_counter() - started
+
+    # Бюджет может быть превышен не больше чем на обучение одного кандидата
+    assert elapsed < 1.0 + 0.3 + 0.2
+    assert max(result['rung'] for result in scores.values()) == 0
+    assert 'error' not in scores[best_candidate(scores)]
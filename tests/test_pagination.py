@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from app.models.apartment import Apartment
+from app.repositories.apartment_repository import apartment as apartment_repository
+from app.schemas.apartment_schema import ApartmentSort
+
+
+def walk(call, limit):
+    """
+    id всех записей, полученных переходом по курсорам, и число страниц
+    """
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = call(limit=limit, cursor=cursor)
+        ids.extend(apartment.id for apartment in page)
+        pages += 1
+        if page.next_cursor is None:
+            return ids, pages
+        cursor = page.next_cursor
+
+
+def expected_order(apartments, sort):
+    column = sort.lstrip("-")
+    rows = [apartment for apartment in apartments if getattr(apartment, column) is not None]
+    rows.sort(key=lambda apartment: (getattr(apartment, column), apartment.id), reverse=sort.startswith("-"))
+    return [apartment.id for apartment in rows]
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor([created_at, 17]), [Apartment.created_at, Apartment.id]) == [created_at, 17]
+    assert decode_cursor(encode_cursor([35000.5, 3]), [Apartment.price, Apartment.id]) == [35000.5, 3]
+
+
+@pytest.mark.parametrize("cursor", ["не курсор", encode_cursor([1]), encode_cursor([None, 1]), encode_cursor(["вчера", 1])])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, [Apartment.created_at, Apartment.id])
+
+
+@pytest.mark.parametrize("sort", [sort.value for sort in ApartmentSort])
+@pytest.mark.parametrize("limit", [1, 7, 500])
+def test_search_cursor_walk(db, apartments, sort, limit):
+    """
+    Переход по курсорам проходит все квартиры с непустым ключом ровно один раз в порядке сортировки
+    """
+    ids, pages = walk(lambda **page: apartment_repository.search(db, sort=sort, **page), limit)
+    expected = expected_order(apartments, sort)
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // limit))
+
+
+def test_search_cursor_walk_with_filters(db, apartments):
+    ids, _ = walk(
+        lambda **page: apartment_repository.search(db, sort="-price", rooms=2, min_area=30, **page), 4
+    )
+    matching = [
+        apartment for apartment in apartments
+        if apartment.rooms == 2 and apartment.total_area is not None and apartment.total_area >= 30
+    ]
+    assert ids == expected_order(matching, "-price")
+
+
+def test_latest_cursor_walk_with_equal_dates(db, apartments):
+    ids, _ = walk(lambda **page: apartment_repository.get_latest(db, **page), 9)
+    assert ids == expected_order(apartments, "-created_at")
+
+
+def test_cursor_matches_skip_pagination(db, apartments):
+    by_cursor, _ = walk(lambda **page: apartment_repository.search(db, sort="total_area", **page), 10)
+    by_skip = [
+        apartment.id
+        for skip in range(0, len(by_cursor), 10)
+        for apartment in apartment_repository.search(db, sort="total_area", skip=skip, limit=10)
+    ]
+    assert by_cursor == by_skip
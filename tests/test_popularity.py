@@ -0,0 +1,72 @@
+import pytest
+
+from app.core.change_log import ChangeEvent, UPSERT, apartment_changes, apartment_views
+from app.models.apartment import Apartment
+from app.repositories.apartment_repository import apartment as apartment_repository
+from app.services.popularity import PopularityService
+
+
+def expected_ids(db, n, exclude=()):
+    """
+    Рейтинг по данным БД: по убыванию просмотров, при равенстве выше более новая квартира
+    """
+    apartments = [apartment for apartment in db.query(Apartment).all() if apartment.id not in set(exclude)]
+    apartments.sort(key=lambda apartment: (-(apartment.views or 0), -apartment.id))
+    return [apartment.id for apartment in apartments[:n]]
+
+
+def apply_published(service, change_log, position):
+    for event in change_log.since(position):
+        service.apply_change(event)
+
+
+@pytest.mark.parametrize("top_n", [10, 500])
+def test_rating_matches_database(db, apartments, top_n):
+    service = PopularityService(top_n=top_n)
+
+    assert service.top_ids(db, 10) == expected_ids(db, 10)
+
+
+def test_views_reorder_rating(db, apartments):
+    service = PopularityService(top_n=10)
+    top = service.top_ids(db, 10)
+    outsider = next(
+        apartment for apartment in apartments if apartment.id not in top and apartment.views is not None
+    )
+
+    # Просмотры новой квартиры вытесняют последнюю квартиру рейтинга
+    position = apartment_views.position
+    for _ in range(11 - outsider.views):
+        apartment_repository.increment_views(db, id=outsider.id)
+    apply_published(service, apartment_views, position)
+    assert service.top_ids(db, 10) == [outsider.id] + top[:9]
+
+    # Квартира, потерявшая просмотры, уходит из рейтинга, ее место занимает следующая из БД
+    position = apartment_changes.position
+    apartment_repository.update(db, db_obj=apartment_repository.get(db, id=top[0]), obj_in={"views": 0})
+    apply_published(service, apartment_changes, position)
+    assert service.top_ids(db, 10) == expected_ids(db, 10)
+    assert top[0] not in service.top_ids(db, 10)
+
+
+def test_equal_views_rank_newer_apartment_higher(db, apartments):
+    service = PopularityService(top_n=10)
+    service.top_ids(db, 10)
+    older, newer = apartments[5].id, apartments[50].id
+
+    for apartment_id in (newer, older):
+        service.apply_change(ChangeEvent(seq=0, action=UPSERT, key=apartment_id, data={"views": 1000}))
+
+    assert service.top_ids(db, 2) == [newer, older]
+
+
+@pytest.mark.parametrize("top_n", [10, 500])
+def test_excluded_ids_do_not_shorten_result(db, apartments, top_n):
+    service = PopularityService(top_n=top_n)
+    favorites = service.top_ids(db, 4) + [apartments[0].id]
+
+    result = service.top_ids(db, 10, exclude=favorites)
+
+    assert len(result) == 10
+    assert not set(result) & set(favorites)
+    assert result == expected_ids(db, 10, exclude=favorites)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from app.config.settings import settings
+from app.routes.controllers import predictions
+from app.routes.deps import get_current_user
+from app.services.compiled_model import compile_pipeline
+from app.services.feature_extraction import normalize_features
+from app.services.price_predictor import PriceModelBundle, price_predictor
+from app.services.training_manager import training_manager
+from tests.conftest import METRO_STATIONS
+
+APARTMENT = {
+    "metro": METRO_STATIONS[0],
+    "way": "пешком",
+    "minutes": 5,
+    "storey": 3,
+    "storeys": 9,
+    "rooms": 2,
+    "total_area": 50,
+    "living_area": 30,
+    "kitchen_area": 8,
+}
+
+
+@pytest.fixture
+def price_model(monkeypatch):
+    """
+    Небольшая обученная модель цены вместо обучения на данных базы
+    """
+    rng = np.random.RandomState(0)
+    n = 200
+    frame = pd.DataFrame({
+        "metro": rng.choice(METRO_STATIONS, n),
+        "way": rng.choice(["пешком", "транспорт"], n),
+        "minutes": rng.randint(1, 30, n).astype(float),
+        "storey": rng.randint(1, 10, n).astype(float),
+        "storeys": np.full(n, 10.0),
+        "rooms": rng.randint(1, 4, n).astype(float),
+        "total_area": rng.uniform(20, 90, n),
+        "living_area": rng.uniform(10, 50, n),
+        "kitchen_area": rng.uniform(5, 15, n),
+    })
+    categorical = price_predictor.categorical_features
+    numerical = price_predictor.numerical_features
+    model = Pipeline(steps=[
+        ("preprocessor", ColumnTransformer(transformers=[
+            ("cat", OneHotEncoder(handle_unknown="ignore"), categorical),
+            ("num", StandardScaler(), numerical),
+        ])),
+        ("regressor", LinearRegression()),
+    ]).fit(frame, frame["total_area"] * 1000)
+    bundle = PriceModelBundle(
+        model=model,
+        compiled=compile_pipeline(model, categorical, numerical),
+        model_performance={},
+        training_rows=n,
+        categorical_features=list(categorical),
+        numerical_features=list(numerical),
+    )
+    monkeypatch.setattr(price_predictor, "_bundle", bundle)
+    monkeypatch.setattr(training_manager, "is_ready", lambda name: True)
+    price_predictor.cache.clear()
+    return bundle
+
+
+@pytest.fixture
+def client(price_model):
+    app = FastAPI()
+    app.include_router(predictions.router, prefix="/predictions")
+    app.dependency_overrides[get_current_user] = lambda: None
+    with TestClient(app) as client:
+        yield client
+
+
+def test_predict_price(client):
+    response = client.post("/predictions/price", json=APARTMENT)
+    assert response.status_code == 200
+    assert response.json()["predicted_price"] == pytest.approx(50000, rel=0.01)
+
+
+def test_predict_price_with_optional_fields_missing(client):
+    apartment = {key: value for key, value in APARTMENT.items() if key not in ("living_area", "kitchen_area")}
+    assert client.post("/predictions/price", json=apartment).status_code == 200
+
+
+@pytest.mark.parametrize("payload", [{}, {"metro": METRO_STATIONS[0], "rooms": 2}, {**APARTMENT, "total_area": -1}])
+def test_predict_price_rejects_incomplete_features(client, payload):
+    response = client.post("/predictions/price", json=payload)
+    assert response.status_code == 422
+
+
+def test_service_rejects_missing_features(price_model):
+    assert price_predictor.predict_price({"metro": METRO_STATIONS[0], "rooms": 2}) is None
+    assert price_predictor.predict_price(APARTMENT) == pytest.approx(50000, rel=0.01)
+
+
+class ConstantModel:
+    """
+    Модель, прогноз которой заметно отличается от обученной
+    """
+    def predict(self, frame):
+        return np.full(len(frame), 77777.0)
+
+
+def test_publish_invalidates_prediction_cache(price_model):
+    price = price_predictor.predict_price(APARTMENT)
+    hits = price_predictor.cache.hits
+    assert price_predictor.predict_price(APARTMENT) == price
+    assert price_predictor.cache.hits == hits + 1
+
+    price_predictor._publish(PriceModelBundle(
+        model=ConstantModel(),
+        compiled=None,
+        model_performance={},
+        training_rows=price_model.training_rows,
+        categorical_features=price_model.categorical_features,
+        numerical_features=price_model.numerical_features,
+    ))
+
+    assert len(price_predictor.cache) == 0
+    assert price_predictor.predict_price(APARTMENT) == 77777.0
+
+
+def test_prediction_cache_keys_include_generation(price_model, monkeypatch):
+    price = price_predictor.predict_price(APARTMENT)
+
+    # Новая версия той же модели остается тем же поколением и пользуется кэшем
+    price_predictor.model_version = "v2"
+    assert price_predictor._bundle.generation == price_model.generation
+    assert price_predictor.predict_price(APARTMENT) == price
+
+    # Записи прежнего поколения не отдаются новой модели, даже если кэш не очищен
+    monkeypatch.setattr(price_predictor, "_bundle", replace(
+        price_model, model=ConstantModel(), compiled=None, generation=price_model.generation + 1
+    ))
+    assert price_predictor.predict_price(APARTMENT) == 77777.0
+
+
+class ChunkedRequest:
+    """
+    Запрос, тело которого приходит заданными частями
+    """
+    def __init__(self, parts):
+        self.parts = parts
+
+    async def stream(self):
+        for part in self.parts:
+            yield part
+
+
+def stream_chunks(parts):
+    async def collect():
+        return [chunk async for chunk in predictions._predict_ndjson_stream(ChunkedRequest(parts))]
+    return asyncio.run(collect())
+
+
+def parse_ndjson(text):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_ndjson_reports_errors_per_line(client):
+    body = "\n".join([
+        json.dumps(APARTMENT),
+        "{не json",
+        "",
+        json.dumps({"metro": METRO_STATIONS[0]}),
+        json.dumps(APARTMENT),
+    ])
+    response = client.post(
+        "/predictions/price/batch", content=body.encode(), headers={"Content-Type": predictions.NDJSON_MEDIA_TYPE}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(predictions.NDJSON_MEDIA_TYPE)
+    results = parse_ndjson(response.text)
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert "predicted_price" in results[0] and "predicted_price" in results[3]
+    assert results[1]["error"] == "Некорректный JSON"
+    assert results[2]["error"][0]["loc"] == ["way"]
+
+
+def test_ndjson_is_streamed_by_batches(price_model, monkeypatch):
+    monkeypatch.setattr(settings, "PREDICTION_BATCH_MAX", 2)
+    line = json.dumps(APARTMENT).encode()
+    chunks = stream_chunks([line + b"\n" + line[:10], line[10:] + b"\n", line + b"\n" + line])
+
+    assert [len(parse_ndjson(chunk)) for chunk in chunks] == [2, 2]
+    assert [result["index"] for chunk in chunks for result in parse_ndjson(chunk)] == [0, 1, 2, 3]
+
+
+def test_ndjson_limits_line_length(price_model, monkeypatch):
+    monkeypatch.setattr(settings, "PREDICTION_NDJSON_MAX_LINE", 300)
+    line = json.dumps(APARTMENT).encode()
+    long_line = json.dumps({**APARTMENT, "metro": "x" * 1000}).encode()
+    # Длинная строка приходит частями и целиком в одной части
+    chunks = stream_chunks([
+        line + b"\n" + long_line[:200], long_line[200:600], long_line[600:] + b"\n" + line + b"\n", long_line,
+    ])
+
+    results = [result for chunk in chunks for result in parse_ndjson(chunk)]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [result.get("error") for result in results] == [None, "Строка длиннее 300 байт", None, "Строка длиннее 300 байт"]
+
+
+def test_normalize_features_requires_fields_only_on_request():
+    categorical, numerical = ["metro", "way"], ["rooms", "total_area"]
+    assert normalize_features({"rooms": 2}, categorical, numerical) == {
+        "metro": "", "way": "", "rooms": 2.0, "total_area": 0.0,
+    }
+    with pytest.raises(ValueError, match="metro, way, total_area"):
+        normalize_features({"rooms": 2}, categorical, numerical, required=True)
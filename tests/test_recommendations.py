@@ -0,0 +1,194 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config.database import get_db
+from app.config.settings import settings
+from app.core.change_log import ChangeEvent, DELETE, UPSERT, apartment_changes
+from app.migrations.check_query_plans import capture_selects, seed
+from app.repositories.apartment_repository import apartment as apartment_repository
+from app.routes.controllers import recommendations
+from app.schemas.apartment_schema import ApartmentCreate
+from app.services.recommender import RecommenderService
+from app.services.training_manager import RECOMMENDER, training_manager
+
+
+@pytest.fixture
+def service(db, monkeypatch):
+    """
+    Модель рекомендаций, обученная на синтетических квартирах тестовой базы
+    """
+    seed(db, n_apartments=300, n_users=20, seed_value=1)
+    service = RecommenderService()
+    assert service.train(db)
+    monkeypatch.setattr(recommendations, "recommender", service)
+    monkeypatch.setattr(training_manager, "is_ready", lambda name: True)
+    return service
+
+
+@pytest.fixture
+def client(db, service):
+    app = FastAPI()
+    app.include_router(recommendations.router, prefix="/recommendations")
+    app.dependency_overrides[get_db] = lambda: db
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("query", ["", "&max_price=40000"])
+def test_similar_apartments_single_query(client, service, db, monkeypatch, query):
+    apartment_id = apartment_repository.get_latest(db, limit=1)[0].id
+    calls = []
+    get_similar_apartments = service.get_similar_apartments
+
+    def counted(*args, **kwargs):
+        calls.append(kwargs)
+        return get_similar_apartments(*args, **kwargs)
+
+    monkeypatch.setattr(service, "get_similar_apartments", counted)
+
+    with capture_selects(db.get_bind()) as selects:
+        response = client.get(f"/recommendations/similar/{apartment_id}?limit=5{query}")
+
+    assert response.status_code == 200
+    similar = [apartment["id"] for apartment in response.json()]
+    assert len(similar) == 5 and apartment_id not in similar
+    # Квартира и ее соседи загружаются одним запросом
+    assert len(calls) == 1
+    assert len(selects) == 1
+
+
+def test_similar_apartments_uses_neighbor_table(client, service, db):
+    apartment_id = apartment_repository.get_latest(db, limit=1)[0].id
+    response = client.get(f"/recommendations/similar/{apartment_id}?limit=5")
+    assert [apartment["id"] for apartment in response.json()] == service.get_similar_ids(apartment_id, 5)
+
+
+def test_similar_apartments_not_found(client, db):
+    assert client.get("/recommendations/similar/100000").status_code == 404
+
+
+def test_similar_apartments_of_deleted_apartment(client, db):
+    apartment_id = apartment_repository.get_latest(db, limit=1)[0].id
+    db.delete(apartment_repository.get(db, id=apartment_id))
+    db.commit()
+    # Изменение не попало в журнал (удалено в обход репозитория), квартира еще есть в модели
+    assert client.get(f"/recommendations/similar/{apartment_id}").status_code == 404
+
+
+def apply_published(service, position):
+    """
+    Передача модели изменений, записанных репозиторием в журнал после position
+    """
+    for event in apartment_changes.since(position):
+        service.apply_change(event)
+
+
+def attributes_of(apartment):
+    return {field: getattr(apartment, field) for field in ApartmentCreate.model_fields}
+
+
+def test_created_apartment_is_similar_before_rebuild(service, db):
+    original = apartment_repository.get_latest(db, limit=1)[0]
+    position = apartment_changes.position
+    created = apartment_repository.create_with_owner(
+        db, obj_in=ApartmentCreate(**attributes_of(original)), owner_id=original.owner_id
+    )
+    apply_published(service, position)
+
+    # Копия квартиры ближе всех к оригиналу, а оригинал - к копии
+    assert [apartment.id for apartment in service.get_similar_apartments(db, original.id, 5)][0] == created.id
+    assert [apartment.id for apartment in service.get_similar_apartments(db, created.id, 5)][0] == original.id
+
+
+def test_updated_apartment_is_similar_before_rebuild(service, db):
+    original, updated = apartment_repository.get_latest(db, limit=2)
+    assert updated.id not in [apartment.id for apartment in service.get_similar_apartments(db, original.id, 5)]
+
+    position = apartment_changes.position
+    apartment_repository.update(db, db_obj=updated, obj_in=attributes_of(original))
+    apply_published(service, position)
+
+    # Прежний вектор квартиры скрыт, поиск идет по новым характеристикам
+    assert service._bundle.delta.tombstones[service._bundle.row_of(updated.id)]
+    assert [apartment.id for apartment in service.get_similar_apartments(db, original.id, 5)][0] == updated.id
+    assert [apartment.id for apartment in service.get_similar_apartments(db, updated.id, 5)][0] == original.id
+
+
+def test_changes_above_drift_threshold_request_rebuild(service, db, monkeypatch):
+    requests = []
+    monkeypatch.setattr(
+        training_manager, "request_training", lambda name, force=False: requests.append((name, force)) or True
+    )
+    monkeypatch.setattr(settings, "RECOMMENDER_REBUILD_DRIFT", 0.01)
+    apartment_ids = service._bundle.apartment_ids[:5].tolist()
+
+    # 300 квартир в индексе: перестроение нужно, когда изменено больше трех
+    for seq, apartment_id in enumerate(apartment_ids[:3]):
+        service.apply_change(ChangeEvent(seq=seq, action=DELETE, key=int(apartment_id)))
+    assert service._bundle.delta.drift() == pytest.approx(0.01)
+    assert requests == []
+
+    service.apply_change(ChangeEvent(seq=3, action=DELETE, key=int(apartment_ids[3])))
+    assert requests == [(RECOMMENDER, True)]
+
+
+def test_favorite_revisions_are_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "RECOMMENDER_USER_CACHE_SIZE", 3)
+    service = RecommenderService()
+    computed = []
+
+    def compute(db, bundle, user_id, n_recommendations):
+        computed.append(user_id)
+        return [len(computed)]
+
+    monkeypatch.setattr(service, "_compute_recommended_ids", compute)
+    bundle = SimpleNamespace(generation=1)
+
+    def change_favorites(user_id):
+        service.apply_favorite_change(ChangeEvent(seq=0, action=UPSERT, key=0, data={"user_id": user_id}))
+
+    first = service.get_recommended_ids(None, 1, bundle=bundle)
+    assert service.get_recommended_ids(None, 1, bundle=bundle) == first
+    change_favorites(1)
+    second = service.get_recommended_ids(None, 1, bundle=bundle)
+    assert second != first
+
+    for user_id in range(2, 100):
+        change_favorites(user_id)
+    assert len(service._favorite_revisions) == 3
+
+    # Пользователь вытеснен из версий, но его прежние записи кэша не возвращаются
+    assert service.get_recommended_ids(None, 1, bundle=bundle) not in (first, second)
+
+
+def test_similar_to_attributes(client, db):
+    apartment = apartment_repository.get_latest(db, limit=1)[0]
+    full = {
+        "metro": apartment.metro,
+        "way": apartment.way,
+        "price": apartment.price,
+        "minutes": apartment.minutes,
+        "rooms": apartment.rooms,
+        "total_area": apartment.total_area,
+    }
+    partial = {"metro": None, "way": None, "price": 50000, "rooms": 2}
+    response = client.post("/recommendations/similar", json={"queries": [full, partial, {}], "limit": 4})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert all(len(result["apartments"]) == 4 for result in results)
+    # Квартира с точно такими характеристиками ближе всех
+    assert results[0]["apartments"][0]["id"] == apartment.id
+
+
+def test_unset_categories_do_not_bias_search(service):
+    bundle = service._bundle
+    query = {"metro": None, "way": None, "price": 50000, "minutes": 10, "rooms": 2, "total_area": 50}
+    vectors = service._encode(bundle, [query])
+    # Столбцы категорий идут первыми
+    n_categories = sum(len(categories) for categories in bundle.preprocessor.named_transformers_["cat"].categories_)
+    assert not vectors[0, :n_categories].any()
@@ -0,0 +1,62 @@
+import pytest
+
+from app.core.change_log import apartment_changes
+from app.repositories.apartment_repository import apartment as apartment_repository
+from app.services.search_index import ApartmentSearchIndex
+from tests.conftest import METRO_STATIONS
+from tests.test_pagination import walk
+
+FILTERS = [
+    {},
+    {"metro": METRO_STATIONS[0]},
+    {"metro": "Нет такой станции"},
+    {"rooms": 2},
+    {"rooms": 7},
+    {"min_price": 30000},
+    {"max_price": 35000},
+    {"min_price": 20000, "max_price": 35000, "rooms": 1},
+    {"min_area": 40},
+    {"metro": METRO_STATIONS[1], "min_area": 0, "max_price": 50000},
+]
+
+
+@pytest.fixture
+def index(db, apartments):
+    index = ApartmentSearchIndex()
+    index.load(db)
+    return index
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_search_matches_repository(db, index, filters):
+    expected, _ = walk(lambda **page: apartment_repository.search(db, **filters, **page), 1000)
+    for limit in (1, 6, 1000):
+        assert walk(lambda **page: index.search(db, **filters, **page), limit)[0] == expected
+    assert index.count(db, **filters) == (len(expected), True)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_facets_match_repository(db, index, filters):
+    edges = {"price_edges": [25000, 40000], "area_edges": [35, 50]}
+    expected = apartment_repository.facets(db, **edges, **filters)
+    assert index.facets(db, **edges, **filters) == expected
+
+
+def test_cursors_are_interchangeable(db, index):
+    first = apartment_repository.search(db, rooms=2, limit=5)
+    second = index.search(db, rooms=2, limit=5, cursor=first.next_cursor)
+    assert [apartment.id for apartment in second] == [
+        apartment.id for apartment in apartment_repository.search(db, rooms=2, limit=5, cursor=first.next_cursor)
+    ]
+
+
+def test_index_follows_changes(db, index, apartments):
+    position = apartment_changes.position
+    apartment_repository.update(db, db_obj=apartments[0], obj_in={"metro": "Новая станция", "rooms": 5})
+    apartment_repository.remove(db, id=apartments[1].id)
+    for event in apartment_changes.since(position):
+        index.apply_change(event)
+
+    for filters in ({"metro": "Новая станция"}, {"rooms": 5}, {}):
+        expected, _ = walk(lambda **page: apartment_repository.search(db, **filters, **page), 1000)
+        assert walk(lambda **page: index.search(db, **filters, **page), 1000)[0] == expected
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.migrations.check_query_plans import seed
+from app.models.apartment import Apartment
+from app.models.favorite import Favorite
+from app.services import training_manager as training_module
+from app.services.model_store import compute_data_fingerprint, model_store
+from app.services.training_manager import RECOMMENDER, TrainingManager
+
+
+@pytest.fixture
+def manager(db, monkeypatch):
+    """
+    Менеджер с рекомендациями, обученными на текущих данных тестовой базы
+    """
+    seed(db, n_apartments=50, n_users=5, seed_value=1)
+    monkeypatch.setattr(training_module, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(model_store, "get_pinned", lambda name: None)
+
+    manager = TrainingManager()
+    manager.register(RECOMMENDER, object())
+    manager._fingerprints[RECOMMENDER] = compute_data_fingerprint(db, include_favorites=True)
+    manager.trained = []
+    monkeypatch.setattr(manager, "train_model", lambda name: manager.trained.append(name) or True)
+    return manager
+
+
+def test_refresh_ignores_favorite_changes(db, manager):
+    favorites = set(db.execute(select(Favorite.user_id, Favorite.apartment_id)).all())
+    apartment_ids = db.scalars(select(Apartment.id)).all()
+    user_id = next(iter(favorites))[0]
+    apartment_id = next(i for i in apartment_ids if (user_id, i) not in favorites)
+    db.execute(insert(Favorite).values(user_id=user_id, apartment_id=apartment_id))
+    db.commit()
+
+    # Избранное рекомендации учитывают инкрементально, полное переобучение не нужно
+    assert not manager.refresh_model(RECOMMENDER)
+    assert manager.trained == []
+
+
+def test_refresh_retrains_on_apartment_changes(db, manager):
+    db.execute(insert(Apartment).values(metro="Сокол", price=30000.0, rooms=1, total_area=35.0))
+    db.commit()
+
+    assert manager.refresh_model(RECOMMENDER)
+    assert manager.trained == [RECOMMENDER]